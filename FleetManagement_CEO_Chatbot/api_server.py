@@ -0,0 +1,258 @@
+"""HTTP API around generate_natural_response, for dashboards and concurrent users.
+
+    python api_server.py --port 8000
+    python api_server.py --port 8000 --stub-llm --llm-latency 0.3     # load testing without Gemini
+    curl -X POST localhost:8000/ask -H "Content-Type: application/json" -d '{"question": "How many trips are ongoing?"}'
+
+The synchronous pipeline runs on a bounded thread pool. Identical in-flight questions share one
+execution (single flight), each request has a deadline, and result rows are paginated; later pages
+are fetched with GET /results/{result_id}.
+
+Deadlines: work still queued when its last waiter's deadline passes is cancelled, and a question
+nobody waits for any more stops counting towards API_MAX_PENDING. The pipeline itself is synchronous,
+so an execution already running finishes on its worker (bounded by LLM_TIMEOUT_S / QUERY_MAX_TIME_MS).
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import asyncio
+import argparse
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel, Field
+
+#  The stub replaces the real LLM clients, but llm_client still builds them at import time
+if "--stub-llm" in sys.argv:
+    os.environ.setdefault("GEMINI_API_KEY", "stub")
+
+from llm_response_tools import generate_natural_response
+from query_cache import normalize_question
+from connection_manager import health_check
+from result_cache import result_cache
+import tracing
+
+#  API settings
+API_MAX_WORKERS = int(os.getenv("API_MAX_WORKERS", "8"))
+API_MAX_PENDING = int(os.getenv("API_MAX_PENDING", "64"))
+API_REQUEST_TIMEOUT_S = float(os.getenv("API_REQUEST_TIMEOUT_S", "60"))
+API_RESULT_TTL_S = float(os.getenv("API_RESULT_TTL_S", "300"))
+API_RESULT_CACHE_SIZE = int(os.getenv("API_RESULT_CACHE_SIZE", "256"))
+API_PAGE_SIZE = int(os.getenv("API_PAGE_SIZE", "50"))
+API_MAX_PAGE_SIZE = int(os.getenv("API_MAX_PAGE_SIZE", "500"))
+
+
+class AskRequest(BaseModel):
+    question: str = Field(..., min_length=1, max_length=2000)
+    history: str = ""
+    page_size: int = Field(API_PAGE_SIZE, ge=1, le=API_MAX_PAGE_SIZE)
+    timeout_s: Optional[float] = Field(None, gt=0, le=API_REQUEST_TIMEOUT_S)
+
+
+class ResultStore:
+    """Finished answers kept for pagination, bounded by count and age."""
+
+    def __init__(self, max_size=API_RESULT_CACHE_SIZE, ttl=API_RESULT_TTL_S):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def put(self, result):
+        result_id = uuid.uuid4().hex
+        with self.lock:
+            self.entries[result_id] = (time.monotonic(), result)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+        return result_id
+
+    def get(self, result_id):
+        with self.lock:
+            entry = self.entries.get(result_id)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[0] > self.ttl:
+                del self.entries[result_id]
+                return None
+            return entry[1]
+
+
+class SingleFlight:
+    """Runs the pipeline on a bounded pool; concurrent calls with the same key share one execution."""
+
+    def __init__(self, max_workers=API_MAX_WORKERS, max_pending=API_MAX_PENDING):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pipeline")
+        self.max_pending = max_pending
+        self.in_flight = {}
+        self.stats = {"executions": 0, "coalesced": 0, "rejected": 0, "timeouts": 0, "expired": 0}
+
+    def _start(self, flight, fn, args):
+        #  Runs on the worker: work whose waiters have all given up is skipped
+        if time.monotonic() > flight["deadline"]:
+            self.stats["expired"] += 1
+            raise TimeoutError("deadline passed before the question was started")
+        return fn(*args)
+
+    async def run(self, key, timeout, fn, *args):
+        """Return (result, coalesced) within timeout seconds.
+
+        Raises OverflowError when too many executions are pending and asyncio.TimeoutError on the deadline.
+        """
+        deadline = time.monotonic() + timeout
+        flight = self.in_flight.get(key)
+        coalesced = flight is not None
+        if coalesced:
+            self.stats["coalesced"] += 1
+            flight["deadline"] = max(flight["deadline"], deadline)
+        else:
+            if len(self.in_flight) >= self.max_pending:
+                self.stats["rejected"] += 1
+                raise OverflowError("too many questions in flight")
+            flight = {"deadline": deadline, "waiters": 0}
+            loop = asyncio.get_running_loop()
+            flight["task"] = asyncio.ensure_future(loop.run_in_executor(self.executor, self._start, flight, fn, args))
+            self.in_flight[key] = flight
+            flight["task"].add_done_callback(lambda task: self._finished(key, flight, task))
+            self.stats["executions"] += 1
+
+        flight["waiters"] += 1
+        try:
+            #  shield: a waiter hitting its deadline must not cancel the execution other waiters share
+            return await asyncio.wait_for(asyncio.shield(flight["task"]), timeout), coalesced
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            raise
+        finally:
+            flight["waiters"] -= 1
+            if flight["waiters"] == 0 and not flight["task"].done():
+                #  Nobody waits any more: drop it if still queued, and free its pending slot either way
+                flight["task"].cancel()
+                self._release(key, flight)
+
+    def _finished(self, key, flight, task):
+        #  Retrieve the outcome so abandoned failures are not reported as never retrieved
+        if not task.cancelled():
+            task.exception()
+        self._release(key, flight)
+
+    def _release(self, key, flight):
+        if self.in_flight.get(key) is flight:
+            del self.in_flight[key]
+
+
+flight = SingleFlight()
+results = ResultStore()
+_stub = {"client": None, "answers": {}}
+
+app = FastAPI(title="FleetWise AI")
+
+
+def _answer(question, history):
+    """Pipeline call executed on the worker pool; returns a JSON-ready result."""
+    if _stub["client"] is not None:
+        _stub["client"].current.entry = _stub["answers"].get(question.strip().lower(), {})
+    started = time.perf_counter()
+    response = generate_natural_response(question, history)
+    results_df = response["results_df"]
+    table = json.loads(results_df.to_json(orient="split", index=False, date_format="iso", default_handler=str))
+    return {
+        "question": question,
+        "mongo_query": response["mongo_query"],
+        "answer": response["natural_response"],
+        "columns": table["columns"],
+        "rows": table["data"],
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+def _page(result_id, result, page, page_size):
+    start = (page - 1) * page_size
+    return {
+        "result_id": result_id,
+        "question": result["question"],
+        "mongo_query": result["mongo_query"],
+        "answer": result["answer"],
+        "columns": result["columns"],
+        "rows": result["rows"][start:start + page_size],
+        "page": page,
+        "page_size": page_size,
+        "total_rows": len(result["rows"]),
+        "elapsed_ms": result["elapsed_ms"],
+    }
+
+
+def _answer_and_store(question, history):
+    result = _answer(question, history)
+    return results.put(result), result
+
+
+@app.post("/ask")
+async def ask(request: AskRequest):
+    key = (normalize_question(request.question), request.history)
+    timeout = request.timeout_s or API_REQUEST_TIMEOUT_S
+    try:
+        (result_id, result), coalesced = await flight.run(key, timeout, _answer_and_store, request.question, request.history)
+    except OverflowError:
+        raise HTTPException(status_code=503, detail="Too many questions in flight, retry shortly")
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail=f"No answer within {timeout:g}s")
+    response = _page(result_id, result, 1, request.page_size)
+    response["coalesced"] = coalesced
+    return response
+
+
+@app.get("/results/{result_id}")
+async def result_page(result_id: str, page: int = 1, page_size: int = API_PAGE_SIZE):
+    result = results.get(result_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Result expired or unknown; ask the question again")
+    if page < 1 or not 1 <= page_size <= API_MAX_PAGE_SIZE:
+        raise HTTPException(status_code=422, detail=f"page must be >= 1 and page_size between 1 and {API_MAX_PAGE_SIZE}")
+    return _page(result_id, result, page, page_size)
+
+
+@app.get("/health")
+async def health():
+    ok = await asyncio.get_running_loop().run_in_executor(None, health_check)
+    return {"mongodb": ok, "in_flight": len(flight.in_flight), **flight.stats, "result_cache": result_cache.get_stats()}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return tracing.metrics.render()
+
+
+def install_stub_llm(latency, corpus_path):
+    """Replace the LLM with the benchmark stub, answering from the benchmark question corpus."""
+    from benchmarks.bench_pipeline import StubLLMClient, DEFAULT_CORPUS
+    import llm_gateway
+
+    with open(corpus_path or DEFAULT_CORPUS, encoding="utf-8") as f:
+        corpus = json.load(f)
+    _stub["answers"] = {entry["question"].strip().lower(): entry for entry in corpus}
+    _stub["client"] = StubLLMClient(latency)
+    llm_gateway.set_clients(sync_client=_stub["client"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--stub-llm", action="store_true", help="answer with the benchmark stub LLM instead of Gemini")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="stub LLM latency per call, seconds")
+    parser.add_argument("--corpus", default=None, help="question corpus for the stub (default benchmarks/questions.json)")
+    args = parser.parse_args()
+
+    import uvicorn
+    if args.stub_llm:
+        install_stub_llm(args.llm_latency, args.corpus)
+    uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
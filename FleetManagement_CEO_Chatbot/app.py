@@ -1,6 +1,8 @@
 import streamlit as st
+from contextlib import closing
 import speech_recognition as sr
-from llm_response_tools import generate_natural_response
+from llm_response_tools import generate_natural_response_stream
+from history_manager import ConversationHistory
 
 # Set up the Streamlit app
 st.set_page_config(page_title="FleetWise AI", layout="wide")
@@ -10,6 +12,9 @@ st.write("🔹 Your intelligent logistics buddy — ask away: trips and fleets!"
 #  Initialize Chat History
 if "messages" not in st.session_state:
     st.session_state["messages"] = []
+#  Compact history for the prompts: rolling summary, last query state and per-prompt token budgets
+if "history" not in st.session_state:
+    st.session_state["history"] = ConversationHistory()
 
 #  Sidebar - Styled Voice Input
 with st.sidebar:
@@ -51,19 +56,22 @@ if user_query:
     with st.chat_message("user"):
         st.markdown(user_query)
 
+    #  Query and results stages run behind the spinner; the answer then streams in
     with st.spinner("🤖 Thinking..."):
-        recent_messages = st.session_state["messages"][-5:]
-        history_context = "\n".join(
-            f"{'User' if m['role'] == 'user' else 'Assistant'}: {m['content']}" for m in recent_messages
-        )
-        response = generate_natural_response(user_query, history_context)
+        response = generate_natural_response_stream(user_query, st.session_state["history"])
 
-    st.session_state["messages"].append({"role": "assistant", "content": response["natural_response"]})
     with st.chat_message("assistant"):
-        st.markdown(response['natural_response'])
+        #  Closing the stream on a rerun or error frees its LLM concurrency slot right away
+        with closing(response["natural_response_stream"]) as chunks:
+            natural_response = st.write_stream(chunks)
+    st.session_state["messages"].append({"role": "assistant", "content": natural_response})
+    st.session_state["history"].record_turn(
+        user_query, natural_response, response["mongo_query"], len(response["results_df"])
+    )
 
 #  Reset Chat Button
 st.markdown("---")
 if st.button("🔄 Reset Chat"):
     st.session_state["messages"] = []
+    st.session_state["history"].clear()
     st.rerun()
@@ -0,0 +1,82 @@
+"""Benchmark: recursive convert_bson + DataFrame + indented JSON vs. the columnar conversion path.
+
+    python benchmarks/bench_columnar.py --rows 50000
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+from bson import ObjectId
+from query_handler import convert_bson
+from columnar import ColumnarResult
+
+
+def make_trips(n, seed=42):
+    rng = random.Random(seed)
+    fleets = [ObjectId() for _ in range(20)]
+    drivers = ["Arun Kumar", "Priya R", "Suresh M", "Divya S", "Karthik N"]
+    start = datetime(2025, 1, 1)
+    trips = []
+    for i in range(n):
+        trip_date = start + timedelta(days=rng.randint(0, 365))
+        trips.append({
+            "_id": ObjectId(),
+            "trip_no": f"D#{trip_date:%Y%m%d} - {i:06d}",
+            "trip_schedule": {"date": trip_date.strftime("%Y-%m-%d")},
+            "status": rng.randint(0, 5),
+            "genericdata": {"fleet": rng.choice(fleets), "driver_name": rng.choice(drivers), "customer_name": "Retail Shop 23"},
+            "odometer_start": rng.randint(5000, 15000),
+            "odometer_end": rng.randint(15001, 25000),
+            "orders": {"delivery": [{"item": "Milk", "qty": rng.randint(30, 150)}], "sale": []},
+            "created_at": trip_date,
+        })
+    return trips
+
+
+def run_current(docs):
+    results_list = [convert_bson(doc) for doc in docs]
+    json.dumps(results_list, indent=2)
+    pd.DataFrame(results_list)
+
+
+def run_columnar(docs):
+    table = ColumnarResult()
+    for start in range(0, len(docs), 500):
+        table.extend(docs[start:start + 500])
+    table.to_json()
+    table.to_dataframe()
+
+
+def best_of(fn, docs, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(docs)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    docs = make_trips(args.rows)
+    current = best_of(run_current, docs, args.repeat)
+    columnar = best_of(run_columnar, docs, args.repeat)
+    print(f"rows: {args.rows}")
+    print(f"convert_bson + DataFrame + json (indent=2): {current * 1000:8.1f} ms")
+    print(f"columnar + DataFrame + compact json:        {columnar * 1000:8.1f} ms")
+    print(f"speedup: {current / columnar:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+"""End-to-end benchmark of the question pipeline against a local MongoDB with a stub LLM.
+
+    python generate_load_data.py --trips 1000000 --drop --create-indexes
+    python benchmarks/bench_pipeline.py --users 1,4,16 --llm-latency 0.3 --save-baseline baseline.json
+    python benchmarks/bench_pipeline.py --users 1,4,16 --llm-latency 0.3 --compare baseline.json
+
+Every corpus question goes through generate_natural_response. The stub LLM returns the corpus
+query / answer after --llm-latency seconds. The report gives p50/p95/p99 per pipeline stage (from
+tracing spans), throughput per number of concurrent users, and peak memory.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import resource
+import threading
+import tracemalloc
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "questions.json")
+STAGES = ["schema", "query_generation", "execution", "conversion", "summarization", "fallback", "total"]
+
+
+class StubLLMClient:
+    """Stands in for the OpenAI client: replies with the current question's corpus query or answer."""
+
+    def __init__(self, latency=0.0, jitter=0.0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.rng = random.Random(seed)
+        self.current = threading.local()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def _reply(self, messages):
+        entry = getattr(self.current, "entry", None) or {}
+        text = " ".join(str(message.get("content", "")) for message in messages)
+        if "MongoDB Query:" in text:
+            return entry.get("query") or "No query"
+        return entry.get("answer") or "Here is the answer."
+
+    def create(self, model=None, messages=(), stream=False, **kwargs):
+        time.sleep(max(self.latency + self.rng.uniform(-self.jitter, self.jitter), 0))
+        reply = self._reply(messages)
+        usage = SimpleNamespace(prompt_tokens=sum(len(str(m.get("content", ""))) // 4 for m in messages),
+                                completion_tokens=len(reply) // 4 + 1)
+        if stream:
+            return iter([SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=word + " "))], usage=None)
+                         for word in reply.split(" ")])
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=reply))], usage=usage)
+
+
+class StageRecorder:
+    """Tracing listener collecting span durations per stage."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.durations = {}
+
+    def __call__(self, name, duration_ms, attrs):
+        with self.lock:
+            self.durations.setdefault(name, []).append(duration_ms)
+
+    def reset(self):
+        with self.lock:
+            self.durations = {}
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def summarize(durations):
+    return {
+        stage: {
+            "count": len(values),
+            "p50": round(percentile(values, 50), 2),
+            "p95": round(percentile(values, 95), 2),
+            "p99": round(percentile(values, 99), 2),
+        }
+        for stage, values in durations.items()
+    }
+
+
+def run_level(pipeline, stub, recorder, corpus, users, iterations):
+    """Replay the corpus `iterations` times with `users` concurrent threads."""
+    from tracing import span
+    jobs = [entry for _ in range(iterations) for entry in corpus]
+    errors = []
+
+    def ask(entry):
+        stub.current.entry = entry
+        try:
+            with span("total"):
+                response = pipeline.generate_natural_response(entry["question"])
+            if not response.get("natural_response"):
+                errors.append(entry["question"])
+        except Exception as e:
+            errors.append(f"{entry['question']}: {e}")
+
+    recorder.reset()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as executor:
+        list(executor.map(ask, jobs))
+    elapsed = time.perf_counter() - started
+    return {
+        "users": users,
+        "questions": len(jobs),
+        "errors": len(errors),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_qps": round(len(jobs) / elapsed, 2),
+        "stages": summarize(recorder.durations),
+    }
+
+
+def print_report(results):
+    for level in results["levels"]:
+        print(f"\n{level['users']} concurrent users: {level['questions']} questions in {level['elapsed_s']}s "
+              f"= {level['throughput_qps']} q/s ({level['errors']} errors)")
+        print(f"  {'stage':<18}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for stage in sorted(level["stages"], key=lambda name: STAGES.index(name) if name in STAGES else len(STAGES)):
+            values = level["stages"][stage]
+            print(f"  {stage:<18}{values['count']:>7}{values['p50']:>10}{values['p95']:>10}{values['p99']:>10}")
+    memory = results["memory"]
+    print(f"\npeak RSS: {memory['peak_rss_mb']} MB", end="")
+    if memory.get("tracemalloc_peak_mb") is not None:
+        print(f", tracemalloc peak: {memory['tracemalloc_peak_mb']} MB", end="")
+    print()
+
+
+def compare(results, baseline, tolerance):
+    """Print p95 and throughput changes against a baseline; return the list of regressions."""
+    regressions = []
+    baseline_levels = {level["users"]: level for level in baseline["levels"]}
+    print(f"\nComparison with baseline (tolerance {tolerance:.0%}):")
+    for level in results["levels"]:
+        base = baseline_levels.get(level["users"])
+        if base is None:
+            continue
+        for stage, values in level["stages"].items():
+            old = base["stages"].get(stage, {}).get("p95")
+            if not old:
+                continue
+            change = values["p95"] / old - 1
+            flag = "  REGRESSION" if change > tolerance else ""
+            print(f"  {level['users']:>3} users  {stage:<18} p95 {old:>9} -> {values['p95']:>9} ms ({change:+.0%}){flag}")
+            if flag:
+                regressions.append((level["users"], stage))
+        change = level["throughput_qps"] / base["throughput_qps"] - 1 if base["throughput_qps"] else 0.0
+        flag = "  REGRESSION" if change < -tolerance else ""
+        print(f"  {level['users']:>3} users  throughput {base['throughput_qps']} -> {level['throughput_qps']} q/s ({change:+.0%}){flag}")
+        if flag:
+            regressions.append((level["users"], "throughput"))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help="JSON list of {question, query, answer}")
+    parser.add_argument("--users", default="1,4,16", help="comma-separated concurrency levels")
+    parser.add_argument("--iterations", type=int, default=3, help="passes over the corpus per level")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="stub LLM latency per call, seconds")
+    parser.add_argument("--llm-jitter", type=float, default=0.05)
+    parser.add_argument("--query-cache", action="store_true", help="keep the generated-query cache enabled")
+    parser.add_argument("--rollups", action="store_true", help="allow answers from the rollup collections")
+    parser.add_argument("--result-cache", action="store_true", help="keep the query result cache enabled")
+    parser.add_argument("--tracemalloc", action="store_true", help="also report the Python allocation peak (slower)")
+    parser.add_argument("--save-baseline", metavar="PATH")
+    parser.add_argument("--compare", metavar="PATH")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95 / throughput regression")
+    args = parser.parse_args()
+
+    #  Settings read at import time: by default every question reaches the LLM and the raw collections,
+    #  on every iteration
+    if not args.query_cache:
+        os.environ["QUERY_CACHE_SIZE"] = "0"
+        os.environ["QUERY_CACHE_PATH"] = ""
+    if not args.rollups:
+        os.environ["ROLLUPS_ENABLED"] = "0"
+    if not args.result_cache:
+        os.environ["RESULT_CACHE_ENABLED"] = "0"
+    #  The real clients are replaced by the stub, but llm_client still builds them at import
+    os.environ.setdefault("GEMINI_API_KEY", "stub")
+
+    import llm_gateway
+    import llm_response_tools as pipeline
+    from tracing import add_listener
+
+    with open(args.corpus, encoding="utf-8") as f:
+        corpus = json.load(f)
+    stub = StubLLMClient(args.llm_latency, args.llm_jitter)
+    llm_gateway.set_clients(sync_client=stub)
+    recorder = StageRecorder()
+    add_listener(recorder)
+
+    #  Warm-up: schema introspection, connection pool and first-use imports
+    run_level(pipeline, stub, recorder, corpus, users=1, iterations=1)
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    levels = [run_level(pipeline, stub, recorder, corpus, int(users), args.iterations)
+              for users in args.users.split(",")]
+
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    memory = {
+        "peak_rss_mb": round(rss_kb / 1024 / (1024 if sys.platform == "darwin" else 1), 1),
+        "tracemalloc_peak_mb": round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 2) if args.tracemalloc else None,
+    }
+    results = {
+        "config": {
+            "corpus": os.path.basename(args.corpus),
+            "iterations": args.iterations,
+            "llm_latency": args.llm_latency,
+            "query_cache": args.query_cache,
+            "rollups": args.rollups,
+            "llm_max_concurrency": llm_gateway.LLM_MAX_CONCURRENCY,
+        },
+        "levels": levels,
+        "memory": memory,
+        "llm_usage": llm_gateway.get_usage_stats(),
+    }
+    print_report(results)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {args.save_baseline}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Local fake OpenAI-compatible chat completions server for exercising llm_gateway.
+
+    python benchmarks/fake_openai_server.py --port 8099 --latency 0.5 --error-rate 0.2
+    LLM_BASE_URL=http://127.0.0.1:8099/v1/ streamlit run app.py
+
+Replies are canned text (or --reply), with configurable latency and injected 429/500 errors so
+timeouts, retries and the concurrency limit can be observed.
+"""
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    error_rate = 0.0
+    reply = "db.tripplanners.find({})"
+    stats = {"requests": 0, "errors": 0, "in_flight": 0, "max_in_flight": 0}
+    lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        with self.lock:
+            self.stats["requests"] += 1
+            self.stats["in_flight"] += 1
+            self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self.stats["in_flight"])
+        try:
+            time.sleep(self.latency)
+            if random.random() < self.error_rate:
+                with self.lock:
+                    self.stats["errors"] += 1
+                status = random.choice([429, 500])
+                self._send_json(status, {"error": {"message": "injected failure", "code": status}})
+                return
+
+            prompt_tokens = sum(len(str(m.get("content", ""))) // 4 for m in body.get("messages", []))
+            completion_tokens = len(self.reply) // 4 + 1
+            if body.get("stream"):
+                self._send_stream(body.get("model", "fake"))
+            else:
+                self._send_json(200, {
+                    "id": "chatcmpl-fake",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": body.get("model", "fake"),
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": self.reply}}],
+                    "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                              "total_tokens": prompt_tokens + completion_tokens},
+                })
+        finally:
+            with self.lock:
+                self.stats["in_flight"] -= 1
+
+    def do_GET(self):
+        if self.path == "/stats":
+            with self.lock:
+                self._send_json(200, dict(self.stats))
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def _send_json(self, status, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_stream(self, model):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        for word in self.reply.split(" "):
+            chunk = {
+                "id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+
+
+def serve(port=8099, latency=0.0, error_rate=0.0, reply=None):
+    """Start the fake server in a background thread and return it (call .shutdown() to stop)."""
+    FakeOpenAIHandler.latency = latency
+    FakeOpenAIHandler.error_rate = error_rate
+    if reply is not None:
+        FakeOpenAIHandler.reply = reply
+    server = ThreadingHTTPServer(("127.0.0.1", port), FakeOpenAIHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds to wait before replying")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 429/500")
+    parser.add_argument("--reply", default=None)
+    args = parser.parse_args()
+
+    server = serve(args.port, args.latency, args.error_rate, args.reply)
+    print(f"Fake OpenAI server on http://127.0.0.1:{args.port}/v1/ (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
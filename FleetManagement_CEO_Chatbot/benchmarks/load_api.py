@@ -0,0 +1,78 @@
+"""Load generator for api_server: concurrent clients asking the benchmark corpus questions.
+
+    python api_server.py --stub-llm --llm-latency 0.3 &
+    python benchmarks/load_api.py --clients 32 --requests 500
+"""
+import os
+import json
+import time
+import random
+import argparse
+import threading
+import urllib.request
+import urllib.error
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "questions.json")
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)]
+
+
+def ask(url, question, timeout_s):
+    body = json.dumps({"question": question, "timeout_s": timeout_s}).encode("utf-8")
+    request = urllib.request.Request(f"{url}/ask", data=body, headers={"Content-Type": "application/json"})
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout_s + 5) as response:
+            payload = json.loads(response.read())
+            return response.status, payload.get("coalesced", False), time.perf_counter() - started
+    except urllib.error.HTTPError as e:
+        return e.code, False, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--timeout", type=float, default=30.0, help="per-request deadline sent to the server")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    with open(args.corpus, encoding="utf-8") as f:
+        questions = [entry["question"] for entry in json.load(f)]
+    rng = random.Random(args.seed)
+    #  Skewed towards a few popular questions, as on a shared dashboard
+    jobs = rng.choices(questions, weights=[1 / (i + 1) for i in range(len(questions))], k=args.requests)
+
+    lock = threading.Lock()
+    latencies, statuses, coalesced = [], Counter(), 0
+
+    def run(question):
+        nonlocal coalesced
+        status, shared, elapsed = ask(args.url, question, args.timeout)
+        with lock:
+            statuses[status] += 1
+            coalesced += shared
+            if status == 200:
+                latencies.append(elapsed * 1000)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.clients) as executor:
+        list(executor.map(run, jobs))
+    elapsed = time.perf_counter() - started
+
+    print(f"{args.requests} requests, {args.clients} clients in {elapsed:.1f}s = {args.requests / elapsed:.1f} req/s")
+    print(f"status codes: {dict(statuses)}; coalesced: {coalesced}")
+    print(f"latency ms  p50 {percentile(latencies, 50):.0f}  p95 {percentile(latencies, 95):.0f}  p99 {percentile(latencies, 99):.0f}")
+
+
+if __name__ == "__main__":
+    main()
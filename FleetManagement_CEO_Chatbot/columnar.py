@@ -0,0 +1,95 @@
+import json
+import pandas as pd
+from datetime import datetime
+from bson import ObjectId
+from query_handler import convert_bson
+
+
+def flatten_document(doc, parent="", out=None):
+    """Flatten nested sub-documents into dotted keys (genericdata.driver_name); arrays stay as cells."""
+    if out is None:
+        out = {}
+    for key, value in doc.items():
+        full_key = f"{parent}.{key}" if parent else key
+        if isinstance(value, dict) and value:
+            flatten_document(value, full_key, out)
+        else:
+            out[full_key] = value
+    return out
+
+
+def convert_column(values):
+    """Convert one column to JSON-friendly values, choosing the conversion once per column."""
+    kinds = {type(value) for value in values if value is not None}
+    if not kinds:
+        return values
+    if kinds == {ObjectId}:
+        return [str(value) if value is not None else None for value in values]
+    if kinds == {datetime}:
+        return [value.isoformat() if value is not None else None for value in values]
+    if kinds <= {str, int, float, bool}:
+        return values
+    #  Mixed or nested (arrays of sub-documents): fall back to per-cell conversion for this column only
+    return [convert_bson(value) for value in values]
+
+
+class ColumnarResult:
+    """Query results stored column by column, with flattened dotted column names.
+
+    Columns are plain Python lists: the results are small (bounded by the row limit) and end up in
+    JSON and pandas anyway, so Arrow / NumPy buffers would only add a conversion and a dependency.
+    """
+
+    def __init__(self, columns=None, length=0):
+        self.columns = columns or {}
+        self.length = length
+
+    @classmethod
+    def from_documents(cls, docs):
+        table = cls()
+        table.extend(docs)
+        return table
+
+    def extend(self, docs):
+        """Append a batch of raw BSON documents (or scalars, e.g. from distinct)."""
+        flat_rows = [flatten_document(doc) if isinstance(doc, dict) else {"value": doc} for doc in docs]
+        if not flat_rows:
+            return
+
+        names = list(self.columns)
+        seen = set(names)
+        for row in flat_rows:
+            for name in row:
+                if name not in seen:
+                    seen.add(name)
+                    names.append(name)
+
+        for name in names:
+            column = self.columns.get(name)
+            if column is None:
+                column = self.columns[name] = [None] * self.length
+            column.extend(convert_column([row.get(name) for row in flat_rows]))
+        self.length += len(flat_rows)
+
+    def head(self, n):
+        return ColumnarResult({name: values[:n] for name, values in self.columns.items()}, min(n, self.length))
+
+    def iter_row_values(self):
+        return zip(*self.columns.values()) if self.columns else iter(())
+
+    def to_records(self):
+        names = list(self.columns)
+        return [dict(zip(names, values)) for values in self.iter_row_values()]
+
+    def to_dataframe(self):
+        #  Built straight from the column lists; nested cells (e.g. orders.delivery) stay Python lists
+        return pd.DataFrame(self.columns)
+
+    def to_json(self):
+        """Compact JSON: column names once, then one array per row."""
+        return json.dumps(
+            {"columns": list(self.columns), "rows": [list(values) for values in self.iter_row_values()]},
+            separators=(",", ":"),
+            ensure_ascii=False,
+            default=str,
+        )
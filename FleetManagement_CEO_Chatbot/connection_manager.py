@@ -0,0 +1,149 @@
+import os
+import time
+import threading
+from dotenv import load_dotenv
+from pymongo import MongoClient, monitoring
+from pymongo.errors import PyMongoError
+
+# Load environment variables from .env
+load_dotenv()
+
+#  Connection settings, tunable from the environment
+MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017/")
+MONGODB_DB = os.getenv("MONGODB_DB", "Your DB Name")
+MONGODB_MAX_POOL_SIZE = int(os.getenv("MONGODB_MAX_POOL_SIZE", "50"))
+MONGODB_MIN_POOL_SIZE = int(os.getenv("MONGODB_MIN_POOL_SIZE", "0"))
+MONGODB_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGODB_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+MONGODB_CONNECT_TIMEOUT_MS = int(os.getenv("MONGODB_CONNECT_TIMEOUT_MS", "5000"))
+MONGODB_SOCKET_TIMEOUT_MS = int(os.getenv("MONGODB_SOCKET_TIMEOUT_MS", "30000"))
+MONGODB_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGODB_WAIT_QUEUE_TIMEOUT_MS", "10000"))
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """Tracks pool usage (open / checked-out connections, checkout wait time)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.stats = {
+            "connections_open": 0,
+            "checked_out": 0,
+            "checkouts": 0,
+            "checkout_failures": 0,
+            "total_wait_ms": 0.0,
+            "max_wait_ms": 0.0,
+            "pool_clears": 0,
+        }
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+        stats["avg_wait_ms"] = stats["total_wait_ms"] / stats["checkouts"] if stats["checkouts"] else 0.0
+        return stats
+
+    def _wait_ms(self):
+        started = getattr(self._local, "checkout_started", None)
+        self._local.checkout_started = None
+        return (time.perf_counter() - started) * 1000 if started is not None else 0.0
+
+    # Checkout happens on the requesting thread, so a thread-local start time is enough
+    def connection_check_out_started(self, event):
+        self._local.checkout_started = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        wait_ms = self._wait_ms()
+        with self._lock:
+            self.stats["checked_out"] += 1
+            self.stats["checkouts"] += 1
+            self.stats["total_wait_ms"] += wait_ms
+            self.stats["max_wait_ms"] = max(self.stats["max_wait_ms"], wait_ms)
+
+    def connection_check_out_failed(self, event):
+        self._wait_ms()
+        with self._lock:
+            self.stats["checkout_failures"] += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.stats["checked_out"] -= 1
+
+    def connection_created(self, event):
+        with self._lock:
+            self.stats["connections_open"] += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.stats["connections_open"] -= 1
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.stats["pool_clears"] += 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+
+_client = None
+_client_lock = threading.Lock()
+pool_stats = PoolStatsListener()
+
+
+def get_client():
+    """Process-wide MongoClient shared by every caller (Streamlit sessions, API workers)."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = MongoClient(
+                    MONGODB_URI,
+                    maxPoolSize=MONGODB_MAX_POOL_SIZE,
+                    minPoolSize=MONGODB_MIN_POOL_SIZE,
+                    serverSelectionTimeoutMS=MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+                    connectTimeoutMS=MONGODB_CONNECT_TIMEOUT_MS,
+                    socketTimeoutMS=MONGODB_SOCKET_TIMEOUT_MS,
+                    waitQueueTimeoutMS=MONGODB_WAIT_QUEUE_TIMEOUT_MS,
+                    event_listeners=[pool_stats],
+                )
+    return _client
+
+
+def get_database(name=None):
+    return get_client()[name or MONGODB_DB]
+
+
+def health_check():
+    """Ping the server and report round-trip latency plus current pool stats."""
+    started = time.perf_counter()
+    try:
+        get_client().admin.command("ping")
+        ok, error = True, None
+    except PyMongoError as e:
+        ok, error = False, str(e)
+    return {
+        "ok": ok,
+        "error": error,
+        "latency_ms": (time.perf_counter() - started) * 1000,
+        "pool": pool_stats.snapshot(),
+    }
+
+
+def get_pool_stats():
+    return pool_stats.snapshot()
+
+
+def close_client():
+    """Close the shared client (e.g. on server shutdown); the next call reconnects."""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
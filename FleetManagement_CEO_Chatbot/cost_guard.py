@@ -0,0 +1,255 @@
+"""Pre-flight cost check for generated queries: explain, estimate documents examined, rewrite or reject."""
+import os
+import copy
+import threading
+from datetime import date, timedelta
+from query_plan import QueryPlanError, QUERY_DEFAULT_LIMIT, QUERY_MAX_LIMIT
+from tracing import error
+
+#  Cost guard settings
+COST_GUARD_ENABLED = os.getenv("COST_GUARD_ENABLED", "1") == "1"
+COST_GUARD_MAX_DOCS = int(os.getenv("COST_GUARD_MAX_DOCS", "200000"))
+#  "rewrite" narrows expensive queries before rejecting them; "reject" only rejects
+COST_GUARD_MODE = os.getenv("COST_GUARD_MODE", "rewrite")
+COST_GUARD_WINDOW_DAYS = int(os.getenv("COST_GUARD_WINDOW_DAYS", "30"))
+COST_GUARD_EXPLAIN_TIME_MS = int(os.getenv("COST_GUARD_EXPLAIN_TIME_MS", "2000"))
+#  Index-matched documents counted exactly up to this many; above it the match rate is sampled
+COST_GUARD_PROBE_DOCS = int(os.getenv("COST_GUARD_PROBE_DOCS", "1000"))
+
+#  Date field used to window each collection when a query would scan too much of it
+DATE_WINDOW_FIELDS = {"tripplanners": "trip_schedule.date"}
+
+#  Stages that keep one output document per input document, so a $limit can move in front of a $lookup
+ROW_PRESERVING_STAGES = {"$project", "$addFields", "$set", "$unset", "$lookup", "$limit"}
+#  Every operation that reads documents; counts and distinct scan as much as a find without a limit
+GUARDED_OPERATIONS = {"find", "find_one", "aggregate", "count_documents", "distinct"}
+LEADING_STAGES = {"$match", "$sort", "$project", "$addFields", "$set", "$unset"}
+#  Stages that pass documents through as they are read: after a leading $match, a pipeline made of
+#  these stops reading at its limit
+STREAMING_STAGES = ROW_PRESERVING_STAGES | {"$skip"}
+
+
+class CostGuardError(QueryPlanError):
+    """Raised when a generated query is estimated to examine too many documents."""
+
+    def __init__(self, message, estimate):
+        super().__init__(message)
+        self.estimate = estimate
+
+
+_stats_lock = threading.Lock()
+_stats = {"checked": 0, "passed": 0, "rewritten": 0, "rejected": 0, "explain_errors": 0}
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def get_cost_guard_stats():
+    with _stats_lock:
+        return dict(_stats)
+
+
+# ---------- Estimation ----------
+
+def _leading_match(plan):
+    """The filter the server can use an index for: the find filter or the pipeline's leading $match."""
+    if plan.operation != "aggregate":
+        return plan.filter or {}
+    first = plan.pipeline[0] if plan.pipeline else {}
+    return first.get("$match", {}) if isinstance(first, dict) else {}
+
+
+def _uses_collscan(node):
+    if isinstance(node, dict):
+        if node.get("stage") == "COLLSCAN":
+            return True
+        return any(_uses_collscan(value) for key, value in node.items() if key != "rejectedPlans")
+    if isinstance(node, list):
+        return any(_uses_collscan(item) for item in node)
+    return False
+
+
+def _explain(db, plan):
+    #  queryPlanner verbosity only plans the query; the count / sample probes are separate and bounded
+    if plan.operation == "aggregate":
+        command = {"aggregate": plan.collection, "pipeline": plan.pipeline, "cursor": {}}
+    elif plan.operation == "count_documents":
+        command = {"count": plan.collection, "query": plan.filter}
+    elif plan.operation == "distinct":
+        command = {"distinct": plan.collection, "key": plan.field, "query": plan.filter}
+    else:
+        command = {"find": plan.collection, "filter": plan.filter}
+    return db.command("explain", command, verbosity="queryPlanner", maxTimeMS=COST_GUARD_EXPLAIN_TIME_MS)
+
+
+def _row_cap(plan):
+    """Most documents a sort-free plan reads before its limit is reached, or None when it reads them all."""
+    if plan.operation == "count_documents":
+        #  count_documents stops at its own limit only; there is no default one
+        return (plan.skip or 0) + plan.limit if plan.limit else None
+    if plan.count or plan.operation == "distinct":
+        #  len(...) runs the query with $count and no row limit; distinct reads every match
+        return None
+    if plan.operation == "aggregate":
+        pipeline = plan.pipeline or []
+        if pipeline and "$match" in pipeline[0]:
+            pipeline = pipeline[1:]
+        if any(next(iter(stage), None) not in STREAMING_STAGES for stage in pipeline):
+            return None
+        limit = next((stage["$limit"] for stage in pipeline if isinstance(stage.get("$limit"), int)), None)
+        skip = sum(stage["$skip"] for stage in pipeline if isinstance(stage.get("$skip"), int))
+    else:
+        if plan.sort:
+            return None
+        limit = 1 if plan.operation == "find_one" else plan.limit
+        skip = plan.skip or 0
+    #  execute_query_plan applies the default limit when the query has none
+    return skip + min(limit or QUERY_DEFAULT_LIMIT, QUERY_MAX_LIMIT)
+
+
+def _matching_docs(db, plan):
+    """Documents matching the leading filter: counted exactly when few, else sampled match rate x size."""
+    collection = db[plan.collection]
+    match = _leading_match(plan)
+    probe = collection.count_documents(match, limit=COST_GUARD_PROBE_DOCS, maxTimeMS=COST_GUARD_EXPLAIN_TIME_MS)
+    if probe < COST_GUARD_PROBE_DOCS:
+        return probe
+    #  $sample below 5% of the collection reads random documents instead of scanning
+    sampled = list(collection.aggregate(
+        [{"$sample": {"size": COST_GUARD_PROBE_DOCS}}, {"$match": match}, {"$count": "n"}],
+        maxTimeMS=COST_GUARD_EXPLAIN_TIME_MS,
+    ))
+    total = collection.estimated_document_count()
+    rate = sampled[0]["n"] / COST_GUARD_PROBE_DOCS if sampled else 0.0
+    return max(probe, int(total * rate))
+
+
+def _has_index_on(db, collection, field):
+    if field == "_id":
+        return True
+    return any(index["key"][0][0] == field for index in db[collection].index_information().values())
+
+
+def estimate_docs_examined(db, plan):
+    """Rough number of documents the server will read for a find/aggregate/count/distinct plan.
+
+    A collection scan reads the whole collection; an index scan reads about what the leading filter
+    matches (a count bounded by COST_GUARD_PROBE_DOCS, then a $sample of the match rate). Sort-free
+    plans stop at their limit, unless a filtered collection scan has to read on to find matches.
+    Each $lookup adds one index probe per document, or a scan of the joined collection per document
+    when its foreignField is not indexed.
+    """
+    collection = db[plan.collection]
+    explain = _explain(db, plan)
+    collscan = _uses_collscan(explain)
+    cap = _row_cap(plan)
+    if cap is not None and (not collscan or not _leading_match(plan)):
+        docs = cap
+    elif collscan:
+        docs = collection.estimated_document_count()
+    else:
+        docs = _matching_docs(db, plan)
+
+    total = docs
+    rows = docs
+    for stage in plan.pipeline or []:
+        if "$limit" in stage and isinstance(stage["$limit"], int):
+            rows = min(rows, stage["$limit"])
+        lookup = stage.get("$lookup")
+        if not isinstance(lookup, dict) or not lookup.get("from"):
+            continue
+        foreign_field = lookup.get("foreignField")
+        if foreign_field and "pipeline" not in lookup and _has_index_on(db, lookup["from"], foreign_field):
+            total += rows
+        else:
+            total += rows * db[lookup["from"]].estimated_document_count()
+    return total
+
+
+# ---------- Rewrites ----------
+
+def _filter_mentions(filter_doc, field):
+    for key, value in (filter_doc or {}).items():
+        if key == field:
+            return True
+        if key in ("$and", "$or", "$nor") and isinstance(value, list):
+            if any(_filter_mentions(clause, field) for clause in value):
+                return True
+    return False
+
+
+def _add_date_window(plan, today=None):
+    """Restrict the plan to the last COST_GUARD_WINDOW_DAYS days. Returns a note, or None if not applicable."""
+    field = DATE_WINDOW_FIELDS.get(plan.collection)
+    if not field or _filter_mentions(_leading_match(plan), field):
+        return None
+    since = ((today or date.today()) - timedelta(days=COST_GUARD_WINDOW_DAYS)).strftime("%Y-%m-%d")
+    window = {field: {"$gte": since}}
+
+    if plan.operation == "aggregate":
+        first = plan.pipeline[0] if plan.pipeline else {}
+        if "$match" in first:
+            plan.pipeline[0] = {"$match": {"$and": [first["$match"], window]}}
+        else:
+            plan.pipeline.insert(0, {"$match": window})
+    else:
+        plan.filter = {"$and": [plan.filter, window]} if plan.filter else window
+    return f"the query was limited to trips dated on or after {since} (the last {COST_GUARD_WINDOW_DAYS} days) because the full range was too large to scan"
+
+
+def _limit_before_lookup(plan):
+    """Move the row limit in front of the first $lookup when the stages after it keep row order and count."""
+    pipeline = plan.pipeline or []
+    first_lookup = next((i for i, stage in enumerate(pipeline) if "$lookup" in stage), None)
+    if first_lookup is None:
+        return None
+    if any(next(iter(stage)) not in LEADING_STAGES for stage in pipeline[:first_lookup]):
+        return None
+    if any(next(iter(stage)) not in ROW_PRESERVING_STAGES for stage in pipeline[first_lookup:]):
+        return None
+
+    last = pipeline[-1]
+    limit = last["$limit"] if "$limit" in last else QUERY_DEFAULT_LIMIT
+    pipeline.insert(first_lookup, {"$limit": min(limit, QUERY_MAX_LIMIT)})
+    return f"only the first {min(limit, QUERY_MAX_LIMIT)} matching documents were joined"
+
+
+def check_query_cost(db, plan):
+    """Pre-flight a QueryPlan. Returns (plan, notes); the plan may be a narrowed copy.
+
+    Raises CostGuardError when the query (after any rewrites) would examine more than COST_GUARD_MAX_DOCS documents.
+    """
+    if not COST_GUARD_ENABLED or plan.operation not in GUARDED_OPERATIONS:
+        return plan, []
+    _count("checked")
+    try:
+        estimate = estimate_docs_examined(db, plan)
+    except Exception as e:
+        #  The guard must not take the chatbot down; execution still has maxTimeMS
+        error("cost_guard.explain", e)
+        _count("explain_errors")
+        return plan, []
+    if estimate <= COST_GUARD_MAX_DOCS:
+        _count("passed")
+        return plan, []
+
+    if COST_GUARD_MODE == "rewrite":
+        rewritten = copy.deepcopy(plan)
+        notes = []
+        for rewrite in (_add_date_window, _limit_before_lookup):
+            note = rewrite(rewritten)
+            if note is None:
+                continue
+            notes.append(note)
+            estimate = estimate_docs_examined(db, rewritten)
+            if estimate <= COST_GUARD_MAX_DOCS:
+                _count("rewritten")
+                return rewritten, notes
+
+    _count("rejected")
+    raise CostGuardError(
+        f"Query on {plan.collection} would examine about {estimate} documents (limit {COST_GUARD_MAX_DOCS})",
+        estimate,
+    )
@@ -0,0 +1,135 @@
+"""In-memory fleets / users maps used to enrich trip results locally instead of $lookup joins."""
+import os
+import re
+import time
+import threading
+from query_handler import get_db_connection
+from tracing import span, incr, error
+
+#  Dimension cache settings
+DIMENSION_CACHE_ENABLED = os.getenv("DIMENSION_CACHE_ENABLED", "1") == "1"
+DIMENSION_REFRESH_INTERVAL = float(os.getenv("DIMENSION_REFRESH_INTERVAL", "300"))
+#  Larger collections are not dimensions; they are left to the database
+DIMENSION_MAX_DOCS = int(os.getenv("DIMENSION_MAX_DOCS", "50000"))
+
+#  collection -> (label used for enriched columns, fields copied onto results)
+DIMENSIONS = {
+    "fleets": ("fleet", ("short_name", "number_plate", "type")),
+    "users": ("driver", ("name", "phone", "role")),
+}
+
+#  A column is treated as a reference when most of its ObjectId-looking values are found in one dimension
+MATCH_RATIO = 0.8
+OBJECT_ID_HEX = re.compile(r"^[0-9a-f]{24}$")
+
+
+class DimensionCache:
+    """Compact {id string: tuple of fields} map per dimension, refreshed in the background when stale."""
+
+    def __init__(self, dimensions=DIMENSIONS, refresh_interval=DIMENSION_REFRESH_INTERVAL):
+        self.dimensions = dimensions
+        self.refresh_interval = refresh_interval
+        self._maps = {}
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def load(self):
+        """Read every dimension collection (projection only) and swap the maps in."""
+        db = get_db_connection()
+        maps = {}
+        with span("dimension_load"):
+            for collection, (_, fields) in self.dimensions.items():
+                if db[collection].estimated_document_count() > DIMENSION_MAX_DOCS:
+                    continue
+                projection = {field: 1 for field in fields}
+                maps[collection] = {
+                    str(doc["_id"]): tuple(doc.get(field) for field in fields)
+                    for doc in db[collection].find({}, projection)
+                }
+        with self._lock:
+            self._maps = maps
+            self._loaded_at = time.monotonic()
+        return maps
+
+    def _refresh_in_background(self):
+        try:
+            self.load()
+        except Exception as e:
+            error("dimension_cache.refresh", e)
+        finally:
+            self._refreshing = False
+
+    def maps(self):
+        """Current maps: loaded on first use, refreshed in a background thread once stale."""
+        with self._lock:
+            loaded_at, maps = self._loaded_at, self._maps
+            stale = time.monotonic() - loaded_at > self.refresh_interval
+            start_refresh = loaded_at and stale and not self._refreshing
+            if start_refresh:
+                self._refreshing = True
+        if not loaded_at:
+            return self.load()
+        if start_refresh:
+            threading.Thread(target=self._refresh_in_background, name="dimension-refresh", daemon=True).start()
+        return maps
+
+    def lookup(self, collection, object_id):
+        """Fields of one dimension document as a dict, or None."""
+        values = self.maps().get(collection, {}).get(str(object_id))
+        if values is None:
+            return None
+        return dict(zip(self.dimensions[collection][1], values))
+
+    def _dimension_for(self, values, maps):
+        first = next((value for value in values if value is not None), None)
+        if not isinstance(first, str) or not OBJECT_ID_HEX.match(first):
+            return None
+        ids = [value for value in values if isinstance(value, str) and OBJECT_ID_HEX.match(value)]
+        if not ids:
+            return None
+        for collection, id_map in maps.items():
+            if sum(value in id_map for value in ids) >= MATCH_RATIO * len(ids):
+                return collection
+        return None
+
+    def enrich(self, table, collection=None):
+        """Add dimension fields next to every column of fleet / user ids in a ColumnarResult (in place).
+
+        `collection` is the queried collection; its own _id column is not enriched from itself.
+        """
+        if not DIMENSION_CACHE_ENABLED or not table.length:
+            return table
+        maps = self.maps()
+        enriched = {}
+        for name, values in table.columns.items():
+            enriched[name] = values
+            dimension = self._dimension_for(values, maps)
+            if dimension is None or (dimension == collection and name == "_id"):
+                continue
+            label, fields = self.dimensions[dimension]
+            #  Grouped results carry the id in _id; name the new columns after the dimension instead
+            base = label if name == "_id" else name
+            id_map = maps[dimension]
+            rows = [id_map.get(value) for value in values]
+            for index, field in enumerate(fields):
+                column = f"{base}.{field}"
+                if column not in table.columns:
+                    enriched[column] = [row[index] if row is not None else None for row in rows]
+            incr("dimension_enrichments", dimension=dimension)
+        table.columns = enriched
+        return table
+
+    def prompt_hint(self):
+        """Tell the query generator that dimension details are added locally."""
+        if not DIMENSION_CACHE_ENABLED:
+            return ""
+        details = "; ".join(f"{collection}: {', '.join(fields)}" for collection, (_, fields) in self.dimensions.items())
+        return (
+            f"Fleet and driver details ({details}) are added to trip results automatically. "
+            "Do not $lookup fleets or users just to show those details; return the referencing id fields "
+            "(e.g. genericdata.fleet) instead. Only $lookup them to filter or group by one of their fields."
+        )
+
+
+dimension_cache = DimensionCache()
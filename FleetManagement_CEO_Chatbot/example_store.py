@@ -0,0 +1,136 @@
+import os
+import re
+import json
+import zlib
+import math
+import threading
+import numpy as np
+from query_cache import normalize_question
+
+#  Few-shot store settings: hash space, examples put in the prompt, minimum similarity, optional JSONL file
+EXAMPLE_HASH_BITS = int(os.getenv("EXAMPLE_HASH_BITS", "18"))
+EXAMPLE_TOP_K = int(os.getenv("EXAMPLE_TOP_K", "3"))
+EXAMPLE_MIN_SCORE = float(os.getenv("EXAMPLE_MIN_SCORE", "0.35"))
+EXAMPLE_STORE_PATH = os.getenv("EXAMPLE_STORE_PATH", "")
+
+STOP_WORDS = {
+    "a", "an", "the", "of", "in", "on", "for", "to", "by", "and", "or", "is", "are", "was", "were",
+    "me", "my", "all", "can", "you", "please", "show", "give", "share", "what", "which", "with",
+}
+
+
+def _features(question):
+    """Word unigrams and bigrams of the normalized question, with dates masked."""
+    text = normalize_question(question)
+    text = re.sub(r"\d{4}-\d{2}-\d{2}", "date", text)
+    words = [word for word in re.findall(r"[^\W_]+|#", text) if word not in STOP_WORDS]
+    return words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+
+
+class ExampleStore:
+    """Question -> query pairs that executed and returned rows, in a hashed TF-IDF inverted index.
+
+    Each example is a sublinear-TF vector over hashed unigram/bigram features, L2-normalised.
+    Postings are kept per feature as NumPy arrays, so a search only touches the examples that
+    share a feature with the question instead of scanning the whole store.
+    """
+
+    def __init__(self, hash_bits=EXAMPLE_HASH_BITS, path=EXAMPLE_STORE_PATH):
+        self.mask = (1 << hash_bits) - 1
+        self.path = path
+        self._lock = threading.Lock()
+        self._examples = []
+        self._positions = {}
+        self._postings = {}
+        self._posting_arrays = {}
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        example = json.loads(line)
+                        self._add(example["question"], example["query"])
+
+    def _vectorize(self, question):
+        counts = {}
+        for feature in _features(question):
+            slot = zlib.crc32(feature.encode("utf-8")) & self.mask
+            counts[slot] = counts.get(slot, 0) + 1
+        weights = {slot: 1.0 + math.log(count) for slot, count in counts.items()}
+        norm = math.sqrt(sum(weight * weight for weight in weights.values()))
+        return {slot: weight / norm for slot, weight in weights.items()} if norm else {}
+
+    def _add(self, question, query):
+        key = normalize_question(question)
+        if key in self._positions:
+            #  Same question again: keep the latest working query
+            self._examples[self._positions[key]] = {"question": question, "query": query}
+            return False
+
+        position = len(self._examples)
+        for slot, weight in self._vectorize(question).items():
+            ids, weights = self._postings.setdefault(slot, ([], []))
+            ids.append(position)
+            weights.append(weight)
+            self._posting_arrays.pop(slot, None)
+        self._examples.append({"question": question, "query": query})
+        self._positions[key] = position
+        return True
+
+    def _arrays(self, slot):
+        arrays = self._posting_arrays.get(slot)
+        if arrays is None:
+            ids, weights = self._postings[slot]
+            arrays = self._posting_arrays[slot] = (np.asarray(ids, dtype=np.int64), np.asarray(weights, dtype=np.float32))
+        return arrays
+
+    def add(self, question, query):
+        with self._lock:
+            added = self._add(question, query)
+            if added and self.path:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({"question": question, "query": query}, ensure_ascii=False) + "\n")
+
+    def search(self, question, top_k=EXAMPLE_TOP_K, min_score=EXAMPLE_MIN_SCORE):
+        """Return up to top_k [{"question", "query", "score"}] most similar to the question."""
+        with self._lock:
+            count = len(self._examples)
+            if not count:
+                return []
+
+            #  IDF-weighted query vector; features never seen before carry the maximum IDF
+            query_vector = {}
+            for slot, weight in self._vectorize(question).items():
+                doc_freq = len(self._postings[slot][0]) if slot in self._postings else 0
+                query_vector[slot] = weight * (math.log((1.0 + count) / (1.0 + doc_freq)) + 1.0)
+            norm = math.sqrt(sum(weight * weight for weight in query_vector.values()))
+            if not norm:
+                return []
+
+            scores = np.zeros(count, dtype=np.float32)
+            for slot, weight in query_vector.items():
+                if slot in self._postings:
+                    ids, weights = self._arrays(slot)
+                    scores[ids] += weights * (weight / norm)
+
+            k = min(top_k, count)
+            best = np.argpartition(-scores, k - 1)[:k]
+            best = best[np.argsort(-scores[best])]
+            return [dict(self._examples[i], score=round(float(scores[i]), 3)) for i in best if scores[i] >= min_score]
+
+    def __len__(self):
+        return len(self._examples)
+
+
+def format_examples(examples):
+    """Render retrieved examples for the query-generation prompt."""
+    if not examples:
+        return ""
+    lines = ["Examples of questions and MongoDB queries that worked on this database:"]
+    for example in examples:
+        lines.append(f"Q: {example['question']}")
+        lines.append(f"Query: {example['query']}")
+    return "\n".join(lines)
+
+
+#  Process-wide store shared by every session
+example_store = ExampleStore()
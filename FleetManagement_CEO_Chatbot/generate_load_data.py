@@ -0,0 +1,216 @@
+"""Seeded synthetic fleet data generator for load testing (tripplanners, fleets, users).
+
+    python generate_load_data.py --trips 2000000 --workers 8 --drop --create-indexes
+
+The same --seed always produces the same documents, including _ids, regardless of --workers.
+"""
+import os
+import time
+import struct
+import random
+import argparse
+from datetime import datetime, timedelta
+from multiprocessing import Pool
+from pymongo import MongoClient, ASCENDING
+from bson import ObjectId
+from rollups import TRIPS_ROLLUP, ITEMS_ROLLUP, STATE_COLLECTION
+
+DELIVERY_ITEMS = ["Milk", "Paneer", "Butter", "Ghee", "Cheese", "Cream", "Milk Powder"]
+SALE_ITEMS = ["Curd", "Lassi", "Yogurt", "Buttermilk", "Ice Cream", "Flavoured Milk"]
+FIRST_NAMES = ["Arun", "Priya", "Suresh", "Divya", "Karthik", "Meena", "Ravi", "Lakshmi", "Vijay", "Anitha",
+               "Senthil", "Kavya", "Ganesh", "Revathi", "Murugan", "Deepa", "Bala", "Nithya", "Prakash", "Sangeetha"]
+INITIALS = "ABCDEGJKMNPRSTV"
+CUSTOMER_KINDS = ["Aavin Depot", "Retail Shop", "Wholesale Buyer", "School Canteen", "Hospital Supply", "Hotel", "Supermarket"]
+FLEET_TYPES = ["Truck", "Mini Truck", "Van", "Refrigerated Truck"]
+GENERATED_COLLECTIONS = ("tripplanners", "fleets", "users")
+#  Rollups built from the old trips would otherwise keep answering questions about the new ones
+DERIVED_COLLECTIONS = (TRIPS_ROLLUP, ITEMS_ROLLUP, STATE_COLLECTION)
+
+#  Status weights for trips older than a couple of days (assigned, scheduled, ongoing, malfunctioned, cancelled, completed)
+SETTLED_STATUS_WEIGHTS = [1, 1, 1, 3, 6, 88]
+#  Upcoming and current trips are mostly not finished yet
+RECENT_STATUS_WEIGHTS = [30, 35, 25, 2, 3, 5]
+
+
+def _object_id(rng, when):
+    #  Timestamp from the document's date keeps _id order close to date order, like real inserts
+    return ObjectId(struct.pack(">I", int(when.timestamp())) + rng.randbytes(8))
+
+
+def _zipf_weights(n, exponent=0.8):
+    return [1 / (rank + 1) ** exponent for rank in range(n)]
+
+
+def build_dimensions(config):
+    """Fleets, drivers and customers, derived only from the seed and the requested counts."""
+    rng = random.Random(f"{config['seed']}:dimensions")
+    created = datetime.strptime(config["end_date"], "%Y-%m-%d") - timedelta(days=config["days"] + 30)
+
+    fleets = []
+    for i in range(config["fleets"]):
+        fleets.append({
+            "_id": _object_id(rng, created),
+            "short_name": f"Fleet {i + 1:04d}",
+            "number_plate": f"TN{rng.randint(1, 99):02d}{rng.choice(INITIALS)}{rng.choice(INITIALS)}{rng.randint(1000, 9999)}",
+            "type": rng.choice(FLEET_TYPES),
+        })
+
+    users = []
+    for i in range(config["users"]):
+        users.append({
+            "_id": _object_id(rng, created),
+            "name": f"{rng.choice(FIRST_NAMES)} {rng.choice(INITIALS)} {i + 1}",
+            "role": "driver",
+            "phone": f"9{rng.randint(100000000, 999999999)}",
+            "fleet": rng.choice(fleets)["_id"],
+        })
+
+    customers = [f"{rng.choice(CUSTOMER_KINDS)} {i + 1}" for i in range(config["customers"])]
+    return fleets, users, customers
+
+
+_worker = {}
+
+
+def _init_worker(config):
+    fleets, users, customers = build_dimensions(config)
+    end = datetime.strptime(config["end_date"], "%Y-%m-%d")
+    days = [end - timedelta(days=offset) for offset in range(config["days"])]
+    #  Volume grows over time and drops on Sundays
+    day_weights = [
+        (1 + 0.5 * (config["days"] - offset) / config["days"]) * (0.4 if day.weekday() == 6 else 1.0)
+        for offset, day in enumerate(days)
+    ]
+    _worker.update({
+        "config": config,
+        "fleets": fleets,
+        "users": users,
+        "user_weights": _zipf_weights(len(users), 0.6),
+        "customers": customers,
+        "customer_weights": _zipf_weights(len(customers)),
+        "days": days,
+        "day_weights": day_weights,
+        "recent_cutoff": end - timedelta(days=2),
+        "client": None,
+    })
+
+
+def _order_lines(rng, items, low, high):
+    return [{"item": rng.choice(items), "qty": int(rng.triangular(low, high, low + (high - low) / 4))}
+            for _ in range(rng.choice([1, 1, 1, 2, 2, 3]))]
+
+
+def generate_trips(chunk, start, count):
+    """Trips start..start+count; the chunk index seeds the generator so output does not depend on worker count."""
+    rng = random.Random(f"{_worker['config']['seed']}:trips:{chunk}")
+    fleets, users = _worker["fleets"], _worker["users"]
+    trip_dates = rng.choices(_worker["days"], weights=_worker["day_weights"], k=count)
+    drivers = rng.choices(users, weights=_worker["user_weights"], k=count)
+    customers = rng.choices(_worker["customers"], weights=_worker["customer_weights"], k=count)
+
+    trips = []
+    for i in range(count):
+        trip_date, driver = trip_dates[i], drivers[i]
+        trip_type = "D" if rng.random() < 0.6 else "S"
+        status_weights = SETTLED_STATUS_WEIGHTS if trip_date < _worker["recent_cutoff"] else RECENT_STATUS_WEIGHTS
+        status = rng.choices(range(6), weights=status_weights)[0]
+        #  Drivers mostly drive their own fleet
+        fleet_id = driver["fleet"] if rng.random() < 0.8 else rng.choice(fleets)["_id"]
+        odometer_start = rng.randint(5000, 150000)
+        distance = int(rng.gammavariate(2.0, 40.0)) if status in (2, 3, 5) else 0
+
+        trips.append({
+            "_id": _object_id(rng, trip_date + timedelta(seconds=rng.randint(0, 86399))),
+            "trip_no": f"{trip_type}#{trip_date.strftime('%Y%m%d')} - {start + i + 1:07d}",
+            "trip_schedule": {"date": trip_date.strftime("%Y-%m-%d")},
+            "status": status,
+            "genericdata": {
+                "fleet": fleet_id,
+                "driver_info": driver["_id"],
+                "driver_name": driver["name"],
+                "customer_name": customers[i],
+            },
+            "odometer_start": odometer_start,
+            "odometer_end": odometer_start + distance,
+            "orders": {
+                "delivery": _order_lines(rng, DELIVERY_ITEMS, 30, 300) if trip_type == "D" else [],
+                "sale": _order_lines(rng, SALE_ITEMS, 10, 150) if trip_type == "S" else [],
+            },
+        })
+    return trips
+
+
+def _insert_chunk(task):
+    chunk, start, count = task
+    config = _worker["config"]
+    if _worker["client"] is None:
+        #  One client per worker process; clients must not be shared across fork
+        _worker["client"] = MongoClient(config["uri"])
+    trips = generate_trips(chunk, start, count)
+    _worker["client"][config["db"]].tripplanners.insert_many(trips, ordered=False)
+    return count
+
+
+def create_indexes(db):
+    db.tripplanners.create_index([("trip_schedule.date", ASCENDING)])
+    db.tripplanners.create_index([("status", ASCENDING), ("trip_schedule.date", ASCENDING)])
+    db.tripplanners.create_index([("genericdata.fleet", ASCENDING), ("trip_schedule.date", ASCENDING)])
+    db.tripplanners.create_index([("genericdata.driver_info", ASCENDING)])
+    db.users.create_index([("fleet", ASCENDING)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--trips", type=int, default=1_000_000)
+    parser.add_argument("--fleets", type=int, default=200)
+    parser.add_argument("--users", type=int, default=600, help="drivers")
+    parser.add_argument("--customers", type=int, default=2000)
+    parser.add_argument("--days", type=int, default=365, help="trip dates span this many days up to --end-date")
+    parser.add_argument("--end-date", default="2025-06-30")
+    parser.add_argument("--batch-size", type=int, default=5000, help="trips per insert_many")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--uri", default=os.getenv("MONGODB_URI", "mongodb://localhost:27017/"))
+    parser.add_argument("--db", default=os.getenv("MONGODB_DB", "fleetwise"))
+    parser.add_argument("--drop", action="store_true",
+                        help="drop tripplanners, fleets, users and the rollup collections first")
+    parser.add_argument("--create-indexes", action="store_true", help="build the common query indexes afterwards")
+    args = parser.parse_args()
+
+    config = {key: getattr(args, key) for key in
+              ("seed", "fleets", "users", "customers", "days", "end_date", "uri", "db")}
+    client = MongoClient(args.uri)
+    db = client[args.db]
+    if args.drop:
+        for name in GENERATED_COLLECTIONS + DERIVED_COLLECTIONS:
+            db.drop_collection(name)
+    else:
+        #  The same seed produces the same _ids, so a second run into existing data fails on duplicate keys
+        existing = [name for name in GENERATED_COLLECTIONS if db[name].estimated_document_count()]
+        if existing:
+            parser.error(f"{', '.join(existing)} already contain documents in {args.db}; use --drop to replace them")
+
+    fleets, users, _ = build_dimensions(config)
+    db.fleets.insert_many(fleets, ordered=False)
+    db.users.insert_many(users, ordered=False)
+    print(f"✅ Inserted {len(fleets)} fleets and {len(users)} drivers")
+
+    tasks = [(chunk, start, min(args.batch_size, args.trips - start))
+             for chunk, start in enumerate(range(0, args.trips, args.batch_size))]
+    started = time.perf_counter()
+    inserted = 0
+    with Pool(args.workers, initializer=_init_worker, initargs=(config,)) as pool:
+        for count in pool.imap_unordered(_insert_chunk, tasks):
+            inserted += count
+            elapsed = time.perf_counter() - started
+            print(f"\r{inserted}/{args.trips} trips ({inserted / elapsed:,.0f} docs/s)", end="", flush=True)
+    print(f"\n✅ Inserted {inserted} trips in {time.perf_counter() - started:.1f}s")
+
+    if args.create_indexes:
+        index_started = time.perf_counter()
+        create_indexes(db)
+        print(f"✅ Indexes built in {time.perf_counter() - index_started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""Conversation history for the prompts: recent turns, a rolling summary of older ones and the last query.
+
+Each prompt type gets its own token budget, so long sessions cost the same per turn as short ones.
+"""
+import os
+import re
+import json
+from query_plan import parse_query_plan, QueryPlanError
+from result_pipeline import estimate_tokens
+
+#  History settings: turns kept verbatim, rolling summary size and per-prompt token budgets
+HISTORY_RECENT_TURNS = int(os.getenv("HISTORY_RECENT_TURNS", "2"))
+HISTORY_SUMMARY_TOKENS = int(os.getenv("HISTORY_SUMMARY_TOKENS", "300"))
+HISTORY_TOKEN_BUDGETS = {
+    "query": int(os.getenv("HISTORY_TOKENS_QUERY", "400")),
+    "summary": int(os.getenv("HISTORY_TOKENS_SUMMARY", "250")),
+    "fallback": int(os.getenv("HISTORY_TOKENS_FALLBACK", "600")),
+}
+
+#  Assistant answers summarize result sets; only their opening is useful as context
+ANSWER_CHARS = 300
+SUMMARY_ANSWER_CHARS = 120
+QUESTION_CHARS = 200
+
+
+def _shorten(text, limit):
+    text = re.sub(r"\s+", " ", text or "").strip()
+    return text if len(text) <= limit else text[:limit - 1].rstrip() + "…"
+
+
+def _first_sentence(text, limit):
+    text = re.sub(r"\s+", " ", text or "").strip()
+    match = re.match(r"(.+?[.!?])(\s|$)", text)
+    return _shorten(match.group(1) if match else text, limit)
+
+
+def query_state(mongo_query, row_count=None):
+    """Structured form of an executed query (collection, filters, grouping), or None if it does not parse."""
+    try:
+        plan = parse_query_plan(mongo_query or "")
+    except QueryPlanError:
+        return None
+
+    state = {"collection": plan.collection, "operation": plan.operation}
+    if plan.operation == "aggregate":
+        matches = [stage["$match"] for stage in plan.pipeline or [] if "$match" in stage]
+        groups = [stage["$group"].get("_id") for stage in plan.pipeline or [] if "$group" in stage]
+        if matches:
+            state["filter"] = matches[0] if len(matches) == 1 else {"$and": matches}
+        if groups:
+            state["group_by"] = groups[0]
+    elif plan.filter:
+        state["filter"] = plan.filter
+    if plan.sort:
+        state["sort"] = plan.sort
+    if row_count is not None:
+        state["rows"] = row_count
+    return state
+
+
+class ConversationHistory:
+    """Per-session history. Older turns are folded into the summary one at a time as new turns arrive."""
+
+    def __init__(self, recent_turns=HISTORY_RECENT_TURNS, summary_tokens=HISTORY_SUMMARY_TOKENS):
+        self.recent_turns = recent_turns
+        self.summary_tokens = summary_tokens
+        self.turns = []
+        self.summary_lines = []
+        self.last_query = None
+
+    def record_turn(self, user_query, answer, mongo_query=None, row_count=None):
+        """Add a finished question/answer pair; the executed query (if any) becomes the follow-up state."""
+        state = query_state(mongo_query, row_count) if mongo_query else None
+        if state is not None:
+            self.last_query = dict(state, question=_shorten(user_query, QUESTION_CHARS))
+        self.turns.append({"user": user_query, "assistant": answer, "query": state})
+        while len(self.turns) > self.recent_turns:
+            self._fold(self.turns.pop(0))
+
+    def _fold(self, turn):
+        #  Incremental: only the turn leaving the recent window is compressed; the rest of the summary is kept
+        line = f"Q: {_shorten(turn['user'], QUESTION_CHARS)} A: {_first_sentence(turn['assistant'], SUMMARY_ANSWER_CHARS)}"
+        if turn["query"]:
+            line += f" [{turn['query']['collection']}]"
+        self.summary_lines.append(line)
+        while len(self.summary_lines) > 1 and estimate_tokens("\n".join(self.summary_lines)) > self.summary_tokens:
+            self.summary_lines.pop(0)
+
+    def clear(self):
+        self.turns = []
+        self.summary_lines = []
+        self.last_query = None
+
+    def context_for(self, prompt_type, token_budget=None):
+        """History text for one prompt type within its token budget; newer content wins when space runs out."""
+        remaining = token_budget or HISTORY_TOKEN_BUDGETS.get(prompt_type, HISTORY_TOKEN_BUDGETS["fallback"])
+        parts = []
+
+        #  Follow-ups ("only the completed ones", "what about yesterday?") refine the previous query
+        if prompt_type == "query" and self.last_query:
+            state = "Previous query state: " + json.dumps(self.last_query, default=str, separators=(",", ":"))
+            if estimate_tokens(state) <= remaining:
+                parts.append(state)
+                remaining -= estimate_tokens(state)
+
+        answer_chars = ANSWER_CHARS if prompt_type == "fallback" else SUMMARY_ANSWER_CHARS
+        recent = []
+        for turn in reversed(self.turns):
+            text = f"User: {_shorten(turn['user'], QUESTION_CHARS)}\nAssistant: {_shorten(turn['assistant'], answer_chars)}"
+            if estimate_tokens(text) > remaining:
+                break
+            recent.insert(0, text)
+            remaining -= estimate_tokens(text)
+
+        earlier = []
+        if len(recent) == len(self.turns):
+            for line in reversed(self.summary_lines):
+                if estimate_tokens(line) > remaining:
+                    break
+                earlier.insert(0, line)
+                remaining -= estimate_tokens(line)
+
+        if earlier:
+            parts.insert(0, "Earlier in the conversation:\n" + "\n".join(earlier))
+        if recent:
+            parts.append("Recent turns:\n" + "\n".join(recent))
+        return "\n".join(parts)
+
+
+def history_for(history, prompt_type):
+    """Prompt text for a history that is either a ConversationHistory or an already formatted string."""
+    if isinstance(history, ConversationHistory):
+        return history.context_for(prompt_type)
+    return history or ""
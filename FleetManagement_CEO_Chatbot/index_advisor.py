@@ -0,0 +1,254 @@
+"""Index advisor: learns filter/sort/lookup shapes from executed queries, explains them and proposes indexes.
+
+    python index_advisor.py                  # report from the shapes logged in INDEX_ADVISOR_LOG
+    python index_advisor.py --create         # also create the recommended indexes
+"""
+import os
+import json
+import argparse
+import threading
+from collections import Counter
+from query_plan import parse_query_plan, QueryPlanError
+
+#  Advisor settings: optional JSONL log of executed query shapes, and whether to create indexes automatically
+INDEX_ADVISOR_LOG = os.getenv("INDEX_ADVISOR_LOG", "")
+INDEX_ADVISOR_AUTO_CREATE = os.getenv("INDEX_ADVISOR_AUTO_CREATE", "0") == "1"
+#  Only recommend an index when the plan examines this many documents per document returned
+INDEX_ADVISOR_MIN_RATIO = float(os.getenv("INDEX_ADVISOR_MIN_RATIO", "10"))
+
+RANGE_OPERATORS = {"$gt", "$gte", "$lt", "$lte", "$ne", "$nin", "$regex", "$exists"}
+
+_lock = threading.Lock()
+_shape_counts = Counter()
+_shape_samples = {}
+
+
+# ---------- Shapes ----------
+
+def _filter_fields(filter_doc, equality, ranges):
+    """Split a filter's fields into equality and range predicates ($and/$or are flattened)."""
+    for key, value in (filter_doc or {}).items():
+        if key in ("$and", "$or", "$nor") and isinstance(value, list):
+            for clause in value:
+                _filter_fields(clause, equality, ranges)
+        elif key.startswith("$"):
+            continue
+        elif isinstance(value, dict) and any(op in RANGE_OPERATORS for op in value):
+            ranges.append(key)
+        else:
+            equality.append(key)
+
+
+def query_shape(plan):
+    """Shape of a QueryPlan: collection, equality/range filter fields, sort keys and $lookup targets."""
+    equality, ranges, sort, lookups = [], [], [], []
+    if plan.operation == "aggregate":
+        stages = plan.pipeline or []
+        #  Only the leading $match/$sort can use an index on the source collection
+        for stage in stages:
+            if "$match" in stage:
+                _filter_fields(stage["$match"], equality, ranges)
+            elif "$sort" in stage:
+                sort = list(stage["$sort"].items())
+                break
+            else:
+                break
+        for stage in stages:
+            lookup = stage.get("$lookup")
+            if isinstance(lookup, dict) and lookup.get("from") and lookup.get("foreignField"):
+                lookups.append((lookup["from"], lookup["foreignField"]))
+    else:
+        _filter_fields(plan.filter, equality, ranges)
+        sort = list(plan.sort or [])
+
+    return {
+        "collection": plan.collection,
+        "equality": sorted(dict.fromkeys(equality)),
+        "range": sorted(dict.fromkeys(ranges)),
+        "sort": [[field, direction] for field, direction in sort],
+        "lookups": sorted(set(lookups)),
+    }
+
+
+def _shape_key(shape):
+    return json.dumps(shape, sort_keys=True, default=list)
+
+
+def record_query_shape(plan, mongo_query=None):
+    """Log the shape of an executed plan (in memory, and to INDEX_ADVISOR_LOG when set)."""
+    shape = query_shape(plan)
+    key = _shape_key(shape)
+    with _lock:
+        _shape_counts[key] += 1
+        _shape_samples.setdefault(key, (shape, plan))
+        if INDEX_ADVISOR_LOG and mongo_query:
+            with open(INDEX_ADVISOR_LOG, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"query": mongo_query}) + "\n")
+
+
+def load_shape_log(path):
+    """Replay a JSONL log of executed queries into the in-memory shape counters."""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                plan = parse_query_plan(json.loads(line)["query"])
+            except (QueryPlanError, KeyError, ValueError):
+                continue
+            record_query_shape(plan)
+
+
+# ---------- Explain ----------
+
+def _winning_stages(explain):
+    """All stage names of the winning plan(s) in a find or aggregate explain output."""
+    stages = []
+
+    def walk(node):
+        if isinstance(node, dict):
+            if "stage" in node:
+                stages.append(node["stage"])
+            for key, value in node.items():
+                if key != "rejectedPlans":
+                    walk(value)
+        elif isinstance(node, list):
+            for item in node:
+                walk(item)
+
+    walk(explain.get("queryPlanner", {}).get("winningPlan") or explain.get("stages") or explain)
+    return stages
+
+
+def _execution_numbers(explain):
+    stats = explain.get("executionStats")
+    if stats is None:
+        for stage in explain.get("stages", []):
+            cursor = stage.get("$cursor") if isinstance(stage, dict) else None
+            if cursor and "executionStats" in cursor:
+                stats = cursor["executionStats"]
+                break
+    stats = stats or {}
+    return stats.get("totalDocsExamined", 0), stats.get("nReturned", 0), stats.get("executionTimeMillis", 0)
+
+
+def explain_plan(db, plan, verbosity="executionStats"):
+    """Run explain for a find/aggregate plan."""
+    if plan.operation == "aggregate":
+        command = {"aggregate": plan.collection, "pipeline": plan.pipeline, "cursor": {}}
+    else:
+        command = {"find": plan.collection, "filter": plan.filter}
+        if plan.sort:
+            command["sort"] = dict(plan.sort)
+        if plan.limit:
+            command["limit"] = plan.limit
+    return db.command("explain", command, verbosity=verbosity)
+
+
+# ---------- Recommendations ----------
+
+def recommend_index(shape):
+    """Equality, then sort, then range fields (the ESR rule)."""
+    keys = [(field, 1) for field in shape["equality"]]
+    keys += [(field, direction) for field, direction in shape["sort"] if field not in shape["equality"]]
+    keys += [(field, 1) for field in shape["range"] if all(field != key for key, _ in keys)]
+    return keys
+
+
+def _is_covered(keys, existing_indexes):
+    """True when an existing index already starts with the recommended keys."""
+    for index in existing_indexes.values():
+        existing = [(field, int(direction)) if isinstance(direction, (int, float)) else (field, direction)
+                    for field, direction in index["key"]]
+        if existing[:len(keys)] == keys:
+            return True
+    return False
+
+
+def advise(db, top=20, create=INDEX_ADVISOR_AUTO_CREATE):
+    """Explain the most frequent shapes and recommend (or create) indexes. Returns a report list."""
+    with _lock:
+        ranked = [(_shape_samples[key], count) for key, count in _shape_counts.most_common(top)]
+
+    report = []
+    for (shape, plan), count in ranked:
+        entry = {"collection": shape["collection"], "shape": shape, "executions": count}
+        try:
+            explain = explain_plan(db, plan)
+        except Exception as e:
+            entry["error"] = str(e)
+            report.append(entry)
+            continue
+
+        docs_examined, returned, millis = _execution_numbers(explain)
+        entry.update({
+            "collscan": "COLLSCAN" in _winning_stages(explain),
+            "docs_examined": docs_examined,
+            "returned": returned,
+            "execution_ms": millis,
+        })
+
+        recommendations = []
+        keys = recommend_index(shape)
+        ratio = docs_examined / max(returned, 1)
+        if keys and (entry["collscan"] or ratio >= INDEX_ADVISOR_MIN_RATIO):
+            if not _is_covered(keys, db[shape["collection"]].index_information()):
+                #  With a matching index the server examines roughly what it returns
+                recommendations.append({
+                    "collection": shape["collection"],
+                    "keys": keys,
+                    "estimated_docs_examined": returned,
+                    "estimated_gain": round(1 - returned / docs_examined, 3) if docs_examined else 0.0,
+                    #  Over the executions in the log, whatever period it covers
+                    "estimated_docs_saved": (docs_examined - returned) * count,
+                })
+        for target, foreign_field in shape["lookups"]:
+            if foreign_field != "_id" and not _is_covered([(foreign_field, 1)], db[target].index_information()):
+                recommendations.append({
+                    "collection": target,
+                    "keys": [(foreign_field, 1)],
+                    "reason": f"$lookup from {shape['collection']} probes {target}.{foreign_field} once per document",
+                })
+
+        for recommendation in recommendations:
+            if create:
+                recommendation["created"] = db[recommendation["collection"]].create_index(recommendation["keys"])
+        entry["recommendations"] = recommendations
+        report.append(entry)
+    return report
+
+
+def format_report(report):
+    lines = []
+    for entry in report:
+        lines.append(f"{entry['collection']}  x{entry['executions']}  shape={json.dumps(entry['shape'], default=list)}")
+        if "error" in entry:
+            lines.append(f"    explain failed: {entry['error']}")
+            continue
+        scan = "COLLSCAN" if entry["collscan"] else "index"
+        lines.append(f"    {scan}: examined {entry['docs_examined']} docs to return {entry['returned']} ({entry['execution_ms']} ms)")
+        for recommendation in entry["recommendations"]:
+            keys = ", ".join(f"{field}: {direction}" for field, direction in recommendation["keys"])
+            gain = recommendation.get("estimated_gain")
+            detail = f"~{gain:.0%} fewer docs examined" if gain is not None else recommendation.get("reason", "")
+            created = f"  [created {recommendation['created']}]" if recommendation.get("created") else ""
+            lines.append(f"    -> db.{recommendation['collection']}.create_index({{{keys}}})  {detail}{created}")
+    return "\n".join(lines) or "No query shapes recorded yet."
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--log", default=INDEX_ADVISOR_LOG, help="JSONL log of executed queries")
+    parser.add_argument("--top", type=int, default=20, help="number of most frequent shapes to explain")
+    parser.add_argument("--create", action="store_true", help="create the recommended indexes")
+    args = parser.parse_args()
+
+    from query_handler import get_db_connection
+    if not args.log or not os.path.exists(args.log):
+        parser.error("no query log found; set INDEX_ADVISOR_LOG while the chatbot runs, or pass --log")
+    load_shape_log(args.log)
+    print(format_report(advise(get_db_connection(), top=args.top, create=args.create or INDEX_ADVISOR_AUTO_CREATE)))
+
+
+if __name__ == "__main__":
+    main()
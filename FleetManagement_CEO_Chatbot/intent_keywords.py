@@ -1,8 +1,67 @@
-DATA_QUERY_KEYWORDS = [
-    "trip", "trips", "tripplanners",
-    "fleet", "fleets", "vehicle", "vehicles",
-    "orders", "deliveries", "returns", "spot sale",
-    "malfunctioned", "verified", "scheduled",
-    "delivery returns", "stock returns", "invoices",
-    "driver", "drivers"
-]
+#  Keyword -> (collections it points at, weight). Weight 1.0 = clearly a data question on its own,
+#  lower weights are supporting words that only add confidence: each stays below INTENT_MIN_CONFIDENCE (0.5),
+#  so "delivery vans" alone is not a data question but "quantity ... delivered" is.
+INTENT_KEYWORDS = {
+    # English
+    "trip": (["tripplanners"], 1.0),
+    "trips": (["tripplanners"], 1.0),
+    "tripplanners": (["tripplanners"], 1.0),
+    "fleet": (["fleets"], 1.0),
+    "fleets": (["fleets"], 1.0),
+    "vehicle": (["fleets"], 1.0),
+    "vehicles": (["fleets"], 1.0),
+    "number plate": (["fleets"], 0.8),
+    "driver": (["users", "tripplanners"], 1.0),
+    "drivers": (["users", "tripplanners"], 1.0),
+    "user": (["users"], 1.0),
+    "users": (["users"], 1.0),
+    "orders": (["tripplanners"], 0.45),
+    "deliveries": (["tripplanners"], 0.45),
+    "delivery": (["tripplanners"], 0.4),
+    "spot sale": (["tripplanners"], 0.45),
+    "sales": (["tripplanners"], 0.35),
+    "sale": (["tripplanners"], 0.35),
+    "sold": (["tripplanners"], 0.4),
+    "delivered": (["tripplanners"], 0.4),
+    "quantity": (["tripplanners"], 0.35),
+    "qty": (["tripplanners"], 0.35),
+    "items": (["tripplanners"], 0.3),
+    "returns": (["tripplanners"], 0.35),
+    "delivery returns": (["tripplanners"], 0.45),
+    "stock returns": (["tripplanners"], 0.45),
+    "invoices": (["invoices"], 0.9),
+    "customer": (["tripplanners"], 0.4),
+    "customers": (["tripplanners"], 0.4),
+    "odometer": (["tripplanners"], 0.45),
+    "distance": (["tripplanners"], 0.3),
+    "malfunctioned": (["tripplanners", "fleets"], 0.4),
+    "verified": (["tripplanners"], 0.3),
+    "scheduled": (["tripplanners"], 0.3),
+    "assigned": (["tripplanners"], 0.3),
+    "ongoing": (["tripplanners"], 0.3),
+    "cancelled": (["tripplanners"], 0.3),
+    "completed": (["tripplanners"], 0.3),
+    "breakdown": ([], 0.3),
+    "how many": ([], 0.3),
+    "count": ([], 0.3),
+    "list": ([], 0.2),
+    # Tamil (ta-IN voice input). Stems: suffixes such as -கள், -இன், -இல் may follow.
+    "பயணம்": (["tripplanners"], 1.0),
+    "பயண": (["tripplanners"], 1.0),
+    "ட்ரிப்": (["tripplanners"], 1.0),
+    "வாகன": (["fleets"], 1.0),
+    "வண்டி": (["fleets"], 1.0),
+    "ஃப்ளீட்": (["fleets"], 1.0),
+    "ஓட்டுநர்": (["users", "tripplanners"], 1.0),
+    "டிரைவர்": (["users", "tripplanners"], 1.0),
+    "ஆர்டர்": (["tripplanners"], 0.45),
+    "டெலிவரி": (["tripplanners"], 0.45),
+    "விநியோக": (["tripplanners"], 0.45),
+    "விற்பனை": (["tripplanners"], 0.4),
+    "வாடிக்கையாளர்": (["tripplanners"], 0.4),
+    "பழுதடைந்த": (["tripplanners", "fleets"], 0.4),
+    "ரத்து": (["tripplanners"], 0.3),
+    "முடிந்த": (["tripplanners"], 0.3),
+    "திட்டமிடப்பட்ட": (["tripplanners"], 0.3),
+    "எத்தனை": ([], 0.3),
+}
@@ -0,0 +1,112 @@
+import os
+import unicodedata
+from collections import deque
+from intent_keywords import INTENT_KEYWORDS
+
+#  Minimum data confidence for a question to take the query path
+INTENT_MIN_CONFIDENCE = float(os.getenv("INTENT_MIN_CONFIDENCE", "0.5"))
+
+
+def _is_word_char(char):
+    #  Letters, digits and Tamil combining marks (virama, vowel signs) all belong to a word
+    return char.isalnum() or char == "_" or unicodedata.category(char).startswith("M")
+
+
+def _is_tamil(text):
+    return any("\u0b80" <= char <= "\u0bff" for char in text)
+
+
+class KeywordAutomaton:
+    """Aho-Corasick automaton over lower-cased keywords, matching on word boundaries.
+
+    Every keyword must start at a word boundary. English keywords must also end on one;
+    Tamil keywords are stems and may be followed by case/plural suffixes.
+    """
+
+    def __init__(self, keywords):
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        self._stems = {keyword.lower() for keyword in keywords if _is_tamil(keyword)}
+        for keyword in keywords:
+            self._add(keyword.lower())
+        self._build_failure_links()
+
+    def _add(self, keyword):
+        state = 0
+        for char in keyword:
+            if char not in self._goto[state]:
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+                self._goto[state][char] = len(self._goto) - 1
+            state = self._goto[state][char]
+        self._output[state].append(keyword)
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def find(self, text):
+        """Return [(keyword, start, end)] for every boundary-respecting match in text."""
+        text = text.lower()
+        matches = []
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for keyword in self._output[state]:
+                start, end = index - len(keyword) + 1, index + 1
+                if start > 0 and _is_word_char(text[start - 1]):
+                    continue
+                if end < len(text) and _is_word_char(text[end]) and keyword not in self._stems:
+                    continue
+                matches.append((keyword, start, end))
+        return matches
+
+
+_automaton = KeywordAutomaton(INTENT_KEYWORDS)
+
+
+def route_intent(user_query):
+    """Classify a question as "data" or "general" and name the collections it is about.
+
+    Returns {"intent", "collections", "confidence", "keywords"}.
+    """
+    matches = _automaton.find(user_query)
+
+    #  Prefer the longest keyword where matches overlap ("delivery returns" over "returns")
+    matches.sort(key=lambda match: (match[1], -(match[2] - match[1])))
+    keywords = []
+    covered_until = -1
+    for keyword, start, end in matches:
+        if start >= covered_until:
+            keywords.append(keyword)
+            covered_until = end
+
+    #  Noisy-OR of keyword weights: independent pieces of evidence that this is a data question
+    miss_probability = 1.0
+    collection_scores = {}
+    for keyword in keywords:
+        collections, weight = INTENT_KEYWORDS[keyword]
+        miss_probability *= 1.0 - weight
+        for rank, collection in enumerate(collections):
+            collection_scores[collection] = collection_scores.get(collection, 0.0) + weight / (rank + 1)
+
+    data_confidence = 1.0 - miss_probability
+    intent = "data" if data_confidence >= INTENT_MIN_CONFIDENCE else "general"
+    return {
+        "intent": intent,
+        "collections": sorted(collection_scores, key=collection_scores.get, reverse=True),
+        "confidence": round(data_confidence if intent == "data" else 1.0 - data_confidence, 3),
+        "keywords": keywords,
+    }
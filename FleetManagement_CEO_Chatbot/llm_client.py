@@ -1,4 +1,4 @@
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 from dotenv import load_dotenv
 import os
 
@@ -8,8 +8,18 @@ load_dotenv()
 # Get the API key from environment
 api_key = os.getenv("GEMINI_API_KEY")
 
-# Set up the Gemini-compatible client
+# OpenAI-compatible endpoint (point it at a local fake server for testing)
+base_url = os.getenv("LLM_BASE_URL", "https://generativelanguage.googleapis.com/v1beta/openai/")
+
+# Set up the Gemini-compatible clients; retries are handled by llm_gateway
 client = OpenAI(
     api_key=api_key,
-    base_url="https://generativelanguage.googleapis.com/v1beta/openai/"
-)
\ No newline at end of file
+    base_url=base_url,
+    max_retries=0
+)
+
+async_client = AsyncOpenAI(
+    api_key=api_key,
+    base_url=base_url,
+    max_retries=0
+)
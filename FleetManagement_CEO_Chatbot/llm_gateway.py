@@ -0,0 +1,243 @@
+import os
+import time
+import random
+import asyncio
+import threading
+import weakref
+import openai
+import llm_client
+from tracing import span, incr
+
+#  Gateway settings
+LLM_TIMEOUT_S = float(os.getenv("LLM_TIMEOUT_S", "30"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE_S = float(os.getenv("LLM_BACKOFF_BASE_S", "0.5"))
+LLM_BACKOFF_MAX_S = float(os.getenv("LLM_BACKOFF_MAX_S", "8"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+
+#  Model per pipeline stage; LLM_MODEL is the default for every stage
+DEFAULT_MODEL = os.getenv("LLM_MODEL", "give any gemini model of your choice & requirement")
+STAGE_MODELS = {
+    "query": os.getenv("LLM_MODEL_QUERY", DEFAULT_MODEL),
+    "summary": os.getenv("LLM_MODEL_SUMMARY", DEFAULT_MODEL),
+    "fallback": os.getenv("LLM_MODEL_FALLBACK", DEFAULT_MODEL),
+}
+
+
+class LLMGatewayError(RuntimeError):
+    """Raised when an LLM call fails after retries or runs past its deadline."""
+
+
+_clients = {"sync": llm_client.client, "async": llm_client.async_client}
+_sync_slots = threading.BoundedSemaphore(LLM_MAX_CONCURRENCY)
+_async_slots = weakref.WeakKeyDictionary()
+_usage_lock = threading.Lock()
+_usage = {}
+
+
+def set_clients(sync_client=None, async_client=None):
+    """Swap the underlying OpenAI-compatible clients (e.g. for a local fake server or a stub)."""
+    if sync_client is not None:
+        _clients["sync"] = sync_client
+    if async_client is not None:
+        _clients["async"] = async_client
+
+
+def model_for(stage):
+    return STAGE_MODELS.get(stage, DEFAULT_MODEL)
+
+
+def get_usage_stats():
+    """Per-stage call counts, failures, retries, token totals and latency."""
+    with _usage_lock:
+        stats = {stage: dict(values) for stage, values in _usage.items()}
+    for values in stats.values():
+        values["avg_latency_ms"] = values["latency_ms"] / values["calls"] if values["calls"] else 0.0
+    return stats
+
+
+def reset_usage_stats():
+    with _usage_lock:
+        _usage.clear()
+
+
+def _record(stage, started, attempts, ok, usage=None):
+    incr("llm_calls", stage=stage)
+    if attempts > 1:
+        incr("llm_retries", attempts - 1, stage=stage)
+    if not ok:
+        incr("llm_failures", stage=stage)
+    with _usage_lock:
+        values = _usage.setdefault(stage, {
+            "calls": 0, "failures": 0, "retries": 0,
+            "prompt_tokens": 0, "completion_tokens": 0, "latency_ms": 0.0,
+        })
+        values["calls"] += 1
+        values["failures"] += 0 if ok else 1
+        values["retries"] += max(attempts - 1, 0)
+        values["latency_ms"] += (time.perf_counter() - started) * 1000
+        if usage is not None:
+            values["prompt_tokens"] += getattr(usage, "prompt_tokens", 0) or 0
+            values["completion_tokens"] += getattr(usage, "completion_tokens", 0) or 0
+
+
+def _is_retryable(error):
+    if isinstance(error, (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+
+def _backoff_delay(error, attempt):
+    #  Honour Retry-After when the server sends one, otherwise exponential backoff with jitter
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), LLM_BACKOFF_MAX_S)
+        except ValueError:
+            pass
+    delay = min(LLM_BACKOFF_BASE_S * (2 ** attempt), LLM_BACKOFF_MAX_S)
+    return delay * (0.5 + random.random() / 2)
+
+
+def _remaining(deadline):
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise LLMGatewayError("LLM call deadline exceeded")
+    return remaining
+
+
+def complete(stage, messages, timeout=LLM_TIMEOUT_S, **kwargs):
+    """Blocking chat completion for a pipeline stage; returns the message text."""
+    with span(f"llm.{stage}", model=model_for(stage)):
+        return _complete(stage, messages, timeout, **kwargs)
+
+
+def _complete(stage, messages, timeout, **kwargs):
+    deadline = time.monotonic() + timeout
+    started = time.perf_counter()
+    attempt = 0
+
+    if not _sync_slots.acquire(timeout=_remaining(deadline)):
+        _record(stage, started, 0, ok=False)
+        raise LLMGatewayError("Timed out waiting for an LLM concurrency slot")
+    try:
+        while True:
+            attempt += 1
+            try:
+                response = _clients["sync"].chat.completions.create(
+                    model=model_for(stage), n=1, messages=messages, timeout=_remaining(deadline), **kwargs
+                )
+                _record(stage, started, attempt, ok=True, usage=getattr(response, "usage", None))
+                return response.choices[0].message.content
+            except openai.OpenAIError as e:
+                if not _is_retryable(e) or attempt > LLM_MAX_RETRIES:
+                    _record(stage, started, attempt, ok=False)
+                    raise LLMGatewayError(f"{stage} LLM call failed: {e}") from e
+                delay = _backoff_delay(e, attempt - 1)
+                if time.monotonic() + delay >= deadline:
+                    _record(stage, started, attempt, ok=False)
+                    raise LLMGatewayError(f"{stage} LLM call deadline exceeded after {attempt} attempts") from e
+                time.sleep(delay)
+    finally:
+        _sync_slots.release()
+
+
+def stream(stage, messages, timeout=LLM_TIMEOUT_S, **kwargs):
+    """Streamed chat completion; yields text deltas. Retries only happen before the first chunk.
+
+    The concurrency slot is held until the stream is exhausted or closed, so callers that may stop
+    reading early should wrap it in contextlib.closing().
+    """
+    with span(f"llm.{stage}", model=model_for(stage), stream=True):
+        yield from _stream(stage, messages, timeout, **kwargs)
+
+
+def _stream(stage, messages, timeout, **kwargs):
+    deadline = time.monotonic() + timeout
+    started = time.perf_counter()
+    attempt = 0
+
+    if not _sync_slots.acquire(timeout=_remaining(deadline)):
+        _record(stage, started, 0, ok=False)
+        raise LLMGatewayError("Timed out waiting for an LLM concurrency slot")
+    try:
+        while True:
+            attempt += 1
+            try:
+                response = _clients["sync"].chat.completions.create(
+                    model=model_for(stage), n=1, messages=messages, stream=True, timeout=_remaining(deadline), **kwargs
+                )
+                break
+            except openai.OpenAIError as e:
+                delay = _backoff_delay(e, attempt - 1)
+                if not _is_retryable(e) or attempt > LLM_MAX_RETRIES or time.monotonic() + delay >= deadline:
+                    _record(stage, started, attempt, ok=False)
+                    raise LLMGatewayError(f"{stage} LLM stream failed: {e}") from e
+                time.sleep(delay)
+
+        usage = None
+        try:
+            for chunk in response:
+                usage = getattr(chunk, "usage", None) or usage
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+                #  The deadline covers the whole answer, not just the first chunk
+                if time.monotonic() >= deadline:
+                    _record(stage, started, attempt, ok=False, usage=usage)
+                    raise LLMGatewayError(f"{stage} LLM stream deadline exceeded")
+        finally:
+            #  Also runs when the consumer closes the generator early: drop the HTTP connection
+            close = getattr(response, "close", None)
+            if close is not None:
+                close()
+        _record(stage, started, attempt, ok=True, usage=usage)
+    finally:
+        _sync_slots.release()
+
+
+def _async_slots_for_loop():
+    #  asyncio primitives belong to one event loop, so keep a semaphore per running loop
+    loop = asyncio.get_running_loop()
+    slots = _async_slots.get(loop)
+    if slots is None:
+        slots = _async_slots[loop] = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+    return slots
+
+
+async def acomplete(stage, messages, timeout=LLM_TIMEOUT_S, **kwargs):
+    """Async chat completion for a pipeline stage; returns the message text."""
+    with span(f"llm.{stage}", model=model_for(stage)):
+        return await _acomplete(stage, messages, timeout, **kwargs)
+
+
+async def _acomplete(stage, messages, timeout, **kwargs):
+    deadline = time.monotonic() + timeout
+    started = time.perf_counter()
+    attempt = 0
+
+    try:
+        await asyncio.wait_for(_async_slots_for_loop().acquire(), _remaining(deadline))
+    except asyncio.TimeoutError:
+        _record(stage, started, 0, ok=False)
+        raise LLMGatewayError("Timed out waiting for an LLM concurrency slot")
+    try:
+        while True:
+            attempt += 1
+            try:
+                response = await _clients["async"].chat.completions.create(
+                    model=model_for(stage), n=1, messages=messages, timeout=_remaining(deadline), **kwargs
+                )
+                _record(stage, started, attempt, ok=True, usage=getattr(response, "usage", None))
+                return response.choices[0].message.content
+            except openai.OpenAIError as e:
+                if not _is_retryable(e) or attempt > LLM_MAX_RETRIES:
+                    _record(stage, started, attempt, ok=False)
+                    raise LLMGatewayError(f"{stage} LLM call failed: {e}") from e
+                delay = _backoff_delay(e, attempt - 1)
+                if time.monotonic() + delay >= deadline:
+                    _record(stage, started, attempt, ok=False)
+                    raise LLMGatewayError(f"{stage} LLM call deadline exceeded after {attempt} attempts") from e
+                await asyncio.sleep(delay)
+    finally:
+        _async_slots_for_loop().release()
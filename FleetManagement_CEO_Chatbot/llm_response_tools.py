@@ -1,47 +1,74 @@
 import json
 import pandas as pd
 import re
-from llm_client import client
-from intent_keywords import DATA_QUERY_KEYWORDS 
+from contextlib import closing
+from llm_gateway import complete, stream
+from intent_router import route_intent
+from query_cache import query_cache, resolve_relative_dates
+from query_plan import parse_query_plan, execute_query_plan
+from result_pipeline import collect_results, serialize_for_prompt, truncation_note, RESULT_TOKEN_BUDGET
+from rollups import answer_from_rollup, staleness_note
+from index_advisor import record_query_shape
+from cost_guard import check_query_cost, CostGuardError
+from tracing import span, incr, error, trace, resume
+from history_manager import history_for
+from result_cache import result_cache
+from dimension_cache import dimension_cache
+from multi_query import decompose_question, run_sub_queries, merge_dataframes
+from example_store import example_store, format_examples
+from schema_context import build_schema_context, record_schema_usage
+from result_digest import build_digest, needs_digest, RESULT_DIGEST_SAMPLE_ROWS
 from query_handler import (
-    get_db_schema,
+    get_schema_version,
     get_db_connection,
-    convert_bson,
     clean_generated_query,
     extract_mongo_query,
     format_query_for_eval,
     map_status_in_query
 )
 # Agent to generate mongo query
-def generate_mongo_query_from_user_query(user_query, history_context=""):
-    schema = get_db_schema() 
-    # Get schema and sample data
-    schema_str = json.dumps(schema, indent=2)[:5000]
-    
+def generate_mongo_query_from_user_query(user_query, history_context="", route=None):
+    #  Reuse the query already generated for the same normalized question, schema version and history
+    history_str = history_for(history_context, "query")
+    cached_query = query_cache.get(user_query, get_schema_version(), history_str)
+    if cached_query:
+        incr("query_cache_hits")
+        return cached_query
+    incr("query_cache_misses")
+
+    #  Most relevant collections first, within the schema token budget
+    route = route or route_intent(user_query)
+    with span("schema"):
+        schema_str = build_schema_context(user_query, route)
+
+    #  Give the LLM concrete dates instead of "yesterday", "last week", ...
+    user_query = resolve_relative_dates(user_query)
+
+    #  Similar questions that already produced working queries (stored with their dates resolved too)
+    examples_str = format_examples(example_store.search(user_query))
+
     #  Convert status names to numbers in user query
-    if any(keyword in user_query.lower() for keyword in ["trip", "trips", "tripplanners"]):
+    if "tripplanners" in route["collections"]:
         user_query = map_status_in_query(user_query)  # Apply status mapping only for trip queries
-        print(user_query)
 
     prompt = f"""
     You are an expert in MongoDB. Give your prompt
 
-    Database Schema and Sample Data: {schema_str}
+    Database Schema (collection: field:type, ObjectId fields show ->referenced collection):
+    {schema_str}
+    {dimension_cache.prompt_hint()}
 
-    Conversation history: {history_context}
+    {examples_str}
+
+    Conversation history: {history_str}
  
     Current User Question: {user_query}
 
     MongoDB Query:
     """
 
-    response = client.chat.completions.create(
-        model="give any gemini model of your choice & requirement",
-        n=1,
-        messages=[{"role": "user", "content": prompt}]
-    )
-
-    mongo_query = response.choices[0].message.content.strip()
+    with span("query_generation"):
+        mongo_query = complete("query", [{"role": "user", "content": prompt}]).strip()
     
     #  Extract only the valid query
     mongo_query = extract_mongo_query(mongo_query)
@@ -54,75 +81,301 @@ def generate_mongo_query_from_user_query(user_query, history_context=""):
     mongo_query = clean_generated_query(mongo_query,user_query)
     return mongo_query
 
-def generate_natural_response(user_query, history_context=""):
-    try:
-        #  First: Handle system-level/general/smalltalk responses
-        fallback_response = handle_no_query_case(user_query, history_context)
+def run_data_query(user_query, history_context="", route=None):
+    """Generate and execute the query for a data question.
 
-        #  Intent check for data-related terms
-        if any(keyword in user_query.lower() for keyword in DATA_QUERY_KEYWORDS):
-            mongo_query = generate_mongo_query_from_user_query(user_query, history_context)
+    Returns (mongo_query, result_set), or None when no valid query could be generated.
+    """
+    route = route or route_intent(user_query)
+
+    #  Common aggregates are answered from the rollup collections without an LLM call
+    mongo_query = answer_from_rollup(user_query, route)
+    from_rollup = mongo_query is not None
+    if from_rollup:
+        incr("rollup_answers")
+    else:
+        mongo_query = generate_mongo_query_from_user_query(user_query, history_context, route)
+
+    #  If query is invalid or empty, the caller falls back (the general answer is only requested when needed)
+    if not mongo_query or not is_valid_mongo_query(mongo_query):
+        incr("invalid_queries")
+        return None
+
+    #  Parse into a structured plan and execute it with a limit, projection and maxTimeMS
+    query_plan = parse_query_plan(mongo_query)
+    db = get_db_connection()
+
+    with span("execution", rollup=from_rollup):
+        #  The same plan read recently, with none of its collections changed since
+        result_set = result_cache.get(query_plan)
+        if result_set is None:
+            versions = result_cache.versions_for(query_plan)
+
+            #  Explain first: expensive queries are narrowed (e.g. a date window) or rejected with CostGuardError
+            with span("cost_guard"):
+                guarded_plan, guard_notes = check_query_cost(db, query_plan)
+            with span("execute", collection=guarded_plan.collection, operation=guarded_plan.operation):
+                results = execute_query_plan(db, guarded_plan)
+            record_query_shape(guarded_plan, mongo_query)
+
+            #  Read the results in batches, bounded by the row budget
+            with span("convert"):
+                result_set = collect_results(results)
+            #  Fleet / driver details come from the in-memory dimension maps, not a $lookup
+            with span("enrich"):
+                dimension_cache.enrich(result_set.table, guarded_plan.collection)
+            result_set.notes = guard_notes
+            rollup_note = staleness_note(mongo_query) if from_rollup else None
+            if rollup_note:
+                result_set.notes.append(rollup_note)
+            result_cache.put(query_plan, result_set, versions)
+
+    #  The query executed fine, so it is safe to reuse for the same question in the same context
+    if not from_rollup:
+        query_cache.put(user_query, get_schema_version(), mongo_query, history_for(history_context, "query"))
+        record_schema_usage(query_plan.collections())
+        if result_set.row_count and result_set.count != 0:
+            #  Stored with the dates the query was written for, so "yesterday" does not pair with a stale date later
+            example_store.add(resolve_relative_dates(user_query), mongo_query)
+
+    return mongo_query, result_set
 
-            #  If query is invalid or empty, fallback
-            if not mongo_query or not is_valid_mongo_query(mongo_query):
-                return fallback_response
+def run_multi_query(sub_questions, history_context=""):
+    """Generate and execute the sub-queries of a compound question concurrently.
 
-            #  Execute MongoDB query
-            db = get_db_connection()
-            results = eval(mongo_query, {"db": db})
+    Returns a list of (sub_question, mongo_query, result_set) with result_set None for parts that
+    could not be answered, or None when no part could be answered.
+    """
+    outcomes = run_sub_queries(sub_questions, run_data_query, history_context)
+    parts = []
+    for question, outcome in zip(sub_questions, outcomes):
+        if isinstance(outcome, tuple):
+            parts.append((question, *outcome))
+        else:
+            #  No valid query, a cost guard rejection or an execution error: say so in the answer
+            parts.append((question, str(outcome) if isinstance(outcome, CostGuardError) else None, None))
+    if not any(result_set is not None for _, _, result_set in parts):
+        return None
+    return parts
+
+COST_GUARD_MESSAGE = (
+    "That question would need to scan too much data to answer quickly. "
+    "Please narrow it down, for example to a date range, a fleet or a trip status."
+)
+
+def generate_natural_response(user_query, history_context=""):
+    with trace(user_query):
+        return _natural_response(user_query, history_context)
 
-            #  Format results
-            if isinstance(results, int):
-                results_list = [{"count": results}]
-            else:
-                results_list = [convert_bson(doc) for doc in results]
+def _natural_response(user_query, history_context=""):
+    try:
+        #  Intent check for data-related terms
+        route = route_intent(user_query)
+        if route["intent"] == "data":
+            #  Compound questions: independent sub-queries run concurrently, then one summary
+            sub_questions = decompose_question(user_query)
+            parts = run_multi_query(sub_questions, history_context) if sub_questions else None
+            if parts is not None:
+                return generate_multi_llm_response(user_query, history_context, parts)
 
-            results_str = json.dumps(results_list, indent=2)
+            query_result = run_data_query(user_query, history_context, route)
+            if query_result is None:
+                return handle_no_query_case(user_query, history_context)
 
             #  Use LLM to summarize result
-            return generate_llm_response(user_query, history_context, mongo_query, results_list, results_str)
+            mongo_query, result_set = query_result
+            return generate_llm_response(user_query, history_context, mongo_query, result_set)
 
-        #  If not a data query, return fallback (general/system response)
-        return fallback_response
+        #  If not a data query, handle system-level/general/smalltalk responses
+        return handle_no_query_case(user_query, history_context)
+
+    except CostGuardError as e:
+        error("cost_guard", e, estimate=e.estimate)
+        incr("cost_guard_rejections")
+        return {"natural_response": COST_GUARD_MESSAGE, "mongo_query": str(e), "results_df": pd.DataFrame()}
 
     except Exception as e:
-        print("exception:", e)
+        error("pipeline", e)
+        incr("pipeline_errors")
         #  Redirect any unexpected failure to fallback logic
         return handle_no_query_case(user_query, history_context)
 
+def generate_natural_response_stream(user_query, history_context=""):
+    """Streaming variant of generate_natural_response.
+
+    The query and result stages complete before this returns; "natural_response_stream" is a
+    generator of answer text chunks to render as they arrive.
+    """
+    #  The question's trace stays open until the streamed answer has been consumed
+    with trace(user_query, finish=False) as question_trace:
+        response = _natural_response_stream(user_query, history_context)
+    response["natural_response_stream"] = _finish_trace_after(response["natural_response_stream"], question_trace)
+    return response
+
+def _finish_trace_after(chunks, question_trace):
+    with resume(question_trace):
+        yield from chunks
+
+def _natural_response_stream(user_query, history_context=""):
+    try:
+        route = route_intent(user_query)
+        if route["intent"] == "data":
+            sub_questions = decompose_question(user_query)
+            parts = run_multi_query(sub_questions, history_context) if sub_questions else None
+            if parts is not None:
+                return stream_multi_llm_response(user_query, history_context, parts)
+
+            query_result = run_data_query(user_query, history_context, route)
+            if query_result is not None:
+                mongo_query, result_set = query_result
+                return stream_llm_response(user_query, history_context, mongo_query, result_set)
+    except CostGuardError as e:
+        error("cost_guard", e, estimate=e.estimate)
+        incr("cost_guard_rejections")
+        return {"natural_response_stream": iter([COST_GUARD_MESSAGE]), "mongo_query": str(e), "results_df": pd.DataFrame()}
+    except Exception as e:
+        error("pipeline", e)
+        incr("pipeline_errors")
+
+    return stream_no_query_case(user_query, history_context)
+
+def _stream_completion(stage, messages):
+    """Yield the text deltas of a streamed chat completion."""
+    try:
+        with span("summarization" if stage == "summary" else stage), closing(stream(stage, messages)) as chunks:
+            yield from chunks
+    except Exception as e:
+        error("stream", e, stage=stage)
+        incr("stream_errors", stage=stage)
+        yield "\n\n⚠️ Sorry, the answer could not be completed. Please try again."
+
 #Agent to generate natural response with query results
-def generate_llm_response(user_query, history_context, mongo_query, results_list, results_str):
+def build_results_section(result_set, token_budget=RESULT_TOKEN_BUDGET):
+    """Prompt text for one result set and its truncation note, within token_budget."""
+    if needs_digest(result_set):
+        #  Large result: summarize locally and send the digest plus a small sample of rows
+        digest_str = json.dumps(build_digest(result_set.to_dataframe()), separators=(",", ":"), default=str)
+        sample = result_set.head(RESULT_DIGEST_SAMPLE_ROWS)
+        sample_str, _ = serialize_for_prompt(sample, token_budget)
+        note = truncation_note(result_set, result_set.row_count)
+        results_section = f"""Statistical digest of all {result_set.row_count} rows: {digest_str}
+    A sample of {sample.row_count} rows (columns, then one array per row): {sample_str}"""
+    else:
+        #  Serialize the rows once, compactly, within the prompt token budget
+        results_str, rows_included = serialize_for_prompt(result_set, token_budget)
+        note = truncation_note(result_set, rows_included)
+        results_section = f"The raw results are (columns, then one array per row): {results_str}"
+    return results_section, note
+
+def build_summary_messages(user_query, history_context, mongo_query, result_set):
+    results_section, note = build_results_section(result_set)
+
     format_prompt = f"""
-    Conversation so far: "{history_context}"
+    Conversation so far: "{history_for(history_context, "summary")}"
     Current user query: "{user_query}"
     The MongoDB query executed was: "{mongo_query}"
-    The raw results are: {results_str}
+    {results_section}
+    {note}
+    ***Give me your prompt***
+    """
+
+    return [
+        {"role": "system", "content": format_prompt},
+        {"role": "user", "content": user_query}
+    ]
+
+def generate_llm_response(user_query, history_context, mongo_query, result_set):
+    with span("conversion"):
+        messages = build_summary_messages(user_query, history_context, mongo_query, result_set)
+        with span("dataframe"):
+            results_df = result_set.to_dataframe()
+    with span("summarization"):
+        natural_response = complete("summary", messages)
+
+    return {
+        "natural_response": natural_response,
+        "mongo_query": mongo_query,
+        "results_df": results_df
+    }
+
+def stream_llm_response(user_query, history_context, mongo_query, result_set):
+    with span("conversion"):
+        messages = build_summary_messages(user_query, history_context, mongo_query, result_set)
+        with span("dataframe"):
+            results_df = result_set.to_dataframe()
+    return {
+        "natural_response_stream": _stream_completion("summary", messages),
+        "mongo_query": mongo_query,
+        "results_df": results_df
+    }
+
+def build_multi_summary_messages(user_query, history_context, parts):
+    """One summarization prompt for all sub-queries of a compound question."""
+    answered = sum(result_set is not None for _, _, result_set in parts)
+    #  The sub-results share the prompt token budget
+    token_budget = RESULT_TOKEN_BUDGET // answered
+    sections = []
+    for index, (question, mongo_query, result_set) in enumerate(parts, 1):
+        if result_set is None:
+            reason = "it would scan too much data" if mongo_query else "no query could be generated"
+            sections.append(f"Part {index}: \"{question}\" could not be answered ({reason}). Say so briefly.")
+            continue
+        results_section, note = build_results_section(result_set, token_budget)
+        sections.append(f"""Part {index}: "{question}"
+    The MongoDB query executed was: "{mongo_query}"
+    {results_section}
+    {note}""")
+    sections_str = "\n    ".join(sections)
+
+    format_prompt = f"""
+    Conversation so far: "{history_for(history_context, "summary")}"
+    Current user query: "{user_query}"
+    The question was answered in {len(parts)} parts, each with its own query:
+    {sections_str}
+    Answer every part in one reply, in the order asked.
     ***Give me your prompt***
     """
 
-    messages = [
+    return [
         {"role": "system", "content": format_prompt},
-        {"role": "user", "content": user_query},
-        {"role": "user", "content": f"The MongoDB query executed was: {mongo_query}"},
-        {"role": "user", "content": f"The raw results are: {results_str}"}
+        {"role": "user", "content": user_query}
     ]
 
-    response = client.chat.completions.create(
-        model="give any gemini model of your choice & requirement",
-        n=1,
-        messages=messages
-    )
+def _multi_answer_fields(parts):
+    answered = [(question, result_set) for question, _, result_set in parts if result_set is not None]
+    mongo_query = "\n".join(f"{question} -> {mongo_query}" for question, mongo_query, result_set in parts
+                             if result_set is not None)
+    return mongo_query, merge_dataframes(answered)
+
+def generate_multi_llm_response(user_query, history_context, parts):
+    with span("conversion"):
+        messages = build_multi_summary_messages(user_query, history_context, parts)
+        with span("dataframe"):
+            mongo_query, results_df = _multi_answer_fields(parts)
+    with span("summarization"):
+        natural_response = complete("summary", messages)
 
     return {
-        "natural_response": response.choices[0].message.content,
+        "natural_response": natural_response,
         "mongo_query": mongo_query,
-        "results_df": pd.DataFrame(results_list)
+        "results_df": results_df
+    }
+
+def stream_multi_llm_response(user_query, history_context, parts):
+    with span("conversion"):
+        messages = build_multi_summary_messages(user_query, history_context, parts)
+        with span("dataframe"):
+            mongo_query, results_df = _multi_answer_fields(parts)
+    return {
+        "natural_response_stream": _stream_completion("summary", messages),
+        "mongo_query": mongo_query,
+        "results_df": results_df
     }
 
 # Agent to handle general talks
-def handle_no_query_case(user_query, history_context=""):
+def build_fallback_messages(user_query, history_context=""):
     fallback_prompt = f""" 
-Conversation so far: "{history_context}"
+Conversation so far: "{history_for(history_context, "fallback")}"
 Current user query: "{user_query}"
 
 You are Fleet Management Assist.
@@ -130,20 +383,27 @@ Since no database query was needed, respond naturally and appropriately.
 
 """
 
-
-    messages = [
+    return [
         {"role": "system", "content": fallback_prompt},
         {"role": "user", "content": user_query}
     ]
 
-    response = client.chat.completions.create(
-        model="give any gemini model of your choice & requirement",
-        n=1,
-        messages=messages
-    )
+def handle_no_query_case(user_query, history_context=""):
+    messages = build_fallback_messages(user_query, history_context)
+    incr("fallbacks")
+    with span("fallback"):
+        natural_response = complete("fallback", messages)
+
+    return {
+        "natural_response": natural_response,
+        "mongo_query": "No valid query generated",
+        "results_df": pd.DataFrame()
+    }
 
+def stream_no_query_case(user_query, history_context=""):
+    incr("fallbacks")
     return {
-        "natural_response": response.choices[0].message.content,
+        "natural_response_stream": _stream_completion("fallback", build_fallback_messages(user_query, history_context)),
         "mongo_query": "No valid query generated",
         "results_df": pd.DataFrame()
     }
@@ -0,0 +1,103 @@
+"""Compound questions ("how many trips are ongoing and how many drivers do we have?") split into
+independent sub-questions whose queries are generated and executed concurrently.
+
+The split is a local heuristic (no extra LLM call): a clause boundary followed by a new question word,
+where every part is a data question on its own and none refers back to another, either with a pronoun
+("them", "those"), a definite noun ("show the drivers"), an elided subject ("how many were cancelled")
+or a date scope only an earlier part states.
+"""
+import os
+import re
+import contextvars
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from intent_router import route_intent, INTENT_MIN_CONFIDENCE
+from intent_keywords import INTENT_KEYWORDS
+from query_cache import resolve_relative_dates
+from tracing import span, incr, error
+
+#  Multi-query settings
+MULTI_QUERY_ENABLED = os.getenv("MULTI_QUERY_ENABLED", "1") == "1"
+MULTI_QUERY_MAX_PARTS = int(os.getenv("MULTI_QUERY_MAX_PARTS", "4"))
+MULTI_QUERY_MAX_WORKERS = int(os.getenv("MULTI_QUERY_MAX_WORKERS", "4"))
+
+QUESTION_WORDS = r"(?:how many|how much|how long|which|what|who|when|where|list|show|give|count|top|are there|is there)"
+#  "?" or ";" always ends a question; "and" / "also" / "," only when a new question word follows
+CLAUSE_BOUNDARY = re.compile(
+    rf"\s*[?;]\s*|\s*(?:,\s*)?\b(?:and|also|plus|as well as)\s+(?={QUESTION_WORDS}\b)|\s*,\s*(?={QUESTION_WORDS}\b)",
+    re.IGNORECASE,
+)
+#  A part that points back at another part cannot be answered on its own
+BACK_REFERENCE = re.compile(r"\b(?:them|those|these|they|their|its|it|that one|same)\b", re.IGNORECASE)
+#  "... and show the drivers": a later part naming "the" something means the something of an earlier part
+DEFINITE_REFERENCE = re.compile(
+    rf"^{QUESTION_WORDS}\s+(?:(?:me|us|is|are|was|were|did|do)\s+)?(?:the|their|its|such|each)\b", re.IGNORECASE
+)
+DATE_SCOPE = re.compile(r"\b\d{4}-\d{2}-\d{2}\b|\b(?:january|february|march|april|may|june|july|august|september|"
+                        r"october|november|december|\d{4})\b", re.IGNORECASE)
+MIN_PART_WORDS = 3
+
+_executor = ThreadPoolExecutor(max_workers=MULTI_QUERY_MAX_WORKERS, thread_name_prefix="sub-query")
+
+
+def decompose_question(user_query):
+    """Independent data sub-questions of a compound question, or [] when it should be answered as one."""
+    if not MULTI_QUERY_ENABLED:
+        return []
+    parts = [part.strip(" ,.") for part in CLAUSE_BOUNDARY.split(user_query)]
+    parts = [part for part in parts if part]
+    if not 2 <= len(parts) <= MULTI_QUERY_MAX_PARTS:
+        return []
+    for index, part in enumerate(parts):
+        if len(part.split()) < MIN_PART_WORDS or BACK_REFERENCE.search(part):
+            return []
+        if index and DEFINITE_REFERENCE.search(part):
+            return []
+        route = route_intent(part)
+        if route["intent"] != "data":
+            return []
+        #  "... and how many were cancelled": supporting words alone mean the subject was left to an earlier part
+        if not any(INTENT_KEYWORDS[keyword][1] >= INTENT_MIN_CONFIDENCE for keyword in route["keywords"]):
+            return []
+    #  A date range stated once ("last week ... and which fleets ...") may be meant for every part
+    scoped = [bool(DATE_SCOPE.search(resolve_relative_dates(part))) for part in parts]
+    if any(scoped) and not all(scoped):
+        return []
+    return [part + "?" for part in parts]
+
+
+def _run_part(run_query, question, history_context):
+    with span("sub_query", question=question[:80]):
+        try:
+            return run_query(question, history_context)
+        except Exception as e:
+            error("sub_query", e, question=question[:80])
+            incr("sub_query_errors")
+            return e
+
+
+def run_sub_queries(sub_questions, run_query, history_context=""):
+    """Run run_query(question, history_context) for every sub-question concurrently.
+
+    Returns one outcome per sub-question, in order: run_query's result, or the exception it raised.
+    Wall time is that of the slowest sub-query.
+    """
+    incr("multi_queries")
+    incr("sub_queries", len(sub_questions))
+    #  Each task runs in a copy of the caller's context so its spans land in the question's trace
+    futures = [
+        _executor.submit(contextvars.copy_context().run, _run_part, run_query, question, history_context)
+        for question in sub_questions
+    ]
+    with span("sub_queries", parts=len(sub_questions)):
+        return [future.result() for future in futures]
+
+
+def merge_dataframes(answered):
+    """One DataFrame for display: the rows of every sub-query, tagged with the sub-question they answer."""
+    frames = []
+    for question, result_set in answered:
+        df = result_set.to_dataframe()
+        df.insert(0, "question", question)
+        frames.append(df)
+    return pd.concat(frames, ignore_index=True, sort=False) if frames else pd.DataFrame()
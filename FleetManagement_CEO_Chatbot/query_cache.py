@@ -0,0 +1,131 @@
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+from query_handler import map_status_in_query
+from intent_router import route_intent
+
+#  Cache settings: in-memory LRU size and optional SQLite file for a persistent second tier
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "512"))
+QUERY_CACHE_PATH = os.getenv("QUERY_CACHE_PATH", "")
+
+
+def resolve_relative_dates(user_query, today=None):
+    """Replace relative date phrases (today, last week, last 7 days...) with concrete ISO dates."""
+    today = today or date.today()
+
+    def day_range(start, end):
+        return f"from {start.isoformat()} to {end.isoformat()}"
+
+    def last_n_days(match):
+        days = int(match.group(2))
+        return day_range(today - timedelta(days=days), today)
+
+    week_start = today - timedelta(days=today.weekday())
+    month_start = today.replace(day=1)
+    last_month_end = month_start - timedelta(days=1)
+
+    replacements = [
+        (r"\b(last|past) (\d+) days\b", last_n_days),
+        (r"\bday before yesterday\b", (today - timedelta(days=2)).isoformat()),
+        (r"\byesterday\b", (today - timedelta(days=1)).isoformat()),
+        (r"\btomorrow\b", (today + timedelta(days=1)).isoformat()),
+        (r"\btoday\b", today.isoformat()),
+        (r"\b(last|previous) week\b", day_range(week_start - timedelta(days=7), week_start - timedelta(days=1))),
+        (r"\bthis week\b", day_range(week_start, today)),
+        (r"\b(last|previous) month\b", day_range(last_month_end.replace(day=1), last_month_end)),
+        (r"\bthis month\b", day_range(month_start, today)),
+    ]
+    for pattern, replacement in replacements:
+        user_query = re.sub(pattern, replacement, user_query, flags=re.IGNORECASE)
+    return user_query
+
+
+def normalize_question(user_query, today=None):
+    """Canonical form of a question: lowercase, single-spaced, status names mapped, dates resolved."""
+    normalized = re.sub(r"\s+", " ", user_query.lower()).strip().rstrip("?.! ")
+    if "tripplanners" in route_intent(normalized)["collections"]:
+        normalized = map_status_in_query(normalized)
+    return resolve_relative_dates(normalized, today)
+
+
+class QueryCache:
+    """LRU cache of generated Mongo queries with an optional SQLite tier."""
+
+    def __init__(self, max_size=QUERY_CACHE_SIZE, path=QUERY_CACHE_PATH):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "stores": 0}
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS query_cache (key TEXT PRIMARY KEY, query TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    @staticmethod
+    def make_key(user_query, schema_version, context=""):
+        """Key of a generated query. `context` is the conversation text the prompt included: a follow-up
+        ("what about the completed ones?") only means the same thing under the same history."""
+        normalized = normalize_question(user_query)
+        return hashlib.sha256(f"{schema_version}\n{normalized}\n{context}".encode("utf-8")).hexdigest()
+
+    def get(self, user_query, schema_version, context=""):
+        key = self.make_key(user_query, schema_version, context)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return self._entries[key]
+
+            if self._db is not None:
+                row = self._db.execute("SELECT query FROM query_cache WHERE key = ?", (key,)).fetchone()
+                if row:
+                    self._remember(key, row[0])
+                    self.stats["disk_hits"] += 1
+                    return row[0]
+
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, user_query, schema_version, mongo_query, context=""):
+        key = self.make_key(user_query, schema_version, context)
+        with self._lock:
+            self._remember(key, mongo_query)
+            self.stats["stores"] += 1
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO query_cache (key, query, created) VALUES (?, ?, ?)",
+                    (key, mongo_query, time.time()),
+                )
+                self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM query_cache")
+                self._db.commit()
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats, size=len(self._entries))
+        lookups = stats["hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
+
+    def _remember(self, key, mongo_query):
+        self._entries[key] = mongo_query
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+#  Process-wide cache shared by every session
+query_cache = QueryCache()
@@ -1,14 +1,19 @@
 import re
+import os
 import json
+import time
+import hashlib
+import threading
 from datetime import datetime
 from bson import ObjectId
-from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+from connection_manager import get_database
+from reference_index import build_reference_map
+from tracing import span, incr, error
 
-# MongoDB connection
+# MongoDB connection (shared, pooled client from connection_manager)
 def get_db_connection():
-    client = MongoClient("mongodb://localhost:27017/")
-    db = client["Your DB Name"]
-    return db
+    return get_database()
 
 # Get database schema
 
@@ -26,39 +31,141 @@ def convert_bson(doc):
         return doc
 
 
-def get_db_schema():
-    db = get_db_connection()
+#  Schema cache settings (seconds). The schema is fully re-introspected after the TTL,
+#  and the cheap layout fingerprint is re-checked every SCHEMA_CHECK_INTERVAL.
+SCHEMA_CACHE_TTL = float(os.getenv("SCHEMA_CACHE_TTL", "900"))
+SCHEMA_CHECK_INTERVAL = float(os.getenv("SCHEMA_CHECK_INTERVAL", "30"))
+SCHEMA_WATCH = os.getenv("SCHEMA_WATCH", "0") == "1"
+
+_schema_lock = threading.Lock()
+#  Serializes full introspections; held without _schema_lock so readers of a valid cache never wait on it
+_schema_refresh_lock = threading.Lock()
+_schema_cache = {
+    "schema": None,
+    "version": None,
+    "fingerprint": None,
+    "loaded_at": 0.0,
+    "checked_at": 0.0,
+    "generation": 0,
+}
+_schema_watcher = {"thread": None, "active": False}
+
+
+def compute_schema_fingerprint(db):
+    """Cheap fingerprint of the database layout: collection names and their index keys."""
+    layout = []
+    for collection_name in sorted(db.list_collection_names()):
+        index_keys = sorted(str(list(index["key"].items())) for index in db[collection_name].list_indexes())
+        layout.append([collection_name, index_keys])
+    return hashlib.sha1(json.dumps(layout).encode("utf-8")).hexdigest()
+
+
+def get_db_schema(force_refresh=False):
+    """Return the introspected schema, reusing the process-level cache while it is valid."""
+    return get_db_schema_and_version(force_refresh)[0]
+
+
+def get_db_schema_and_version(force_refresh=False):
+    """(schema, version) taken from the same cache entry, so the version always describes the schema."""
+    with span("get_db_schema"):
+        return _load_db_schema(force_refresh)
+
+
+def _load_db_schema(force_refresh):
+    if SCHEMA_WATCH:
+        start_schema_watcher()
+
+    requested = time.monotonic()
+    if not force_refresh:
+        with _schema_lock:
+            cached = dict(_schema_cache)
+        now = time.monotonic()
+        if cached["schema"] is not None and now - cached["loaded_at"] < SCHEMA_CACHE_TTL:
+            #  A running change-stream watcher invalidates the cache itself, so polling is not needed
+            if _schema_watcher["active"] or now - cached["checked_at"] < SCHEMA_CHECK_INTERVAL:
+                return cached["schema"], cached["version"]
+            #  list_indexes is a round trip per collection, so the poll runs outside the lock
+            if compute_schema_fingerprint(get_db_connection()) == cached["fingerprint"]:
+                with _schema_lock:
+                    if _schema_cache["generation"] == cached["generation"]:
+                        _schema_cache["checked_at"] = max(_schema_cache["checked_at"], now)
+                return cached["schema"], cached["version"]
+
+    with _schema_refresh_lock:
+        with _schema_lock:
+            #  Another caller finished an introspection while this one waited: use it
+            if _schema_cache["schema"] is not None and _schema_cache["loaded_at"] >= requested:
+                return _schema_cache["schema"], _schema_cache["version"]
+            generation = _schema_cache["generation"]
+
+        incr("schema_introspections")
+        db = get_db_connection()
+        fingerprint = compute_schema_fingerprint(db)
+        references = build_reference_map(db)
+        schema = _introspect_db_schema(db, references)
+        version = hashlib.sha1(json.dumps(schema, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+        now = time.monotonic()
+        with _schema_lock:
+            #  An invalidation during introspection may mean this result is already stale: do not cache it
+            if _schema_cache["generation"] == generation:
+                _schema_cache.update({
+                    "schema": schema,
+                    "version": version,
+                    "fingerprint": fingerprint,
+                    "loaded_at": now,
+                    "checked_at": now,
+                })
+        return schema, version
+
+
+def get_schema_version():
+    """Version of the cached schema; changes whenever the introspected schema changes."""
+    return get_db_schema_and_version()[1]
+
+
+def invalidate_schema_cache():
+    """Drop the cached schema so the next call re-introspects the database."""
+    with _schema_lock:
+        _schema_cache.update({"schema": None, "version": None, "fingerprint": None})
+        _schema_cache["generation"] += 1
+
+
+def start_schema_watcher():
+    """Invalidate the schema cache from a change stream of DDL events, when the server supports it."""
+    with _schema_lock:
+        if _schema_watcher["thread"] is not None:
+            return _schema_watcher["active"]
+        thread = threading.Thread(target=_watch_schema_changes, name="schema-watcher", daemon=True)
+        _schema_watcher["thread"] = thread
+        _schema_watcher["active"] = True
+    thread.start()
+    return True
+
+
+def _watch_schema_changes():
+    ddl_events = ["create", "drop", "rename", "dropDatabase", "createIndexes", "dropIndexes", "modify"]
+    pipeline = [{"$match": {"operationType": {"$in": ddl_events}}}]
+    try:
+        with get_db_connection().watch(pipeline, show_expanded_events=True) as stream:
+            for _ in stream:
+                invalidate_schema_cache()
+    except PyMongoError as e:
+        #  Standalone servers have no change streams; fall back to fingerprint polling
+        error("schema_watcher", e)
+    finally:
+        _schema_watcher["active"] = False
+
+
+def _introspect_db_schema(db, references):
     collections = db.list_collection_names()
     schema = {}
 
     for collection_name in collections:
+        collection_references = references.get(collection_name, {})
 
-        # Special handling for tripplanners using lookup
-        if collection_name == "tripplanners":
-            pipeline = [
-                {"$limit": 1},
-                {
-                    "$lookup": {
-                        "from": "fleets",
-                        "localField": "genericdata.fleet",
-                        "foreignField": "_id",
-                        "as": "fleet_info"
-                    }
-                },
-                {
-                    "$lookup": {
-                        "from": "users",
-                        "localField": "genericdata.driver",
-                        "foreignField": "_id",
-                        "as": "driver_info"
-                    }
-                }
-            ]
-            sample_docs = list(db[collection_name].aggregate(pipeline))
-            #print("sampledocs:", sample_docs)
-            sample_doc = sample_docs[0] if sample_docs else None
-        else:
-            sample_doc = db[collection_name].find_one()
+        #  Fleet / driver details are joined locally (dimension_cache), so a plain sample is enough
+        sample_doc = db[collection_name].find_one()
 
         if sample_doc:
             schema[collection_name] = []
@@ -74,7 +181,7 @@ def get_db_schema():
 
                 # Handle ObjectId fields
                 if isinstance(value, ObjectId):
-                    referenced_collection = find_referenced_collection(db, field)
+                    referenced_collection = collection_references.get(full_field)
                     schema[collection_name].append({
                         "name": full_field,
                         "type": "ObjectId",
@@ -102,15 +209,6 @@ def get_db_schema():
     return schema
 
 
-
-def find_referenced_collection(db, field_name):
-    """Check which collection has this field as _id"""
-    for collection in db.list_collection_names():
-        if db[collection].find_one({field_name: {"$exists": True}}):
-            #print(collection)
-            return collection
-    return None
-
 #  Status Mapping for `tripplanners` , give your custom mapping values if needed
 STATUS_MAPPING = {
     "assigned": 0,
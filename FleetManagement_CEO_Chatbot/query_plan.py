@@ -0,0 +1,312 @@
+import os
+import ast
+import json
+from datetime import datetime, timedelta, timezone
+from bson import ObjectId, json_util
+
+#  Execution bounds for generated queries
+QUERY_DEFAULT_LIMIT = int(os.getenv("QUERY_DEFAULT_LIMIT", "1000"))
+QUERY_MAX_LIMIT = int(os.getenv("QUERY_MAX_LIMIT", "5000"))
+QUERY_MAX_TIME_MS = int(os.getenv("QUERY_MAX_TIME_MS", "15000"))
+
+SUPPORTED_OPERATIONS = {"find", "find_one", "aggregate", "count_documents", "count", "distinct"}
+CURSOR_MODIFIERS = {"sort", "limit", "skip"}
+#  Modules a generated query may qualify its helpers with (datetime.datetime.now(), bson.ObjectId(...))
+HELPER_MODULES = {"", "datetime", "datetime.datetime", "bson", "bson.objectid"}
+
+
+class QueryPlanError(ValueError):
+    """Raised when a generated query cannot be turned into a safe query plan."""
+
+
+class QueryPlan:
+    """Structured form of a generated query: what to run, on which collection, with which bounds."""
+
+    def __init__(self, collection, operation, filter=None, projection=None, sort=None,
+                 limit=None, skip=None, pipeline=None, field=None, count=False):
+        self.collection = collection
+        self.operation = operation
+        self.filter = filter or {}
+        self.projection = projection
+        self.sort = sort
+        self.limit = limit
+        self.skip = skip
+        self.pipeline = pipeline
+        self.field = field
+        self.count = count
+
+    def to_dict(self):
+        return {
+            "collection": self.collection,
+            "operation": self.operation,
+            "filter": self.filter,
+            "projection": self.projection,
+            "sort": self.sort,
+            "limit": self.limit,
+            "skip": self.skip,
+            "pipeline": self.pipeline,
+            "field": self.field,
+            "count": self.count,
+        }
+
+    def collections(self):
+        """Every collection the plan reads: the target plus $lookup/$graphLookup/$unionWith sources."""
+        names = [self.collection]
+        for stage in _walk_stages(self.pipeline or []):
+            for operator in ("$lookup", "$graphLookup"):
+                if isinstance(stage.get(operator), dict) and stage[operator].get("from"):
+                    names.append(stage[operator]["from"])
+            union = stage.get("$unionWith")
+            if isinstance(union, str):
+                names.append(union)
+            elif isinstance(union, dict) and union.get("coll"):
+                names.append(union["coll"])
+        return list(dict.fromkeys(names))
+
+    def canonical(self):
+        """Stable text form of the plan, usable as a cache key."""
+        return json.dumps(json.loads(json_util.dumps(self.to_dict())), sort_keys=True, separators=(",", ":"))
+
+    def __repr__(self):
+        return f"QueryPlan({self.canonical()})"
+
+
+def _walk_stages(pipeline):
+    """Yield pipeline stages, including those nested in $lookup/$unionWith/$facet sub-pipelines."""
+    for stage in pipeline:
+        if not isinstance(stage, dict):
+            continue
+        yield stage
+        for operator, value in stage.items():
+            if operator == "$facet" and isinstance(value, dict):
+                for sub_pipeline in value.values():
+                    if isinstance(sub_pipeline, list):
+                        yield from _walk_stages(sub_pipeline)
+            elif isinstance(value, dict) and isinstance(value.get("pipeline"), list):
+                yield from _walk_stages(value["pipeline"])
+
+
+# ---------- Parsing ----------
+
+def parse_query_plan(query_str):
+    """Parse a generated pymongo-style expression (e.g. db.trips.find({...}).limit(5)) into a QueryPlan."""
+    try:
+        node = ast.parse(query_str.strip(), mode="eval").body
+    except SyntaxError as e:
+        raise QueryPlanError(f"Query is not a valid expression: {e}")
+
+    #  Unwrap len(...) / list(...) wrappers
+    count = False
+    while isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in ("len", "list"):
+        if len(node.args) != 1:
+            raise QueryPlanError(f"Unexpected arguments to {node.func.id}()")
+        count = count or node.func.id == "len"
+        node = node.args[0]
+
+    #  Walk the method chain from the outside in: db.<coll>.<operation>(...).<modifier>(...)...
+    modifiers = []
+    while isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr in CURSOR_MODIFIERS:
+        modifiers.append((node.func.attr, node))
+        node = node.func.value
+
+    if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)):
+        raise QueryPlanError("Query must call a collection method")
+    operation = node.func.attr
+    if operation not in SUPPORTED_OPERATIONS:
+        raise QueryPlanError(f"Unsupported operation: {operation}")
+
+    collection = _parse_collection(node.func.value)
+    args = [_literal(arg) for arg in node.args]
+    kwargs = {kw.arg: _literal(kw.value) for kw in node.keywords}
+    plan = QueryPlan(collection, operation, count=count)
+
+    if operation == "aggregate":
+        pipeline = args[0] if args else kwargs.get("pipeline")
+        if not isinstance(pipeline, list) or not all(isinstance(stage, dict) for stage in pipeline):
+            raise QueryPlanError("aggregate() needs a list of pipeline stages")
+        plan.pipeline = pipeline
+    elif operation == "distinct":
+        if not args or not isinstance(args[0], str):
+            raise QueryPlanError("distinct() needs a field name")
+        plan.field = args[0]
+        plan.filter = _as_dict(args[1] if len(args) > 1 else kwargs.get("filter"), "filter")
+    else:
+        plan.filter = _as_dict(args[0] if args else kwargs.get("filter"), "filter")
+        plan.projection = _as_dict(args[1] if len(args) > 1 else kwargs.get("projection"), "projection") or None
+        plan.sort = _parse_sort(kwargs["sort"]) if "sort" in kwargs else None
+        plan.limit = kwargs.get("limit")
+        plan.skip = kwargs.get("skip")
+        if operation == "count":
+            plan.operation = "count_documents"
+        if plan.operation == "count_documents":
+            plan.count = True
+
+    for modifier, call in reversed(modifiers):
+        if operation == "aggregate" or operation == "distinct":
+            raise QueryPlanError(f".{modifier}() is not valid after {operation}()")
+        values = [_literal(arg) for arg in call.args]
+        if modifier == "sort":
+            plan.sort = _parse_sort(*values)
+        elif modifier == "limit":
+            plan.limit = _as_int(values, "limit")
+        elif modifier == "skip":
+            plan.skip = _as_int(values, "skip")
+
+    return plan
+
+
+def _parse_collection(node):
+    name = None
+    if isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name) and node.value.id == "db":
+        name = node.attr
+    elif isinstance(node, ast.Subscript) and isinstance(node.value, ast.Name) and node.value.id == "db":
+        name = _literal(node.slice)
+    elif (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr in ("getCollection", "get_collection")
+            and isinstance(node.func.value, ast.Name) and node.func.value.id == "db" and len(node.args) == 1):
+        name = _literal(node.args[0])
+    if not isinstance(name, str):
+        raise QueryPlanError("Could not determine the collection")
+    if not name or name.startswith(("_", "system.")) or "$" in name or "\0" in name:
+        raise QueryPlanError(f"Invalid collection name: {name!r}")
+    return name
+
+
+def _parse_sort(key_or_list, direction=None):
+    if isinstance(key_or_list, str):
+        return [(key_or_list, direction if direction is not None else 1)]
+    if isinstance(key_or_list, dict):
+        return list(key_or_list.items())
+    if isinstance(key_or_list, list) and all(isinstance(item, (list, tuple)) and len(item) == 2 for item in key_or_list):
+        return [tuple(item) for item in key_or_list]
+    raise QueryPlanError("Unsupported sort specification")
+
+
+def _as_dict(value, name):
+    if value is None:
+        return {}
+    if not isinstance(value, dict):
+        raise QueryPlanError(f"{name} must be a document")
+    return value
+
+
+def _as_int(values, name):
+    if len(values) != 1 or not isinstance(values[0], int):
+        raise QueryPlanError(f"{name}() needs one integer")
+    return values[0]
+
+
+_NAMED_CONSTANTS = {"true": True, "false": False, "null": None, "True": True, "False": False, "None": None}
+
+
+def _literal(node):
+    """Evaluate a literal expression, allowing only the BSON helpers generated queries use."""
+    if isinstance(node, ast.Constant):
+        return node.value
+    if isinstance(node, ast.Dict):
+        if any(key is None for key in node.keys):
+            raise QueryPlanError("Dict unpacking is not allowed")
+        return {_literal(k): _literal(v) for k, v in zip(node.keys, node.values)}
+    if isinstance(node, (ast.List, ast.Tuple)):
+        values = [_literal(item) for item in node.elts]
+        return values if isinstance(node, ast.List) else tuple(values)
+    if isinstance(node, ast.Name) and node.id in _NAMED_CONSTANTS:
+        return _NAMED_CONSTANTS[node.id]
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+        value = _literal(node.operand)
+        if isinstance(value, (int, float)):
+            return -value
+    if isinstance(node, ast.BinOp) and isinstance(node.op, (ast.Add, ast.Sub)):
+        left, right = _literal(node.left), _literal(node.right)
+        if isinstance(left, datetime) and isinstance(right, timedelta):
+            return left + right if isinstance(node.op, ast.Add) else left - right
+    if isinstance(node, ast.Call):
+        return _literal_call(node)
+    raise QueryPlanError(f"Unsupported expression: {ast.dump(node)[:80]}")
+
+
+def _dotted_name(node):
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        qualifier = _dotted_name(node.value)
+        return f"{qualifier}.{node.attr}" if qualifier else None
+    return None
+
+
+def _literal_call(node):
+    dotted = _dotted_name(node.func)
+    if dotted is None:
+        raise QueryPlanError("Only named helper calls are allowed in a query")
+    qualifier, _, name = dotted.rpartition(".")
+    if qualifier not in HELPER_MODULES:
+        raise QueryPlanError(f"Call to {dotted}() is not allowed in a query")
+    args = [_literal(arg) for arg in node.args]
+    kwargs = {kw.arg: _literal(kw.value) for kw in node.keywords}
+
+    if name == "ObjectId" and len(args) == 1 and ObjectId.is_valid(args[0]):
+        return ObjectId(args[0])
+    if name == "ISODate" and len(args) == 1 and isinstance(args[0], str):
+        return datetime.fromisoformat(args[0].replace("Z", "+00:00"))
+    if name == "timedelta":
+        return timedelta(*args, **kwargs)
+    if name in ("now", "utcnow", "today") and not args and not kwargs:
+        return datetime.now(timezone.utc) if name == "utcnow" else datetime.now()
+    if name == "datetime" and args:
+        return datetime(*args, **kwargs)
+    raise QueryPlanError(f"Call to {name}() is not allowed in a query")
+
+
+# ---------- Execution ----------
+
+def execute_query_plan(db, plan):
+    """Run a QueryPlan through pymongo with a row limit and maxTimeMS.
+
+    Only the query's own projection is applied: the schema is a single sampled document capped at
+    a few fields, so a projection derived from it would silently drop fields. The row limit bounds
+    what unprojected finds return.
+
+    Returns an int for counts, otherwise an iterable of documents (a cursor for find/aggregate).
+    """
+    collection = db[plan.collection]
+    limit = min(plan.limit or QUERY_DEFAULT_LIMIT, QUERY_MAX_LIMIT)
+
+    if plan.operation == "aggregate":
+        pipeline = list(plan.pipeline)
+        if plan.count:
+            pipeline.append({"$count": "count"})
+            result = list(collection.aggregate(pipeline, maxTimeMS=QUERY_MAX_TIME_MS))
+            return result[0]["count"] if result else 0
+        last_stage = next(iter(pipeline[-1]), None) if pipeline else None
+        if last_stage == "$limit":
+            #  The model's own trailing $limit still may not exceed the row bound
+            if not isinstance(pipeline[-1]["$limit"], int) or pipeline[-1]["$limit"] > QUERY_MAX_LIMIT:
+                pipeline[-1] = {"$limit": QUERY_MAX_LIMIT}
+        elif last_stage != "$count":
+            pipeline.append({"$limit": limit})
+        return collection.aggregate(pipeline, maxTimeMS=QUERY_MAX_TIME_MS)
+
+    if plan.operation == "distinct":
+        values = collection.distinct(plan.field, plan.filter, maxTimeMS=QUERY_MAX_TIME_MS)
+        return len(values) if plan.count else values[:limit]
+
+    if plan.operation == "count_documents" or plan.count:
+        count_kwargs = {"maxTimeMS": QUERY_MAX_TIME_MS}
+        if plan.skip:
+            count_kwargs["skip"] = plan.skip
+        if plan.limit:
+            count_kwargs["limit"] = plan.limit
+        return collection.count_documents(plan.filter, **count_kwargs)
+
+    projection = plan.projection
+    if plan.operation == "find_one":
+        doc = collection.find_one(plan.filter, projection, sort=plan.sort, max_time_ms=QUERY_MAX_TIME_MS)
+        return [doc] if doc else []
+
+    return collection.find(
+        plan.filter,
+        projection,
+        sort=plan.sort,
+        skip=plan.skip or 0,
+        limit=limit,
+        max_time_ms=QUERY_MAX_TIME_MS,
+    )
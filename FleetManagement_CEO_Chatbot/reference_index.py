@@ -0,0 +1,62 @@
+import os
+from bson import ObjectId
+
+#  How many documents to sample per collection when looking for ObjectId references
+REFERENCE_SAMPLE_SIZE = int(os.getenv("REFERENCE_SAMPLE_SIZE", "20"))
+#  Max ObjectIds sent in one $in probe
+REFERENCE_PROBE_BATCH = 1000
+
+
+def collect_object_ids(doc, parent="", found=None):
+    """Collect ObjectId values per dotted field path, skipping the document's own _id."""
+    if found is None:
+        found = {}
+
+    for field, value in doc.items():
+        full_field = f"{parent}.{field}" if parent else field
+        if full_field == "_id":
+            continue
+
+        if isinstance(value, ObjectId):
+            found.setdefault(full_field, set()).add(value)
+        elif isinstance(value, dict):
+            collect_object_ids(value, full_field, found)
+        elif isinstance(value, list):
+            for item in value:
+                if isinstance(item, ObjectId):
+                    found.setdefault(full_field, set()).add(item)
+                elif isinstance(item, dict):
+                    collect_object_ids(item, full_field, found)
+
+    return found
+
+
+def build_reference_map(db, collection_names=None, sample_size=REFERENCE_SAMPLE_SIZE):
+    """Build {collection: {field_path: referenced_collection}} for every ObjectId field.
+
+    Each collection is sampled once, then every collection's _id index is probed with
+    batched $in queries, so the cost is O(collections) indexed lookups instead of one
+    unindexed find_one per (field, collection) pair.
+    """
+    if collection_names is None:
+        collection_names = db.list_collection_names()
+
+    #  ObjectId value -> {(source collection, field path)} that hold it
+    owners = {}
+    for collection_name in collection_names:
+        for doc in db[collection_name].find({}, limit=sample_size):
+            for field, values in collect_object_ids(doc).items():
+                for value in values:
+                    owners.setdefault(value, set()).add((collection_name, field))
+
+    reference_map = {collection_name: {} for collection_name in collection_names}
+    candidate_ids = list(owners)
+
+    for target in collection_names:
+        for start in range(0, len(candidate_ids), REFERENCE_PROBE_BATCH):
+            batch = candidate_ids[start:start + REFERENCE_PROBE_BATCH]
+            for hit in db[target].find({"_id": {"$in": batch}}, {"_id": 1}):
+                for source, field in owners[hit["_id"]]:
+                    reference_map[source].setdefault(field, target)
+
+    return reference_map
@@ -0,0 +1,172 @@
+"""Cache of query results keyed by the canonical query plan, invalidated when a collection it reads changes.
+
+Collection changes are detected from a change stream when the server supports one (replica sets);
+otherwise each collection's (estimated count, highest _id) is polled at most every
+RESULT_CACHE_CHECK_INTERVAL seconds. Polling only sees inserts and deletes, so entries also expire
+after RESULT_CACHE_TTL seconds to bound staleness from in-place updates.
+"""
+import os
+import time
+import threading
+from collections import OrderedDict
+from pymongo.errors import PyMongoError
+from query_handler import get_db_connection
+from tracing import incr, error
+
+#  Result cache settings
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "1") == "1"
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "256"))
+RESULT_CACHE_MAX_ROWS = int(os.getenv("RESULT_CACHE_MAX_ROWS", "200000"))
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "600"))
+RESULT_CACHE_CHECK_INTERVAL = float(os.getenv("RESULT_CACHE_CHECK_INTERVAL", "5"))
+#  1 = try a change stream first, 0 = always poll
+RESULT_CACHE_WATCH = os.getenv("RESULT_CACHE_WATCH", "1") == "1"
+
+
+class CollectionVersions:
+    """Current version token per collection, from change-stream counters or a polled (count, max _id)."""
+
+    def __init__(self, watch=RESULT_CACHE_WATCH, check_interval=RESULT_CACHE_CHECK_INTERVAL):
+        self.watch = watch
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._polled = {}
+        self._watcher = {"thread": None, "active": False}
+        self.on_reset = None
+
+    def start_watcher(self):
+        with self._lock:
+            if not self.watch or self._watcher["thread"] is not None:
+                return self._watcher["active"]
+            thread = threading.Thread(target=self._watch_changes, name="result-cache-watcher", daemon=True)
+            self._watcher["thread"] = thread
+        thread.start()
+        return True
+
+    def _watch_changes(self):
+        #  Only the namespace is needed to bump a collection's version
+        pipeline = [{"$project": {"ns": 1, "operationType": 1}}]
+        try:
+            with get_db_connection().watch(pipeline) as stream:
+                #  Versions come from the stream only once it is open; until then they are polled
+                self._watcher["active"] = True
+                for change in stream:
+                    collection = change.get("ns", {}).get("coll")
+                    #  Events without a collection (dropDatabase, invalidate) change every collection
+                    with self._lock:
+                        name = collection or "*"
+                        self._counters[name] = self._counters.get(name, 0) + 1
+        except PyMongoError as e:
+            #  Standalone servers have no change streams; fall back to polling
+            error("result_cache.watcher", e)
+        finally:
+            with self._lock:
+                self._watcher["active"] = False
+            #  Events may have been missed, so nothing cached so far can be trusted
+            if self.on_reset is not None:
+                self.on_reset()
+
+    @property
+    def watching(self):
+        return self._watcher["active"]
+
+    def _poll(self, collection):
+        now = time.monotonic()
+        with self._lock:
+            cached = self._polled.get(collection)
+            if cached and now - cached[0] < self.check_interval:
+                return cached[1]
+        db = get_db_connection()
+        latest = db[collection].find_one({}, {"_id": 1}, sort=[("_id", -1)])
+        token = (db[collection].estimated_document_count(), latest["_id"] if latest else None)
+        with self._lock:
+            self._polled[collection] = (now, token)
+        return token
+
+    def current(self, collections):
+        """Version tokens for the given collections."""
+        if self.watching:
+            with self._lock:
+                return {name: ("watch", self._counters.get("*", 0), self._counters.get(name, 0)) for name in collections}
+        return {name: ("poll",) + self._poll(name) for name in collections}
+
+
+class ResultCache:
+    """LRU of ResultSets bounded by entry count and total rows, tagged with the collections each read."""
+
+    def __init__(self, max_entries=RESULT_CACHE_SIZE, max_rows=RESULT_CACHE_MAX_ROWS, ttl=RESULT_CACHE_TTL,
+                 versions=None):
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self.ttl = ttl
+        self.versions = versions or CollectionVersions()
+        self.versions.on_reset = self.clear
+        self._entries = OrderedDict()
+        self._rows = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "invalidations": 0, "evictions": 0}
+
+    def versions_for(self, plan):
+        """Capture collection versions before executing the plan (pass them to put())."""
+        self.versions.start_watcher()
+        return self.versions.current(plan.collections())
+
+    def get(self, plan):
+        if not RESULT_CACHE_ENABLED:
+            return None
+        key = plan.canonical()
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None:
+            expired = time.monotonic() - entry["stored_at"] > self.ttl
+            if not expired and self.versions_for(plan) == entry["versions"]:
+                with self._lock:
+                    if key in self._entries:
+                        self._entries.move_to_end(key)
+                    self.stats["hits"] += 1
+                incr("result_cache_hits")
+                return entry["result_set"]
+            with self._lock:
+                self._remove(key)
+                self.stats["invalidations"] += 1
+        with self._lock:
+            self.stats["misses"] += 1
+        incr("result_cache_misses")
+        return None
+
+    def put(self, plan, result_set, versions):
+        """Store a result read under `versions`; results larger than the whole row budget are not kept."""
+        if not RESULT_CACHE_ENABLED or result_set.row_count > self.max_rows:
+            return
+        key = plan.canonical()
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = {"result_set": result_set, "versions": versions, "stored_at": time.monotonic()}
+            self._rows += result_set.row_count
+            self.stats["stores"] += 1
+            while len(self._entries) > self.max_entries or self._rows > self.max_rows:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.stats["evictions"] += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._rows -= entry["result_set"].row_count
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._rows = 0
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats, entries=len(self._entries), rows=self._rows,
+                         mode="change stream" if self.versions.watching else "polling")
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+
+result_cache = ResultCache()
@@ -0,0 +1,123 @@
+import os
+import numpy as np
+import pandas as pd
+from query_handler import STATUS_MAPPING
+
+#  Above this many rows the summarizer gets a statistical digest plus a sample instead of raw rows
+RESULT_DIGEST_THRESHOLD = int(os.getenv("RESULT_DIGEST_THRESHOLD", "50"))
+RESULT_DIGEST_SAMPLE_ROWS = int(os.getenv("RESULT_DIGEST_SAMPLE_ROWS", "10"))
+RESULT_DIGEST_TOP_N = int(os.getenv("RESULT_DIGEST_TOP_N", "10"))
+
+STATUS_NAMES = {value: name for name, value in STATUS_MAPPING.items()}
+
+#  Dimensions CEOs usually slice trips by, in the flattened (dotted) column naming
+GROUP_BY_COLUMNS = [
+    "status",
+    "genericdata.fleet",
+    "genericdata.fleet.number_plate",
+    "fleet_info.number_plate",
+    "genericdata.driver_name",
+    "genericdata.customer_name",
+    "trip_schedule.date",
+]
+ORDER_COLUMNS = {"delivered_qty_by_item": "orders.delivery", "sold_qty_by_item": "orders.sale"}
+
+
+def needs_digest(result_set):
+    return result_set.count is None and result_set.row_count > RESULT_DIGEST_THRESHOLD
+
+
+def build_digest(rows, top_n=RESULT_DIGEST_TOP_N):
+    """Compute a compact, JSON-serializable statistical digest of query result rows."""
+    df = rows if isinstance(rows, pd.DataFrame) else pd.json_normalize(rows)
+    digest = {"row_count": int(len(df))}
+    if df.empty:
+        return digest
+
+    #  Group counts for the well-known trip dimensions, then any other low-cardinality text column
+    counts = {}
+    for column in GROUP_BY_COLUMNS:
+        if column in df.columns:
+            series = df[column].map(STATUS_NAMES).fillna(df[column]) if column == "status" else df[column]
+            counts[column] = _top_counts(series, top_n)
+    for column in df.columns:
+        if column in counts or column == "_id" or pd.api.types.is_numeric_dtype(df[column]):
+            continue
+        if _is_scalar_column(df[column]) and df[column].nunique() <= top_n:
+            counts[column] = _top_counts(df[column], top_n)
+    if counts:
+        digest["counts"] = counts
+
+    #  Quantities from orders.delivery / orders.sale (lists of {"item", "qty"})
+    for name, column in ORDER_COLUMNS.items():
+        if column in df.columns:
+            quantities = _item_quantities(df[column], top_n)
+            if quantities:
+                digest[name] = quantities
+
+    #  Odometer distance per trip
+    if {"odometer_start", "odometer_end"} <= set(df.columns):
+        distance = pd.to_numeric(df["odometer_end"], errors="coerce") - pd.to_numeric(df["odometer_start"], errors="coerce")
+        digest["distance"] = _describe(distance)
+        if "genericdata.driver_name" in df.columns:
+            per_driver = distance.groupby(df["genericdata.driver_name"]).sum().nlargest(top_n)
+            digest["top_drivers_by_distance"] = _to_plain(per_driver)
+        if "trip_no" in df.columns:
+            digest["top_trips_by_distance"] = _to_plain(distance.set_axis(df["trip_no"]).nlargest(top_n))
+
+    #  Any other numeric columns (e.g. counts or sums from an aggregation)
+    numeric = {}
+    for column in df.select_dtypes(include=[np.number]).columns:
+        if column not in ("status", "odometer_start", "odometer_end"):
+            numeric[column] = _describe(df[column])
+    if numeric:
+        digest["numeric"] = numeric
+
+    return digest
+
+
+def _is_scalar_column(series):
+    return not series.map(lambda value: isinstance(value, (list, dict))).any()
+
+
+def _top_counts(series, top_n):
+    if not _is_scalar_column(series):
+        return {}
+    return _to_plain(series.astype(str).value_counts().head(top_n))
+
+
+def _item_quantities(series, top_n):
+    items = series.explode().dropna()
+    items = items[items.map(lambda value: isinstance(value, dict))]
+    if items.empty:
+        return {}
+    frame = pd.DataFrame(items.tolist())
+    if not {"item", "qty"} <= set(frame.columns):
+        return {}
+    totals = pd.to_numeric(frame["qty"], errors="coerce").groupby(frame["item"]).sum()
+    return _to_plain(totals.nlargest(top_n))
+
+
+def _describe(series):
+    series = pd.to_numeric(series, errors="coerce").dropna()
+    if series.empty:
+        return {}
+    values = series.to_numpy()
+    return {
+        "count": int(values.size),
+        "sum": _plain(values.sum()),
+        "mean": round(float(values.mean()), 2),
+        "min": _plain(values.min()),
+        "p50": _plain(np.percentile(values, 50)),
+        "p95": _plain(np.percentile(values, 95)),
+        "max": _plain(values.max()),
+    }
+
+
+def _to_plain(series):
+    return {str(key): _plain(value) for key, value in series.items()}
+
+
+def _plain(value):
+    value = value.item() if hasattr(value, "item") else value
+    return round(value, 2) if isinstance(value, float) else value
@@ -0,0 +1,105 @@
+import os
+import json
+from itertools import islice
+from columnar import ColumnarResult
+
+#  Result budgets: rows read from the cursor, and (approximate) tokens of rows put in the prompt
+RESULT_MAX_ROWS = int(os.getenv("RESULT_MAX_ROWS", "5000"))
+RESULT_BATCH_SIZE = int(os.getenv("RESULT_BATCH_SIZE", "500"))
+RESULT_TOKEN_BUDGET = int(os.getenv("RESULT_TOKEN_BUDGET", "6000"))
+
+#  Rough chars-per-token ratio used for budgeting prompt text
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+class ResultSet:
+    """Columnar rows read from a query, plus whether the row budget cut the result short."""
+
+    def __init__(self, table, truncated=False, count=None, notes=None):
+        self.table = table
+        self.truncated = truncated
+        self.count = count
+        #  Rewrites applied before execution (e.g. a date window added by the cost guard)
+        self.notes = notes or []
+
+    @property
+    def row_count(self):
+        return self.table.length
+
+    @property
+    def rows(self):
+        return self.table.to_records()
+
+    def head(self, n):
+        return ResultSet(self.table.head(n))
+
+    def to_dataframe(self):
+        return self.table.to_dataframe()
+
+
+def collect_results(results, max_rows=RESULT_MAX_ROWS, batch_size=RESULT_BATCH_SIZE):
+    """Read query results in batches straight into a columnar table, stopping after max_rows documents."""
+    if isinstance(results, int):
+        return ResultSet(ColumnarResult.from_documents([{"count": results}]), count=results)
+
+    if hasattr(results, "batch_size"):
+        results.batch_size(batch_size)
+
+    table = ColumnarResult()
+    truncated = False
+    iterator = iter(results)
+    while True:
+        batch = list(islice(iterator, min(batch_size, max_rows + 1 - table.length)))
+        if not batch:
+            break
+        if table.length + len(batch) > max_rows:
+            batch = batch[:max_rows - table.length]
+            truncated = True
+        table.extend(batch)
+        if truncated:
+            break
+
+    #  Release the server-side cursor if we stopped early
+    if truncated and hasattr(results, "close"):
+        results.close()
+    return ResultSet(table, truncated=truncated)
+
+
+def serialize_for_prompt(result_set, token_budget=RESULT_TOKEN_BUDGET):
+    """Compact JSON for the prompt: column names once, then one array per row, cut at the token budget.
+
+    Returns (text, rows_included).
+    """
+    columns = list(result_set.table.columns)
+    header = json.dumps({"columns": columns}, separators=(",", ":"), default=str)[:-1] + ',"rows":['
+    used = estimate_tokens(header)
+    encoded_rows = []
+    for values in result_set.table.iter_row_values():
+        encoded = json.dumps(values, separators=(",", ":"), ensure_ascii=False, default=str)
+        cost = estimate_tokens(encoded)
+        if used + cost > token_budget:
+            break
+        encoded_rows.append(encoded)
+        used += cost
+
+    return header + ",".join(encoded_rows) + "]}", len(encoded_rows)
+
+
+def truncation_note(result_set, rows_included):
+    """Tell the summarizer when it is looking at a partial result."""
+    notes = list(result_set.notes)
+    if result_set.count is not None and not notes:
+        return ""
+    if result_set.truncated:
+        notes.append(f"the query returned more than {result_set.row_count} rows and only the first {result_set.row_count} were read")
+    if rows_included < result_set.row_count:
+        notes.append(f"only {rows_included} of {result_set.row_count} rows are shown below")
+    if not notes:
+        return ""
+    partial = result_set.truncated or rows_included < result_set.row_count
+    closing = "Say that the answer is based on partial results." if partial else "Mention this in the answer."
+    return "Note: " + "; ".join(notes) + ". " + closing
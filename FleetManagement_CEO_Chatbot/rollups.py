@@ -0,0 +1,394 @@
+"""Materialized daily rollups of tripplanners and a router that answers common CEO questions from them.
+
+    python rollups.py --rebuild     # full recompute
+    python rollups.py --refresh     # fold in trips added since the last run
+"""
+import os
+import re
+import json
+import time
+import uuid
+import argparse
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from pymongo.errors import DuplicateKeyError
+from query_handler import get_db_connection, STATUS_MAPPING
+from query_cache import resolve_relative_dates
+from tracing import error
+
+#  Rollup settings
+ROLLUPS_ENABLED = os.getenv("ROLLUPS_ENABLED", "1") == "1"
+ROLLUP_REFRESH_INTERVAL = float(os.getenv("ROLLUP_REFRESH_INTERVAL", "60"))
+#  Incremental refresh only sees new trips; a rebuild picks up edits such as status changes.
+#  Rebuilds scan all trips, so by default they are left to a scheduled `python rollups.py --rebuild`;
+#  ROLLUP_AUTO_REBUILD=1 also runs them in the background of the chat process.
+ROLLUP_AUTO_REBUILD = os.getenv("ROLLUP_AUTO_REBUILD", "0") == "1"
+ROLLUP_REBUILD_INTERVAL = float(os.getenv("ROLLUP_REBUILD_INTERVAL", "3600"))
+#  Longest a rebuild or refresh may hold the maintenance lease before another process may take it over
+ROLLUP_LOCK_TTL = float(os.getenv("ROLLUP_LOCK_TTL", "3600"))
+
+SOURCE_COLLECTION = "tripplanners"
+TRIPS_ROLLUP = "rollup_trips_daily"
+ITEMS_ROLLUP = "rollup_items_daily"
+STATE_COLLECTION = "rollup_state"
+LOCK_ID = f"{SOURCE_COLLECTION}.lock"
+
+_refresh_lock = threading.Lock()
+_refresh_state = {"checked": False, "available": False, "refreshed_at": 0.0, "rebuilt_at": 0.0, "running": False}
+
+
+# ---------- Maintenance ----------
+
+def _trips_pipeline(match):
+    return [
+        {"$match": match},
+        {"$group": {
+            "_id": {"date": "$trip_schedule.date", "fleet": "$genericdata.fleet", "status": "$status"},
+            "trips": {"$sum": 1},
+            "distance": {"$sum": {"$subtract": [{"$ifNull": ["$odometer_end", 0]}, {"$ifNull": ["$odometer_start", 0]}]}},
+            "delivered_qty": {"$sum": {"$sum": {"$ifNull": ["$orders.delivery.qty", []]}}},
+            "sold_qty": {"$sum": {"$sum": {"$ifNull": ["$orders.sale.qty", []]}}},
+        }},
+        {"$addFields": {"date": "$_id.date", "fleet": "$_id.fleet", "status": "$_id.status"}},
+    ]
+
+
+def _items_pipeline(match):
+    def order_items(kind):
+        return {"$map": {
+            "input": {"$ifNull": [f"$orders.{kind}", []]},
+            "in": {"kind": kind, "item": "$$this.item", "qty": "$$this.qty"},
+        }}
+
+    return [
+        {"$match": match},
+        {"$project": {"date": "$trip_schedule.date", "items": {"$concatArrays": [order_items("delivery"), order_items("sale")]}}},
+        {"$unwind": "$items"},
+        {"$group": {
+            "_id": {"date": "$date", "kind": "$items.kind", "item": "$items.item"},
+            "qty": {"$sum": "$items.qty"},
+            "trips": {"$sum": 1},
+        }},
+        {"$addFields": {"date": "$_id.date", "kind": "$_id.kind", "item": "$_id.item"}},
+    ]
+
+
+def _merge_into(collection, counters):
+    #  Add the new partial sums onto existing rollup rows
+    return {"$merge": {
+        "into": collection,
+        "on": "_id",
+        "whenMatched": [{"$set": {name: {"$add": [f"${name}", f"$$new.{name}"]} for name in counters}}],
+        "whenNotMatched": "insert",
+    }}
+
+
+def _ensure_indexes(db):
+    db[TRIPS_ROLLUP].create_index([("date", 1), ("fleet", 1), ("status", 1)])
+    db[ITEMS_ROLLUP].create_index([("date", 1), ("kind", 1), ("item", 1)])
+
+
+class RollupsBusyError(RuntimeError):
+    """Another process (CLI or chat worker) holds the rollup maintenance lease."""
+
+
+@contextmanager
+def _maintenance_lease(db):
+    """One rebuild / refresh at a time across processes: a refresh merging into rollups that a rebuild
+    has just replaced would count its trips twice. The lease expires after ROLLUP_LOCK_TTL seconds."""
+    owner = uuid.uuid4().hex
+    now = datetime.now(timezone.utc)
+    try:
+        db[STATE_COLLECTION].find_one_and_update(
+            {"_id": LOCK_ID, "until": {"$lt": now}},
+            {"$set": {"owner": owner, "until": now + timedelta(seconds=ROLLUP_LOCK_TTL)}},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        raise RollupsBusyError("the rollups are being rebuilt or refreshed by another process")
+    try:
+        yield
+    finally:
+        db[STATE_COLLECTION].delete_one({"_id": LOCK_ID, "owner": owner})
+
+
+def rebuild_rollups(db=None):
+    """Recompute both rollups from scratch ($out replaces each collection atomically).
+
+    Raises RollupsBusyError while another rebuild or refresh runs.
+    """
+    db = db if db is not None else get_db_connection()
+    with _maintenance_lease(db):
+        latest = db[SOURCE_COLLECTION].find_one({}, {"_id": 1}, sort=[("_id", -1)])
+        if latest is None:
+            return False
+        match = {"_id": {"$lte": latest["_id"]}}
+        db[SOURCE_COLLECTION].aggregate(_trips_pipeline(match) + [{"$out": TRIPS_ROLLUP}], allowDiskUse=True)
+        db[SOURCE_COLLECTION].aggregate(_items_pipeline(match) + [{"$out": ITEMS_ROLLUP}], allowDiskUse=True)
+        _ensure_indexes(db)
+        now = datetime.now(timezone.utc)
+        db[STATE_COLLECTION].replace_one(
+            {"_id": SOURCE_COLLECTION},
+            {"_id": SOURCE_COLLECTION, "last_id": latest["_id"], "rebuilt_at": now, "refreshed_at": now},
+            upsert=True,
+        )
+    return True
+
+
+def refresh_rollups(db=None):
+    """Fold trips inserted since the last high-water mark (_id) into the rollups.
+
+    Returns False when the rollups have never been built (call rebuild_rollups first).
+    Raises RollupsBusyError while another rebuild or refresh runs.
+    """
+    db = db if db is not None else get_db_connection()
+    with _maintenance_lease(db):
+        state = db[STATE_COLLECTION].find_one({"_id": SOURCE_COLLECTION})
+        if not state:
+            return False
+
+        latest = db[SOURCE_COLLECTION].find_one({"_id": {"$gt": state["last_id"]}}, {"_id": 1}, sort=[("_id", -1)])
+        if latest is None:
+            return True
+
+        #  Bound the window so trips inserted while we aggregate are picked up next time
+        match = {"_id": {"$gt": state["last_id"], "$lte": latest["_id"]}}
+        db[SOURCE_COLLECTION].aggregate(
+            _trips_pipeline(match) + [_merge_into(TRIPS_ROLLUP, ["trips", "distance", "delivered_qty", "sold_qty"])]
+        )
+        db[SOURCE_COLLECTION].aggregate(_items_pipeline(match) + [_merge_into(ITEMS_ROLLUP, ["qty", "trips"])])
+        db[STATE_COLLECTION].update_one(
+            {"_id": SOURCE_COLLECTION}, {"$set": {"last_id": latest["_id"], "refreshed_at": datetime.now(timezone.utc)}}
+        )
+    return True
+
+
+def _maintain_in_background(rebuild):
+    try:
+        built = rebuild_rollups() if rebuild else refresh_rollups()
+        with _refresh_lock:
+            now = time.monotonic()
+            _refresh_state["refreshed_at"] = now
+            if rebuild:
+                _refresh_state["rebuilt_at"] = now
+            _refresh_state["available"] = _refresh_state["available"] or built
+    except RollupsBusyError:
+        pass
+    except Exception as e:
+        error("rollups.rebuild" if rebuild else "rollups.refresh", e)
+    finally:
+        _refresh_state["running"] = False
+
+
+def _start_maintenance(rebuild):
+    _refresh_state["running"] = True
+    name = "rollup-rebuild" if rebuild else "rollup-refresh"
+    threading.Thread(target=_maintain_in_background, args=(rebuild,), name=name, daemon=True).start()
+
+
+def ensure_rollups_fresh():
+    """Whether the rollups can be answered from; schedules their maintenance.
+
+    Refreshes, and full rebuilds with ROLLUP_AUTO_REBUILD=1, run in a background thread, never on
+    the request path; answers use the rollups as they are until it finishes.
+    """
+    now = time.monotonic()
+    with _refresh_lock:
+        if not _refresh_state["checked"]:
+            #  First use in this process: reuse rollups left by an earlier run or the CLI
+            state = get_db_connection()[STATE_COLLECTION].find_one({"_id": SOURCE_COLLECTION}, {"_id": 1})
+            _refresh_state.update(checked=True, available=state is not None, rebuilt_at=now)
+        available = _refresh_state["available"]
+        if not _refresh_state["running"]:
+            if ROLLUP_AUTO_REBUILD and (not available or now - _refresh_state["rebuilt_at"] > ROLLUP_REBUILD_INTERVAL):
+                _start_maintenance(rebuild=True)
+            elif available and now - _refresh_state["refreshed_at"] > ROLLUP_REFRESH_INTERVAL:
+                _start_maintenance(rebuild=False)
+    return available
+
+
+def statuses_current(db=None):
+    """Whether a rebuild ran within ROLLUP_REBUILD_INTERVAL; refreshes never pick up status edits."""
+    db = db if db is not None else get_db_connection()
+    since = datetime.now(timezone.utc) - timedelta(seconds=ROLLUP_REBUILD_INTERVAL)
+    return db[STATE_COLLECTION].find_one({"_id": SOURCE_COLLECTION, "rebuilt_at": {"$gte": since}}, {"_id": 1}) is not None
+
+
+# ---------- Routing ----------
+
+#  A question goes to a rollup only when every word is accounted for: dates, status names, group-by
+#  phrases and the words below. Anything else (plates, fleet names, trip types, numbers) needs the raw trips.
+QUESTION_WORDS = {
+    "how", "many", "much", "count", "number", "of", "total", "overall", "the", "all", "a", "were", "was",
+    "are", "is", "did", "do", "does", "done", "we", "have", "had", "there", "in", "on", "for", "during",
+    "from", "to", "between", "and", "what", "show", "give", "me", "tell", "can", "you", "share", "list",
+    "breakdown", "get", "find", "please", "with", "our", "that",
+}
+TRIP_WORDS = {"trip", "trips", "tripplanners"}
+#  A rollup returns counts and sums, never the trips themselves
+COUNTING = re.compile(r"\b(how many|count|number of|total|breakdown)\b")
+DISTANCE_WORDS = {"distance", "covered", "travelled", "traveled", "driven", "km", "kms", "kilometers", "odometer"}
+ITEM_WORDS = {
+    "quantity", "quantities", "qty", "delivered", "sold", "sale", "sales", "delivery", "deliveries",
+    "item", "items", "product", "products", "orders",
+}
+
+#  Negations invert a filter the rollup would apply literally
+NEGATION = re.compile(r"\b(not|except|excluding|without|other than|non|no|never)\b|n't\b")
+STATUS_NAMES = re.compile(rf"\b(?:(?:with|in) status )?({'|'.join(STATUS_MAPPING)})\b")
+DATE = r"\d{4}-\d{2}-\d{2}"
+DATE_RANGE = re.compile(rf"\b(?:from|between) ({DATE}) (?:to|and) ({DATE})\b")
+SINGLE_DATE = re.compile(rf"\b(?:(?:on|for|in|during) )?({DATE})\b")
+
+GROUP_PATTERNS = {
+    "status": r"\b(by|per|each|wise)\s+status\b|\bstatus\s*(wise|breakdown)\b",
+    "fleet": r"\b(by|per|each)\s+(fleet|vehicle)s?\b|\b(fleet|vehicle)\s*wise\b",
+    "date": r"\b(by|per|each)\s+(day|date)\b|\bdaily\b|\bday\s*wise\b",
+    "item": r"\b(by|per|each)\s+(item|product|material)s?\b|\bitem\s*wise\b",
+}
+
+
+def _parse_question(user_query):
+    """Dates, statuses and groups of a question plus the words left over, or None if it cannot be parsed.
+
+    Status names are read from the original wording (not the normalized "status N" form), so a
+    number in the question is always a leftover word.
+    """
+    question = re.sub(r"\s+", " ", user_query.lower()).strip().rstrip("?.! ")
+    question = resolve_relative_dates(question)
+    if NEGATION.search(question):
+        return None
+
+    date_range = DATE_RANGE.search(question)
+    if date_range:
+        date_filter = {"date": {"$gte": date_range.group(1), "$lte": date_range.group(2)}}
+        question = DATE_RANGE.sub(" ", question)
+    else:
+        dates = SINGLE_DATE.findall(question)
+        if len(dates) > 1:
+            return None
+        date_filter = {"date": dates[0]} if dates else {}
+        question = SINGLE_DATE.sub(" ", question)
+
+    statuses = [STATUS_MAPPING[name] for name in STATUS_NAMES.findall(question)]
+    question = STATUS_NAMES.sub(" ", question)
+    match = dict(date_filter)
+    if statuses:
+        match["status"] = statuses[0] if len(statuses) == 1 else {"$in": statuses}
+
+    groups = []
+    for name, pattern in GROUP_PATTERNS.items():
+        if re.search(pattern, question):
+            groups.append(name)
+            question = re.sub(pattern, " ", question)
+
+    words = set(re.findall(r"[^\s,]+", question)) - QUESTION_WORDS
+    return match, groups, words
+
+
+def _group_id(groups):
+    return {name: f"${name}" for name in groups} if groups else None
+
+
+def _to_query(collection, pipeline):
+    return f"db.{collection}.aggregate({json.dumps(pipeline)})"
+
+
+def rollup_query_for(user_query):
+    """Return a generated-query string answering the question from a rollup, or None."""
+    parsed = _parse_question(user_query)
+    if parsed is None:
+        return None
+    match, groups, words = parsed
+    counting = bool(groups) or bool(COUNTING.search(user_query.lower()))
+
+    #  Delivered / sold quantities per item
+    if words & {"delivered", "sold", "quantity", "quantities", "qty"}:
+        if not words <= ITEM_WORDS or "status" in match or "status" in groups or "fleet" in groups:
+            return None
+        sold = bool(words & {"sold", "sale", "sales"})
+        delivered = bool(words & {"delivered", "delivery", "deliveries"})
+        if sold != delivered:
+            match["kind"] = "sale" if sold else "delivery"
+        group = ["kind", "item"] + [name for name in groups if name == "date"]
+        pipeline = [
+            {"$match": match},
+            {"$group": {"_id": _group_id(group), "qty": {"$sum": "$qty"}, "trips": {"$sum": "$trips"}}},
+            {"$sort": {"qty": -1}},
+        ]
+        return _to_query(ITEMS_ROLLUP, pipeline)
+
+    if "item" in groups:
+        return None
+
+    #  Distance per vehicle / fleet
+    if words & DISTANCE_WORDS:
+        if not words <= DISTANCE_WORDS | TRIP_WORDS:
+            return None
+        group = [name for name in groups if name in ("fleet", "date")] or ["fleet"]
+        pipeline = [
+            {"$match": match},
+            {"$group": {"_id": _group_id(group), "distance": {"$sum": "$distance"}, "trips": {"$sum": "$trips"}}},
+            {"$sort": {"distance": -1}},
+        ]
+        return _to_query(TRIPS_ROLLUP, pipeline)
+
+    #  Trip counts, optionally by status / fleet / day
+    if counting and words & TRIP_WORDS and words <= TRIP_WORDS:
+        pipeline = [
+            {"$match": match},
+            {"$group": {"_id": _group_id(groups), "trips": {"$sum": "$trips"}}},
+            {"$sort": {"trips": -1}},
+        ]
+        return _to_query(TRIPS_ROLLUP, pipeline)
+
+    return None
+
+
+def staleness_note(mongo_query):
+    """Note for the summarizer when a rollup answer depends on trip status, which only rebuilds pick up."""
+    if '"status"' not in mongo_query:
+        return None
+    state = get_db_connection()[STATE_COLLECTION].find_one({"_id": SOURCE_COLLECTION}, {"rebuilt_at": 1})
+    if not state or not state.get("rebuilt_at"):
+        return None
+    return (f"trip statuses are as of the last rollup rebuild at {state['rebuilt_at']:%Y-%m-%d %H:%M} UTC; "
+            "status changes made since then are not counted")
+
+
+def answer_from_rollup(user_query, route):
+    """Rollup query for the question if one applies and the rollups are available, else None."""
+    if not ROLLUPS_ENABLED or route.get("intent") != "data":
+        return None
+    mongo_query = rollup_query_for(user_query)
+    if mongo_query is None or not ensure_rollups_fresh():
+        return None
+    #  Status counts are only as current as the last rebuild; without a recent one, ask the live trips
+    if '"status"' in mongo_query and not statuses_current():
+        return None
+    return mongo_query
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rebuild", action="store_true", help="recompute the rollups from scratch")
+    parser.add_argument("--refresh", action="store_true", help="fold in trips added since the last run")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    try:
+        if args.rebuild:
+            built = rebuild_rollups()
+            print("✅ Rollups rebuilt" if built else "No trips to roll up")
+        else:
+            refreshed = refresh_rollups()
+            print("✅ Rollups refreshed" if refreshed else "Rollups not built yet; run with --rebuild")
+    except RollupsBusyError as e:
+        print("Not run:", e)
+        raise SystemExit(1)
+    print(f"took {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import os
+import re
+import math
+import threading
+from collections import Counter
+from query_handler import get_db_schema_and_version
+from result_pipeline import estimate_tokens
+
+#  Approximate token budget for the schema section of the query-generation prompt
+SCHEMA_TOKEN_BUDGET = int(os.getenv("SCHEMA_TOKEN_BUDGET", "1500"))
+
+_snippet_lock = threading.Lock()
+_snippets = {"version": None, "collections": {}}
+_usage = Counter()
+
+
+def _tokenize(text):
+    return set(re.findall(r"[a-z0-9]+", text.lower()))
+
+
+def _field_words(field_name):
+    #  "genericdata.driver_name" -> {"genericdata", "driver", "name"}
+    return set(re.split(r"[._]", field_name.lower())) - {""}
+
+
+def _build_snippet(collection_name, fields):
+    parts = []
+    for field in fields:
+        part = f"{field['name']}:{field['type']}"
+        if field.get("references"):
+            part += f"->{field['references']}"
+        parts.append(part)
+    return f"{collection_name}: " + ", ".join(parts)
+
+
+def get_collection_snippets():
+    """Compact per-collection schema lines, built once per schema version."""
+    schema, version = get_db_schema_and_version()
+    with _snippet_lock:
+        if _snippets["version"] != version:
+            collections = {}
+            for collection_name, fields in schema.items():
+                snippet = _build_snippet(collection_name, fields)
+                words = _field_words(collection_name)
+                for field in fields:
+                    words |= _field_words(field["name"])
+                collections[collection_name] = {"snippet": snippet, "tokens": estimate_tokens(snippet), "words": words}
+            _snippets.update({"version": version, "collections": collections})
+        return _snippets["collections"]
+
+
+def record_schema_usage(collections):
+    """Remember which collections executed queries touched, to favour them for similar questions."""
+    with _snippet_lock:
+        _usage.update(collections)
+
+
+def rank_collections(user_query, route, snippets):
+    """Score collections by router hits, collection/field-name overlap with the question and past usage."""
+    question_words = _tokenize(user_query)
+    routed = route.get("collections", []) if route else []
+    total_usage = sum(_usage.values()) or 1
+
+    scores = {}
+    for collection_name, info in snippets.items():
+        score = 0.0
+        if collection_name in routed:
+            score += 3.0 / (routed.index(collection_name) + 1)
+        if collection_name.lower() in question_words or collection_name.lower().rstrip("s") in question_words:
+            score += 2.0
+        score += 0.5 * len(question_words & info["words"])
+        score += math.log1p(_usage[collection_name] / total_usage * 10)
+        scores[collection_name] = score
+    return sorted(snippets, key=lambda name: (-scores[name], name))
+
+
+def build_schema_context(user_query, route=None, token_budget=SCHEMA_TOKEN_BUDGET):
+    """Schema summary for the prompt: most relevant collections first, within the token budget."""
+    snippets = get_collection_snippets()
+    ranked = rank_collections(user_query, route, snippets)
+
+    lines = []
+    used = 0
+    skipped = []
+    for collection_name in ranked:
+        info = snippets[collection_name]
+        if used + info["tokens"] <= token_budget:
+            lines.append(info["snippet"])
+            used += info["tokens"]
+        elif not lines:
+            #  Always keep the best match, trimmed to the budget
+            lines.append(info["snippet"][:token_budget * 4])
+            used = token_budget
+        else:
+            skipped.append(collection_name)
+
+    if skipped:
+        other = "Other collections (fields omitted): " + ", ".join(skipped)
+        if used + estimate_tokens(other) <= token_budget:
+            lines.append(other)
+    return "\n".join(lines)
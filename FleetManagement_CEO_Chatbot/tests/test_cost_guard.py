@@ -0,0 +1,125 @@
+import pytest
+import cost_guard
+from cost_guard import check_query_cost, estimate_docs_examined, CostGuardError, COST_GUARD_MAX_DOCS
+from query_plan import parse_query_plan, QUERY_DEFAULT_LIMIT
+
+TRIPS = 3_000_000
+DATE_WINDOW_MATCHES = 6_000
+
+
+class FakeCollection:
+    def __init__(self, size, indexed=("_id",)):
+        self.size = size
+        self.indexed = indexed
+
+    def estimated_document_count(self):
+        return self.size
+
+    def count_documents(self, filter_doc, limit=None, **kwargs):
+        #  An indexed date window matches a few thousand trips; anything else matches everything
+        matched = DATE_WINDOW_MATCHES if "$and" in filter_doc or "trip_schedule.date" in filter_doc else self.size
+        return min(matched, limit) if limit else matched
+
+    def aggregate(self, pipeline, **kwargs):
+        #  $sample + $match + $count: the sampled share of matching documents
+        size = pipeline[0]["$sample"]["size"]
+        return [{"n": size * self.count_documents(pipeline[1]["$match"]) // self.size}]
+
+    def index_information(self):
+        return {f"{field}_1": {"key": [(field, 1)]} for field in self.indexed}
+
+
+class FakeDB:
+    """Plans an index scan only for filters on an indexed field (the date window)."""
+
+    def __init__(self):
+        self.collections = {
+            "tripplanners": FakeCollection(TRIPS, indexed=("_id", "trip_schedule.date")),
+            "fleets": FakeCollection(100),
+            "users": FakeCollection(1_000, indexed=("_id", "email")),
+        }
+
+    def __getitem__(self, name):
+        return self.collections[name]
+
+    def command(self, name, command, **kwargs):
+        text = repr(command)
+        stage = "IXSCAN" if "trip_schedule.date" in text else "COLLSCAN"
+        return {"queryPlanner": {"winningPlan": {"stage": stage}}}
+
+
+@pytest.fixture
+def db():
+    return FakeDB()
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("db.tripplanners.find({}).limit(5)", 5),
+    ("db.tripplanners.find({})", QUERY_DEFAULT_LIMIT),
+    ("db.tripplanners.find_one({})", 1),
+    ('db.tripplanners.find({"status": 3}).limit(5)', TRIPS),
+    ('db.tripplanners.find({}).sort("trip_no", -1).limit(5)', TRIPS),
+    ("db.tripplanners.count_documents({})", TRIPS),
+    ('db.tripplanners.distinct("status")', TRIPS),
+    ('db.tripplanners.find({"trip_schedule.date": {"$gte": "2025-06-01"}, "status": 3})', QUERY_DEFAULT_LIMIT),
+    ('db.tripplanners.count_documents({"trip_schedule.date": "2025-06-01"})', DATE_WINDOW_MATCHES),
+])
+def test_estimate(db, query, expected):
+    assert estimate_docs_examined(db, parse_query_plan(query)) == expected
+
+
+def test_counted_pipeline_is_not_capped_by_the_row_limit(db):
+    lookup = '{"$lookup": {"from": "fleets", "localField": "genericdata.fleet", "foreignField": "_id", "as": "fleet"}}'
+    listed = estimate_docs_examined(db, parse_query_plan(f"db.tripplanners.aggregate([{lookup}])"))
+    counted = estimate_docs_examined(db, parse_query_plan(f"len(list(db.tripplanners.aggregate([{lookup}])))"))
+    assert listed == 2 * QUERY_DEFAULT_LIMIT
+    assert counted == 2 * TRIPS
+
+
+def test_unindexed_lookup_costs_a_scan_per_row(db):
+    lookup = '{"$lookup": {"from": "users", "localField": "genericdata.driver", "foreignField": "phone", "as": "d"}}'
+    plan = parse_query_plan(f'db.tripplanners.aggregate([{{"$match": {{"trip_schedule.date": "2025-06-01"}}}}, {lookup}])')
+    assert estimate_docs_examined(db, plan) == QUERY_DEFAULT_LIMIT + QUERY_DEFAULT_LIMIT * 1_000
+
+
+def test_cheap_query_passes_unchanged(db):
+    plan = parse_query_plan("db.tripplanners.find({}).limit(5)")
+    assert check_query_cost(db, plan) == (plan, [])
+
+
+def test_full_count_is_narrowed_to_a_date_window(db, monkeypatch):
+    monkeypatch.setattr(cost_guard, "COST_GUARD_MODE", "rewrite")
+    plan = parse_query_plan('db.tripplanners.count_documents({"status": 5})')
+    rewritten, notes = check_query_cost(db, plan)
+    assert plan.filter == {"status": 5}
+    assert rewritten.filter["$and"][0] == {"status": 5}
+    assert "trip_schedule.date" in rewritten.filter["$and"][1]
+    assert len(notes) == 1
+
+
+def test_reject_mode_raises(db, monkeypatch):
+    monkeypatch.setattr(cost_guard, "COST_GUARD_MODE", "reject")
+    with pytest.raises(CostGuardError) as raised:
+        check_query_cost(db, parse_query_plan("db.tripplanners.count_documents({})"))
+    assert raised.value.estimate > COST_GUARD_MAX_DOCS
+
+
+def test_collection_without_date_field_is_rejected(db, monkeypatch):
+    monkeypatch.setattr(cost_guard, "COST_GUARD_MODE", "rewrite")
+    db.collections["users"].size = 5_000_000
+    with pytest.raises(CostGuardError):
+        check_query_cost(db, parse_query_plan('db.users.count_documents({"role": "driver"})'))
+
+
+def test_limit_moves_before_lookup():
+    plan = parse_query_plan('db.tripplanners.aggregate([{"$match": {"status": 2}}, '
+                            '{"$lookup": {"from": "users", "localField": "a", "foreignField": "_id", "as": "u"}}, '
+                            '{"$project": {"u.name": 1}}, {"$limit": 20}])')
+    assert cost_guard._limit_before_lookup(plan) is not None
+    assert plan.pipeline[1] == {"$limit": 20}
+
+
+def test_limit_does_not_move_before_unwind():
+    plan = parse_query_plan('db.tripplanners.aggregate([{"$lookup": {"from": "users", "localField": "a", '
+                            '"foreignField": "_id", "as": "u"}}, {"$unwind": "$u"}, {"$limit": 20}])')
+    assert cost_guard._limit_before_lookup(plan) is None
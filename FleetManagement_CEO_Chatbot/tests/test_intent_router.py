@@ -0,0 +1,37 @@
+import json
+import os
+import pytest
+from intent_router import route_intent
+
+with open(os.path.join(os.path.dirname(__file__), "..", "benchmarks", "questions.json"), encoding="utf-8") as f:
+    LABELLED = json.load(f)
+
+
+@pytest.mark.parametrize("item", LABELLED, ids=[item["question"][:50] for item in LABELLED])
+def test_benchmark_questions(item):
+    expected = "general" if item["query"] is None else "data"
+    assert route_intent(item["question"])["intent"] == expected
+
+
+@pytest.mark.parametrize("question", [
+    "list all users",
+    "How many drivers do we have?",
+    "Total quantity of milk delivered on 2025-06-10",
+    "List the sale items sold on 2025-06-10",
+    "Top 10 customers by sales quantity in June 2025",
+])
+def test_data_questions(question):
+    assert route_intent(question)["intent"] == "data"
+
+
+@pytest.mark.parametrize("question", [
+    "What is a good fuel efficiency for delivery vans?",
+    "How do I improve sales?",
+    "What does quantity discount mean?",
+])
+def test_one_supporting_word_is_not_enough(question):
+    assert route_intent(question)["intent"] == "general"
+
+
+def test_users_route_to_users_collection():
+    assert route_intent("list all users")["collections"][0] == "users"
@@ -0,0 +1,96 @@
+import os
+import time
+import pytest
+from types import SimpleNamespace
+
+os.environ.setdefault("GEMINI_API_KEY", "test")  # llm_client builds its clients at import time
+
+from contextlib import closing
+from openai import OpenAI
+import llm_gateway
+from benchmarks import fake_openai_server
+from llm_gateway import LLMGatewayError
+
+
+class ScriptedFailures:
+    """Stands in for the fake server's random module: the first `failures` requests get `status`."""
+
+    def __init__(self, failures, status):
+        self.failures = failures
+        self.status = status
+
+    def random(self):
+        self.failures -= 1
+        return 0.0 if self.failures >= 0 else 1.0
+
+    def choice(self, options):
+        return self.status
+
+
+@pytest.fixture
+def fake_server(monkeypatch):
+    server = fake_openai_server.serve(port=0, reply="five trips are ongoing")
+    host, port = server.server_address
+    stats = fake_openai_server.FakeOpenAIHandler.stats
+    for key in stats:
+        stats[key] = 0
+    client = OpenAI(api_key="test", base_url=f"http://{host}:{port}/v1/", max_retries=0)
+    original = llm_gateway._clients["sync"]
+    llm_gateway.set_clients(sync_client=client)
+    monkeypatch.setattr(llm_gateway, "LLM_BACKOFF_BASE_S", 0.01)
+    llm_gateway.reset_usage_stats()
+    yield stats
+    llm_gateway.set_clients(sync_client=original)
+    server.shutdown()
+    server.server_close()
+    fake_openai_server.FakeOpenAIHandler.error_rate = 0.0
+
+
+def _fail_first(monkeypatch, failures, status):
+    fake_openai_server.FakeOpenAIHandler.error_rate = 0.5
+    monkeypatch.setattr(fake_openai_server, "random", ScriptedFailures(failures, status))
+
+
+def _free_slots():
+    return llm_gateway._sync_slots._value
+
+
+@pytest.mark.parametrize("status", [429, 500])
+def test_complete_retries_injected_errors(fake_server, monkeypatch, status):
+    _fail_first(monkeypatch, 2, status)
+    assert llm_gateway.complete("query", [{"role": "user", "content": "hi"}]) == "five trips are ongoing"
+    assert fake_server["requests"] == 3
+    assert llm_gateway.get_usage_stats()["query"]["retries"] == 2
+
+
+def test_complete_gives_up_after_max_retries(fake_server, monkeypatch):
+    _fail_first(monkeypatch, llm_gateway.LLM_MAX_RETRIES + 1, 429)
+    with pytest.raises(LLMGatewayError):
+        llm_gateway.complete("query", [{"role": "user", "content": "hi"}])
+    assert fake_server["requests"] == llm_gateway.LLM_MAX_RETRIES + 1
+    assert llm_gateway.get_usage_stats()["query"]["failures"] == 1
+
+
+def test_stream_retries_before_first_chunk(fake_server, monkeypatch):
+    _fail_first(monkeypatch, 1, 500)
+    text = "".join(llm_gateway.stream("summary", [{"role": "user", "content": "hi"}]))
+    assert text.split() == ["five", "trips", "are", "ongoing"]
+    assert fake_server["requests"] == 2
+
+
+def test_closed_stream_releases_its_slot(fake_server):
+    free = _free_slots()
+    with closing(llm_gateway.stream("summary", [{"role": "user", "content": "hi"}])) as chunks:
+        next(chunks)
+        assert _free_slots() == free - 1
+    assert _free_slots() == free
+
+
+def test_stream_deadline_between_chunks(fake_server, monkeypatch):
+    chunks = llm_gateway.stream("summary", [{"role": "user", "content": "hi"}], timeout=5)
+    next(chunks)
+    clock = SimpleNamespace(monotonic=lambda: float("inf"), perf_counter=time.perf_counter, sleep=time.sleep)
+    monkeypatch.setattr(llm_gateway, "time", clock)
+    with pytest.raises(LLMGatewayError):
+        list(chunks)
+    assert llm_gateway.get_usage_stats()["summary"]["failures"] == 1
@@ -0,0 +1,59 @@
+import pandas as pd
+import pytest
+from multi_query import decompose_question, merge_dataframes, run_sub_queries
+
+
+@pytest.mark.parametrize("question, parts", [
+    ("How many trips are ongoing and how many drivers do we have?",
+     ["How many trips are ongoing?", "how many drivers do we have?"]),
+    ("How many trips were completed on 2025-06-10? Which fleets malfunctioned on 2025-06-10?",
+     ["How many trips were completed on 2025-06-10?", "Which fleets malfunctioned on 2025-06-10?"]),
+    ("List all users; how many vehicles are there",
+     ["List all users?", "how many vehicles are there?"]),
+])
+def test_independent_parts_split(question, parts):
+    assert decompose_question(question) == parts
+
+
+@pytest.mark.parametrize("question", [
+    # elided subject
+    "how many trips completed on 2025-06-10 and how many were cancelled on 2025-06-10",
+    # pronoun and definite references
+    "Which trips malfunctioned on 2025-06-28 and who drove them?",
+    "List trips cancelled on 2025-06-10 and show the drivers",
+    # date scope stated only once
+    "How many trips were completed last week and which fleets were used?",
+    # one question, or a general part
+    "How many trips were completed on 2025-06-10?",
+    "How many trips are ongoing and what is a good fuel efficiency?",
+    # a part too short to stand alone
+    "Count trips, drivers",
+])
+def test_dependent_parts_stay_whole(question):
+    assert decompose_question(question) == []
+
+
+def test_run_sub_queries_keeps_order_and_errors():
+    def run_query(question, history_context):
+        if "fail" in question:
+            raise RuntimeError("boom")
+        return question.upper() + history_context
+
+    outcomes = run_sub_queries(["a?", "fail?", "c?"], run_query, "!")
+    assert outcomes[0] == "A?!" and outcomes[2] == "C?!"
+    assert isinstance(outcomes[1], RuntimeError)
+
+
+class FakeResultSet:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def to_dataframe(self):
+        return pd.DataFrame(self.rows)
+
+
+def test_merge_dataframes_tags_rows():
+    df = merge_dataframes([("q1?", FakeResultSet([{"count": 3}])), ("q2?", FakeResultSet([{"fleet": "A"}, {"fleet": "B"}]))])
+    assert list(df["question"]) == ["q1?", "q2?", "q2?"]
+    assert set(df.columns) == {"question", "count", "fleet"}
+    assert merge_dataframes([]).empty
@@ -0,0 +1,88 @@
+from datetime import date
+import pytest
+import query_cache
+from query_cache import QueryCache, normalize_question, resolve_relative_dates
+
+QUERY = 'db.tripplanners.count_documents({"status": 5, "trip_schedule.date": "2025-06-10"})'
+
+
+@pytest.fixture
+def cache():
+    return QueryCache(max_size=8, path="")
+
+
+def _on(day):
+    class FixedDate(date):
+        @classmethod
+        def today(cls):
+            return day
+    return FixedDate
+
+
+@pytest.mark.parametrize("variant", [
+    "How many trips were completed on 2025-06-10?",
+    "how many trips were completed on 2025-06-10",
+    "  HOW MANY   trips were\tcompleted on 2025-06-10 ?",
+    "How many trips were Completed on 2025-06-10.",
+])
+def test_whitespace_and_case_variants_hit(cache, variant):
+    cache.put("How many trips were completed on 2025-06-10?", "v1", QUERY)
+    assert cache.get(variant, "v1") == QUERY
+    assert cache.get_stats()["hits"] == 1
+
+
+@pytest.mark.parametrize("other", [
+    "How many trips were completed on 2025-06-11?",
+    "How many trips were cancelled on 2025-06-10?",
+])
+def test_different_questions_miss(cache, other):
+    cache.put("How many trips were completed on 2025-06-10?", "v1", QUERY)
+    assert cache.get(other, "v1") is None
+
+
+def test_relative_dates_miss_on_another_day(cache, monkeypatch):
+    monkeypatch.setattr(query_cache, "date", _on(date(2025, 6, 11)))
+    cache.put("How many trips were completed yesterday?", "v1", QUERY)
+    assert cache.get("how many trips were completed yesterday", "v1") == QUERY
+    monkeypatch.setattr(query_cache, "date", _on(date(2025, 6, 12)))
+    assert cache.get("How many trips were completed yesterday?", "v1") is None
+
+
+def test_history_is_part_of_the_key(cache):
+    cache.put("what about the cancelled ones?", "v1", QUERY, "user: trips on 2025-06-10")
+    assert cache.get("What about the cancelled ones", "v1", "user: trips on 2025-06-10") == QUERY
+    assert cache.get("what about the cancelled ones?", "v1", "user: trips on 2025-06-11") is None
+    assert cache.get("what about the cancelled ones?", "v1") is None
+
+
+def test_schema_version_is_part_of_the_key(cache):
+    cache.put("How many fleets are there?", "v1", "db.fleets.count_documents({})")
+    assert cache.get("How many fleets are there?", "v2") is None
+
+
+def test_lru_evicts_oldest(cache):
+    for n in range(9):
+        cache.put(f"How many trips on 2025-06-{n + 1:02d}?", "v1", str(n))
+    assert cache.get("How many trips on 2025-06-01?", "v1") is None
+    assert cache.get("How many trips on 2025-06-09?", "v1") == "8"
+
+
+def test_sqlite_tier_survives_restart(tmp_path):
+    path = str(tmp_path / "queries.db")
+    QueryCache(path=path).put("How many fleets are there?", "v1", "db.fleets.count_documents({})")
+    reopened = QueryCache(path=path)
+    assert reopened.get("how many fleets are there", "v1") == "db.fleets.count_documents({})"
+    assert reopened.get_stats()["disk_hits"] == 1
+
+
+def test_resolve_relative_dates():
+    today = date(2025, 6, 11)  # a Wednesday
+    assert resolve_relative_dates("trips yesterday", today) == "trips 2025-06-10"
+    assert resolve_relative_dates("trips last 7 days", today) == "trips from 2025-06-04 to 2025-06-11"
+    assert resolve_relative_dates("trips last week", today) == "trips from 2025-06-02 to 2025-06-08"
+    assert resolve_relative_dates("trips last month", today) == "trips from 2025-05-01 to 2025-05-31"
+
+
+def test_normalize_question_maps_statuses():
+    assert normalize_question("Completed trips TODAY?", today=date(2025, 6, 11)) != normalize_question(
+        "Cancelled trips today", today=date(2025, 6, 11))
@@ -0,0 +1,130 @@
+from datetime import datetime, timedelta
+import pytest
+from bson import ObjectId
+from query_plan import (
+    QUERY_DEFAULT_LIMIT, QUERY_MAX_LIMIT, QueryPlanError, execute_query_plan, parse_query_plan,
+)
+
+REFUSED = [
+    # calls that are not BSON/date helpers
+    'db.trips.find({"x": __import__("os").system("id")})',
+    'db.trips.find({"x": eval("1")})',
+    'db.trips.find({"x": open("/etc/passwd")})',
+    'db.trips.find({"x": os.system("id")})',
+    'db.trips.find({"x": (lambda: 1)()})',
+    # attribute access
+    'db.trips.find({"x": os.environ})',
+    'db.trips.find({"x": ObjectId.__init__})',
+    'db.trips.find({}).__class__.__init__()',
+    # dunder / private / system names
+    'db.__class__.find({})',
+    'db["__dict__"].find({})',
+    'db.get_collection("_private").find({})',
+    'db["system.users"].find({})',
+    'db["trips$x"].find({})',
+    # unknown methods
+    'db.trips.delete_many({})',
+    'db.trips.update_one({}, {"$set": {"a": 1}})',
+    'db.trips.find({}).explain()',
+    'db.trips.aggregate([]).limit(5)',
+    'db.trips.distinct("status").sort("status")',
+    # non-literal nodes
+    'db.trips.find({"x": y})',
+    'db.trips.find({**other})',
+    'db.trips.find({"x": [i for i in range(3)]})',
+    'db.trips.find({"x": 1 if y else 2})',
+    'db.trips.find({"x": "a" * 100000})',
+    'db.trips.find({}).limit("5")',
+    'collection.find({})',
+    'db.trips.find({',
+]
+
+
+@pytest.mark.parametrize("query", REFUSED)
+def test_refused(query):
+    with pytest.raises(QueryPlanError):
+        parse_query_plan(query)
+
+
+def test_find_round_trip():
+    plan = parse_query_plan(
+        'db.tripplanners.find({"status": 5, "trip_schedule.date": "2025-06-10"}, {"trip_no": 1})'
+        '.sort("trip_no", -1).skip(10).limit(20)'
+    )
+    assert plan.collection == "tripplanners"
+    assert plan.operation == "find"
+    assert plan.filter == {"status": 5, "trip_schedule.date": "2025-06-10"}
+    assert plan.projection == {"trip_no": 1}
+    assert plan.sort == [("trip_no", -1)]
+    assert (plan.skip, plan.limit, plan.count) == (10, 20, False)
+    assert parse_query_plan('list(db["fleets"].find({}))').collection == "fleets"
+
+
+def test_find_with_bson_helpers():
+    plan = parse_query_plan(
+        'db.tripplanners.find({"_id": ObjectId("64b7f0c2a1b2c3d4e5f60718"), '
+        '"createdAt": {"$gte": datetime.datetime(2025, 6, 1) - timedelta(days=1), "$lt": ISODate("2025-07-01T00:00:00Z")}})'
+    )
+    assert plan.filter["_id"] == ObjectId("64b7f0c2a1b2c3d4e5f60718")
+    assert plan.filter["createdAt"]["$gte"] == datetime(2025, 5, 31)
+    assert plan.filter["createdAt"]["$lt"].tzinfo is not None
+
+
+def test_utcnow_is_timezone_aware():
+    plan = parse_query_plan('db.tripplanners.find({"createdAt": {"$gte": datetime.utcnow() - timedelta(days=7)}})')
+    assert plan.filter["createdAt"]["$gte"].tzinfo is not None
+
+
+def test_aggregate_round_trip():
+    pipeline = '[{"$match": {"status": 5}}, {"$group": {"_id": "$fleet", "count": {"$sum": 1}}}]'
+    plan = parse_query_plan(f"db.tripplanners.aggregate({pipeline})")
+    assert plan.operation == "aggregate"
+    assert plan.pipeline == [{"$match": {"status": 5}}, {"$group": {"_id": "$fleet", "count": {"$sum": 1}}}]
+    assert plan.collections() == ["tripplanners"]
+
+
+def test_count_round_trip():
+    for query in ('db.tripplanners.count_documents({"status": 4})', 'db.tripplanners.count({"status": 4})',
+                  'len(list(db.tripplanners.find({"status": 4})))'):
+        plan = parse_query_plan(query)
+        assert plan.count and plan.filter == {"status": 4}, query
+    assert parse_query_plan('db.tripplanners.count_documents({"status": 4})').operation == "count_documents"
+
+
+def test_distinct_round_trip():
+    plan = parse_query_plan('db.tripplanners.distinct("genericdata.driver", {"status": 5})')
+    assert (plan.operation, plan.field, plan.filter) == ("distinct", "genericdata.driver", {"status": 5})
+
+
+def test_canonical_is_stable():
+    a = parse_query_plan('db.t.find({"a": 1, "b": 2})')
+    b = parse_query_plan('db.t.find({"b": 2, "a": 1})')
+    assert a.canonical() == b.canonical()
+
+
+class RecordingCollection:
+    def __init__(self):
+        self.pipeline = None
+
+    def aggregate(self, pipeline, **kwargs):
+        self.pipeline = pipeline
+        return []
+
+
+class RecordingDB(dict):
+    def __missing__(self, name):
+        self[name] = RecordingCollection()
+        return self[name]
+
+
+@pytest.mark.parametrize("pipeline, expected_limit", [
+    ([{"$match": {}}], QUERY_DEFAULT_LIMIT),
+    ([{"$match": {}}, {"$limit": 10}], 10),
+    ([{"$match": {}}, {"$limit": QUERY_MAX_LIMIT * 10}], QUERY_MAX_LIMIT),
+])
+def test_aggregate_limit_is_bounded(pipeline, expected_limit):
+    db = RecordingDB()
+    plan = parse_query_plan(f"db.t.aggregate({pipeline!r})")
+    execute_query_plan(db, plan)
+    assert db["t"].pipeline[-1] == {"$limit": expected_limit}
+    assert [stage for stage in db["t"].pipeline if "$limit" in stage] == [{"$limit": expected_limit}]
@@ -0,0 +1,77 @@
+import json
+import re
+import pytest
+import rollups
+from rollups import rollup_query_for, TRIPS_ROLLUP, ITEMS_ROLLUP
+
+
+def parse(mongo_query):
+    collection, pipeline = re.match(r"db\.(\w+)\.aggregate\((.*)\)$", mongo_query).groups()
+    return collection, json.loads(pipeline)
+
+
+ANSWERED = [
+    ("How many trips were completed on 2025-06-10?", TRIPS_ROLLUP,
+     {"date": "2025-06-10", "status": 5}, None),
+    ("Can you share the breakdown of all the trips by status from 2025-06-01 to 2025-06-30?", TRIPS_ROLLUP,
+     {"date": {"$gte": "2025-06-01", "$lte": "2025-06-30"}}, {"status": "$status"}),
+    ("How many trips are scheduled for 2025-06-30?", TRIPS_ROLLUP,
+     {"date": "2025-06-30", "status": 1}, None),
+    ("Distance covered per vehicle on 2025-06-20", TRIPS_ROLLUP,
+     {"date": "2025-06-20"}, {"fleet": "$fleet"}),
+    ("List the sale items sold on 2025-06-15 with quantities", ITEMS_ROLLUP,
+     {"date": "2025-06-15", "kind": "sale"}, {"kind": "$kind", "item": "$item"}),
+    ("Trips per day between 2025-06-01 and 2025-06-07", TRIPS_ROLLUP,
+     {"date": {"$gte": "2025-06-01", "$lte": "2025-06-07"}}, {"date": "$date"}),
+]
+
+REFUSED = [
+    "How many trips are not completed?",
+    "Count of trips except cancelled",
+    "How many trips without a driver?",
+    "How many trips did vehicle TN001XY1000 do yesterday?",
+    "How many delivery trips last week?",
+    "How many trips did Fleet 0001 do each day from 2025-06-01 to 2025-06-07?",
+    "How many trips over 100 km?",
+    "Total quantity of milk delivered from 2025-06-01 to 2025-06-15",
+    "How many trips with status 5?",
+    "Which driver completed the most trips between 2025-05-01 and 2025-05-31?",
+    "Show all trips of driver Arun",
+    "List all the trips that are malfunctioned on 2025-06-28",
+    "Show the completed trips on 2025-06-10",
+]
+
+
+@pytest.mark.parametrize("question, collection, match, group_id", ANSWERED)
+def test_answered_from_rollup(question, collection, match, group_id):
+    mongo_query = rollup_query_for(question)
+    assert mongo_query is not None
+    actual_collection, pipeline = parse(mongo_query)
+    assert actual_collection == collection
+    assert pipeline[0]["$match"] == match
+    assert pipeline[1]["$group"]["_id"] == group_id
+
+
+@pytest.mark.parametrize("question", REFUSED)
+def test_left_to_the_llm(question):
+    assert rollup_query_for(question) is None
+
+
+@pytest.fixture
+def rollups_available(monkeypatch):
+    monkeypatch.setattr(rollups, "ROLLUPS_ENABLED", True)
+    monkeypatch.setattr(rollups, "ensure_rollups_fresh", lambda: True)
+
+
+DATA_ROUTE = {"intent": "data"}
+
+
+def test_status_question_needs_a_recent_rebuild(rollups_available, monkeypatch):
+    monkeypatch.setattr(rollups, "statuses_current", lambda: False)
+    assert rollups.answer_from_rollup("How many trips are ongoing on 2025-06-10?", DATA_ROUTE) is None
+    assert rollups.answer_from_rollup("How many trips on 2025-06-10?", DATA_ROUTE) is not None
+
+
+def test_status_question_after_a_rebuild(rollups_available, monkeypatch):
+    monkeypatch.setattr(rollups, "statuses_current", lambda: True)
+    assert rollups.answer_from_rollup("How many trips are ongoing on 2025-06-10?", DATA_ROUTE) is not None
@@ -0,0 +1,59 @@
+import pytest
+import query_handler
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    state = {"schema": {"fleets": [{"name": "number_plate", "type": "str"}]}, "fingerprint": "a", "introspections": 0}
+
+    def introspect(db, references):
+        #  The cache lock must not be held during the slow introspection
+        assert not query_handler._schema_lock.locked()
+        state["introspections"] += 1
+        return dict(state["schema"])
+
+    def fingerprint(db):
+        assert not query_handler._schema_lock.locked()
+        return state["fingerprint"]
+
+    monkeypatch.setattr(query_handler, "get_db_connection", lambda: object())
+    monkeypatch.setattr(query_handler, "build_reference_map", lambda db: {})
+    monkeypatch.setattr(query_handler, "_introspect_db_schema", introspect)
+    monkeypatch.setattr(query_handler, "compute_schema_fingerprint", fingerprint)
+    monkeypatch.setattr(query_handler, "SCHEMA_CHECK_INTERVAL", 0)
+    query_handler.invalidate_schema_cache()
+    yield state
+    query_handler.invalidate_schema_cache()
+
+
+def test_version_after_invalidation_is_never_none(fake_db):
+    query_handler.get_db_schema()
+    query_handler.invalidate_schema_cache()
+    assert query_handler.get_schema_version() is not None
+
+
+def test_unchanged_fingerprint_reuses_the_schema(fake_db):
+    first = query_handler.get_db_schema_and_version()
+    assert query_handler.get_db_schema_and_version() == first
+    assert fake_db["introspections"] == 1
+
+
+def test_changed_layout_reintrospects(fake_db):
+    _, version = query_handler.get_db_schema_and_version()
+    fake_db["fingerprint"] = "b"
+    fake_db["schema"]["fleets"] = [{"name": "number_plate", "type": "str"}, {"name": "model", "type": "str"}]
+    schema, new_version = query_handler.get_db_schema_and_version()
+    assert fake_db["introspections"] == 2
+    assert new_version != version and len(schema["fleets"]) == 2
+
+
+def test_invalidation_during_introspection_is_not_cached(fake_db, monkeypatch):
+    def introspect(db, references):
+        fake_db["introspections"] += 1
+        query_handler.invalidate_schema_cache()
+        return dict(fake_db["schema"])
+
+    monkeypatch.setattr(query_handler, "_introspect_db_schema", introspect)
+    schema, version = query_handler.get_db_schema_and_version()
+    assert schema and version
+    assert query_handler._schema_cache["schema"] is None
@@ -0,0 +1,324 @@
+"""Timed spans, counters and per-question traces for the chatbot pipeline, exported through pluggable sinks.
+
+    with trace(user_query):
+        with span("execution"):
+            ...
+        incr("query_cache_hits")
+    error("cost_guard.explain", e)      # a handled failure, instead of print()
+
+Sinks receive every span, counter increment, error event and finished question trace:
+  - the in-process MetricsRegistry (always installed while tracing is enabled)
+  - JsonLogSink, one JSON line per finished question (TRACING_JSON_LOG=path, or "stderr")
+  - a Prometheus text endpoint serving the registry (METRICS_PORT)
+add_listener(fn) registers a plain fn(name, duration_ms, attrs) span callback.
+TRACING_ENABLED=0 turns span/incr/trace into no-ops.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+#  Tracing settings
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "1") == "1"
+TRACING_JSON_LOG = os.getenv("TRACING_JSON_LOG", "")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+#  Histogram buckets for span durations, in seconds
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+_sinks = []
+_current_trace = ContextVar("current_trace", default=None)
+
+
+# ---------- Sinks ----------
+
+class Sink:
+    """Base sink; override the events you care about."""
+
+    def on_span(self, name, duration_ms, attrs):
+        pass
+
+    def on_count(self, name, value, labels):
+        pass
+
+    def on_trace(self, record):
+        pass
+
+    def on_event(self, record):
+        pass
+
+
+class _ListenerSink(Sink):
+    def __init__(self, listener):
+        self.listener = listener
+
+    def on_span(self, name, duration_ms, attrs):
+        self.listener(name, duration_ms, attrs)
+
+
+class MetricsRegistry(Sink):
+    """Aggregates span histograms and counters; renders them in the Prometheus text format."""
+
+    def __init__(self, prefix="fleetwise"):
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+
+    def _observe(self, name, seconds):
+        histogram = self.histograms.setdefault(name, {"buckets": [0] * len(DURATION_BUCKETS), "sum": 0.0, "count": 0})
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if seconds <= bound:
+                histogram["buckets"][i] += 1
+        histogram["sum"] += seconds
+        histogram["count"] += 1
+
+    def on_span(self, name, duration_ms, attrs):
+        with self.lock:
+            self._observe(name, duration_ms / 1000)
+            if "error" in attrs:
+                key = ("span_errors", (("span", name),))
+                self.counters[key] = self.counters.get(key, 0) + 1
+
+    def on_count(self, name, value, labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def on_trace(self, record):
+        with self.lock:
+            self._observe("question", record["duration_ms"] / 1000)
+
+    def snapshot(self):
+        """Counters and per-span count / total seconds, as plain dicts."""
+        with self.lock:
+            counters = {}
+            for (name, labels), value in self.counters.items():
+                label_text = ",".join(f"{key}={val}" for key, val in labels)
+                counters[f"{name}{{{label_text}}}" if label_text else name] = value
+            spans = {name: {"count": h["count"], "sum_s": round(h["sum"], 4)} for name, h in self.histograms.items()}
+        return {"counters": counters, "spans": spans}
+
+    def render(self):
+        lines = []
+        with self.lock:
+            metric = f"{self.prefix}_span_duration_seconds"
+            lines += [f"# HELP {metric} Duration of pipeline spans.", f"# TYPE {metric} histogram"]
+            for name, histogram in sorted(self.histograms.items()):
+                for bound, count in zip(DURATION_BUCKETS, histogram["buckets"]):
+                    lines.append(f'{metric}_bucket{{span="{name}",le="{bound}"}} {count}')
+                lines.append(f'{metric}_bucket{{span="{name}",le="+Inf"}} {histogram["count"]}')
+                lines.append(f'{metric}_sum{{span="{name}"}} {histogram["sum"]:.6f}')
+                lines.append(f'{metric}_count{{span="{name}"}} {histogram["count"]}')
+            for name in sorted({name for name, _ in self.counters}):
+                metric = f"{self.prefix}_{name}_total"
+                lines.append(f"# TYPE {metric} counter")
+                for (counter, labels), value in sorted(self.counters.items()):
+                    if counter == name:
+                        label_text = ",".join(f'{key}="{val}"' for key, val in labels)
+                        lines.append(f"{metric}{{{label_text}}} {value}" if label_text else f"{metric} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class JsonLogSink(Sink):
+    """Writes one JSON line per finished question: total time, every span and the counters it bumped."""
+
+    def __init__(self, target):
+        self.lock = threading.Lock()
+        self.stream = sys.stderr if target == "stderr" else open(target, "a", encoding="utf-8")
+
+    def on_trace(self, record):
+        self._write(record)
+
+    def on_event(self, record):
+        #  Events inside a question are written with its trace; background ones (watchers, refreshes) here
+        if record["trace_id"] is None:
+            self._write(record)
+
+    def _write(self, record):
+        line = json.dumps(record, default=str)
+        with self.lock:
+            self.stream.write(line + "\n")
+            self.stream.flush()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = metrics.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+_metrics_server = {"server": None}
+
+
+def serve_metrics(port=METRICS_PORT):
+    """Serve the registry at http://0.0.0.0:<port>/metrics from a daemon thread (once per process)."""
+    if _metrics_server["server"] is None:
+        server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+        threading.Thread(target=server.serve_forever, name="metrics-endpoint", daemon=True).start()
+        _metrics_server["server"] = server
+    return _metrics_server["server"]
+
+
+def add_sink(sink):
+    _sinks.append(sink)
+
+
+def remove_sink(sink):
+    if sink in _sinks:
+        _sinks.remove(sink)
+
+
+def add_listener(listener):
+    """Register fn(name, duration_ms, attrs), called when a span ends."""
+    add_sink(_ListenerSink(listener))
+
+
+def remove_listener(listener):
+    for sink in list(_sinks):
+        if isinstance(sink, _ListenerSink) and sink.listener is listener:
+            _sinks.remove(sink)
+
+
+# ---------- Instrumentation ----------
+
+class Trace:
+    """Spans and counters recorded while answering one question."""
+
+    def __init__(self, question):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.question = question
+        self.started = time.perf_counter()
+        self.spans = []
+        self.counters = {}
+        self.events = []
+        self.finished = False
+
+    def finish(self, error=None):
+        if self.finished:
+            return
+        self.finished = True
+        record = {
+            "trace_id": self.trace_id,
+            "question": self.question[:200],
+            "duration_ms": round((time.perf_counter() - self.started) * 1000, 2),
+            "spans": self.spans,
+            "counters": self.counters,
+        }
+        if self.events:
+            record["events"] = self.events
+        if error is not None:
+            record["error"] = type(error).__name__
+        for sink in list(_sinks):
+            sink.on_trace(record)
+
+
+@contextmanager
+def trace(question, finish=True):
+    """Group the spans of one question; finish=False leaves it open for resume() (streamed answers)."""
+    if not TRACING_ENABLED:
+        yield None
+        return
+    question_trace = Trace(question)
+    token = _current_trace.set(question_trace)
+    try:
+        yield question_trace
+    except BaseException as e:
+        question_trace.finish(error=e)
+        raise
+    finally:
+        _current_trace.reset(token)
+        if finish:
+            question_trace.finish()
+
+
+@contextmanager
+def resume(question_trace):
+    """Continue an open trace (e.g. while its answer streams) and finish it on exit."""
+    if question_trace is None:
+        yield None
+        return
+    token = _current_trace.set(question_trace)
+    try:
+        yield question_trace
+    finally:
+        _current_trace.reset(token)
+        question_trace.finish()
+
+
+@contextmanager
+def span(name, **attrs):
+    """Time the enclosed block and report it to the sinks (also when it raises)."""
+    if not TRACING_ENABLED or not _sinks:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        attrs["error"] = type(e).__name__
+        raise
+    finally:
+        duration_ms = (time.perf_counter() - started) * 1000
+        question_trace = _current_trace.get()
+        if question_trace is not None:
+            question_trace.spans.append(dict(attrs, name=name, ms=round(duration_ms, 2)))
+        for sink in list(_sinks):
+            sink.on_span(name, duration_ms, attrs)
+
+
+def incr(name, value=1, **labels):
+    """Bump a counter, e.g. incr("fallbacks") or incr("llm_calls", stage="query")."""
+    if not TRACING_ENABLED or not _sinks:
+        return
+    question_trace = _current_trace.get()
+    if question_trace is not None:
+        question_trace.counters[name] = question_trace.counters.get(name, 0) + value
+    for sink in list(_sinks):
+        sink.on_count(name, value, labels)
+
+
+def error(where, exc=None, **attrs):
+    """Report a handled failure: counted as errors{where=...}, attached to the current question's trace
+    and written to the JSON log (or stderr when no JSON log is configured)."""
+    record = dict(attrs, event="error", where=where)
+    if exc is not None:
+        record.update(error=type(exc).__name__, message=str(exc)[:500])
+    question_trace = _current_trace.get() if TRACING_ENABLED else None
+    record["trace_id"] = question_trace.trace_id if question_trace is not None else None
+    incr("errors", where=where)
+    if question_trace is not None:
+        question_trace.events.append(record)
+    for sink in list(_sinks) if TRACING_ENABLED else []:
+        sink.on_event(record)
+    if not TRACING_ENABLED or not any(isinstance(sink, JsonLogSink) for sink in _sinks):
+        sys.stderr.write(json.dumps(record, default=str) + "\n")
+
+
+def get_metrics():
+    return metrics.snapshot()
+
+
+metrics = MetricsRegistry()
+if TRACING_ENABLED:
+    add_sink(metrics)
+    if TRACING_JSON_LOG:
+        add_sink(JsonLogSink(TRACING_JSON_LOG))
+    if METRICS_PORT:
+        serve_metrics(METRICS_PORT)